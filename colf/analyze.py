@@ -0,0 +1,240 @@
+"""
+colf.analyze: Per-field payload size analysis over a corpus of encoded messages.
+
+Run with ``python -m colf.analyze package.module:ClassName records.bin``; the report is written as JSON.
+"""
+import argparse
+import importlib
+import json
+import sys
+from collections import OrderedDict
+
+from .colf_record import ColferRecordReader, iterConcatenated
+
+# Integer types encoded as a varint, with the continuation byte limit marshallVarInt is called with.
+VARINT_LIMITS = {
+    'int32': -1,
+    'int64': 8,
+    'uint32': -1,
+    'uint64': -1,
+}
+
+# Types whose header 0x80 bit selects between flat and compressed; for uint16 the meaning is inverted.
+FLAT_FLAG_TYPES = ('uint32', 'uint64', 'datetime', 'timestamp')
+SIZED_TYPES = ('str', 'unicode', 'bytes', 'bytearray')
+
+
+def getVarIntLength(value, limit=-1):
+    length = 1
+    while value > 0x7f and (limit <= 0 or length <= limit):
+        value >>= 7
+        length += 1
+    return length
+
+
+def getBucket(length):
+    """
+    Power of two upper bound of ``length``, used as histogram bucket.
+    """
+    if length <= 1:
+        return length
+    return 1 << (length - 1).bit_length()
+
+
+def countInto(histogram, key):
+    histogram[key] = histogram.get(key, 0) + 1
+
+
+class ColferFieldStats(object):
+
+    def __init__(self, variableType, variableSubType):
+        self.variableType = variableType
+        self.variableSubType = variableSubType
+        self.present = 0
+        self.absent = 0
+        self.bytes = 0
+        self.flat = 0
+        self.compressed = 0
+        self.varIntLengths = {}
+        self.lengths = {}
+        self.counts = {}
+
+    def toDict(self, totalBytes):
+        fieldDict = OrderedDict([
+            ('type', self.variableType),
+            ('subType', self.variableSubType),
+            ('present', self.present),
+            ('absent', self.absent),
+            ('bytes', self.bytes),
+            ('share', float(self.bytes) / totalBytes if totalBytes else 0.0),
+            ('averageBytes', float(self.bytes) / (self.present + self.absent) if self.present + self.absent else 0.0),
+        ])
+        if self.flat or self.compressed:
+            fieldDict['flat'] = self.flat
+            fieldDict['compressed'] = self.compressed
+        if self.varIntLengths:
+            fieldDict['varIntLengths'] = dict(sorted(self.varIntLengths.items()))
+        if self.lengths:
+            fieldDict['lengthHistogram'] = dict(sorted(self.lengths.items()))
+        if self.counts:
+            fieldDict['countHistogram'] = dict(sorted(self.counts.items()))
+        return fieldDict
+
+
+class ColferAnalyzer(object):
+    """
+    Walks encoded messages field by field with the decoders of ``colferType`` and records, per field,
+    the bytes it took, how often it was absent (zero values are not encoded), varint lengths,
+    flat versus compressed encodings and string/binary length histograms.
+    Fields of nested objects are reported as ``outer.inner``, those of object lists as ``outer[].inner``.
+    """
+
+    def __init__(self, colferType):
+        self.template = colferType() if isinstance(colferType, type) else colferType
+        # Nested objects are always decoded into type(self)(), see unmarshallObject.
+        self.nestedTemplate = type(self.template)()
+        self.fieldStats = OrderedDict()
+        self.records = 0
+        self.bytes = 0
+
+    def getFieldStats(self, path, variableType, variableSubType):
+        stats = self.fieldStats.get(path)
+        if stats is None:
+            stats = self.fieldStats[path] = ColferFieldStats(variableType, variableSubType)
+        return stats
+
+    def addMessage(self, byteInput, offset=0):
+        newOffset = self.analyzeMessage(self.template, byteInput, offset, '')
+        self.records += 1
+        self.bytes += newOffset - offset
+        return newOffset
+
+    def analyzeMessage(self, template, byteInput, offset, prefix):
+        index = 0
+        for name in dir(template):
+            variableType, _, variableSubType = template.getAttributeWithType(name)
+            offset = self.analyzeField(template, prefix + name, variableType, variableSubType, index, byteInput, offset)
+            index += 1
+        return template.unmarshallFooter(byteInput, offset)
+
+    def analyzeField(self, template, path, variableType, variableSubType, index, byteInput, offset):
+        stats = self.getFieldStats(path, variableType, variableSubType)
+        start = offset
+        header = byteInput[offset]
+
+        if (header & 0x7f) != index:
+            stats.absent += 1
+            _, offset = template.unmarshallHeader(None, byteInput, offset)
+        elif variableType == 'object':
+            stats.present += 1
+            offset = self.analyzeMessage(self.nestedTemplate, byteInput, offset + 1, path + '.')
+            _, offset = template.unmarshallHeader(None, byteInput, offset)
+        elif variableSubType == 'object':
+            stats.present += 1
+            valueLength, offset = template.unmarshallVarInt(byteInput, offset + 1)
+            countInto(stats.counts, getBucket(valueLength))
+            for _ in range(valueLength):
+                offset = self.analyzeMessage(self.nestedTemplate, byteInput, offset, path + '[].')
+            _, offset = template.unmarshallHeader(None, byteInput, offset)
+        else:
+            stats.present += 1
+            value, offset = template.unmarshallType(variableType, variableSubType, index, byteInput, offset)
+            if variableSubType:
+                self.recordList(stats, variableSubType, value)
+            else:
+                self.recordValue(stats, variableType, header, value)
+
+        stats.bytes += offset - start
+        return offset
+
+    def recordValue(self, stats, variableType, header, value):
+        if variableType in FLAT_FLAG_TYPES or variableType == 'uint16':
+            isFlat = bool(header & 0x80) != (variableType == 'uint16')
+            if isFlat:
+                stats.flat += 1
+            else:
+                stats.compressed += 1
+                if variableType in VARINT_LIMITS:
+                    countInto(stats.varIntLengths, getVarIntLength(value, VARINT_LIMITS[variableType]))
+        elif variableType in VARINT_LIMITS:
+            countInto(stats.varIntLengths, getVarIntLength(abs(value), VARINT_LIMITS[variableType]))
+        elif variableType in SIZED_TYPES:
+            countInto(stats.lengths, getBucket(self.getByteLength(value)))
+
+    def recordList(self, stats, variableSubType, value):
+        countInto(stats.counts, getBucket(len(value)))
+        if variableSubType == 'int32':
+            for element in value:
+                countInto(stats.varIntLengths, getVarIntLength(self.template.encodeInt32(element)))
+        elif variableSubType == 'int64':
+            for element in value:
+                countInto(stats.varIntLengths, getVarIntLength(self.template.encodeInt64(element), 8))
+        elif variableSubType in SIZED_TYPES:
+            for element in value:
+                countInto(stats.lengths, getBucket(self.getByteLength(element)))
+
+    def getByteLength(self, value):
+        if self.template.isBinary(value):
+            return len(value)
+        return len(value.encode('utf-8'))
+
+    def report(self):
+        return OrderedDict([
+            ('class', type(self.template).__name__),
+            ('records', self.records),
+            ('bytes', self.bytes),
+            ('averageBytes', float(self.bytes) / self.records if self.records else 0.0),
+            ('fields', OrderedDict((path, stats.toDict(self.bytes)) for path, stats in self.fieldStats.items())),
+        ])
+
+
+def analyzeRecords(colferType, source, framed=True):
+    """
+    Analyzes a record stream (see colf_record) from a buffer or file object, or, with ``framed=False``,
+    messages written back to back in a buffer.
+    """
+    analyzer = ColferAnalyzer(colferType)
+    if framed:
+        for byteInput, start, end in ColferRecordReader(source).iterFrames():
+            offset = analyzer.addMessage(byteInput, start)
+            assert (offset == end)
+    else:
+        if hasattr(source, 'read'):
+            source = source.read()
+        for start, _ in iterConcatenated(type(analyzer.template), source):
+            analyzer.addMessage(source, start)
+    return analyzer.report()
+
+
+def importType(typePath):
+    moduleName, _, typeName = typePath.partition(':')
+    if not typeName:
+        raise ValueError('Expected package.module:ClassName, got {}'.format(typePath))
+    return getattr(importlib.import_module(moduleName), typeName)
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(prog='python -m colf.analyze',
+                                     description='Report per-field payload sizes of encoded Colfer messages.')
+    parser.add_argument('type', help='Colfer class as package.module:ClassName.')
+    parser.add_argument('input', help='Record file, or - for standard input.')
+    parser.add_argument('--unframed', action='store_true',
+                        help='Messages are written back to back instead of length prefixed.')
+    return parser
+
+
+def main(argv=None):
+    arguments = getArgumentParser().parse_args(argv)
+    colferType = importType(arguments.type)
+    if arguments.input == '-':
+        source = getattr(sys.stdin, 'buffer', sys.stdin).read()
+    else:
+        with open(arguments.input, 'rb') as inputFile:
+            source = inputFile.read()
+    report = analyzeRecords(colferType, source, not arguments.unframed)
+    sys.stdout.write(json.dumps(report, indent=2) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
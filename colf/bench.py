@@ -0,0 +1,527 @@
+"""
+colf.bench: Encode/decode benchmarks for Colfer objects.
+
+Run with ``python -m colf.bench``; results are written as JSON.
+Store a baseline with ``--save-baseline base.json`` and gate on it with ``--compare base.json``.
+"""
+import argparse
+import array
+import base64
+import datetime
+import json
+import os
+import pickle
+import platform
+import re
+import struct
+import sys
+import time
+
+from .colf import Colfer
+from .colf_base import ColferConstants, ColferLazyString
+
+perfCounter = getattr(time, 'perf_counter', time.time)
+
+BLOB_SIZE = 256 * 1024
+
+STRUCT_FORMATS = {
+    'bool': '?',
+    'uint8': 'B',
+    'uint16': 'H',
+    'int32': 'i',
+    'uint32': 'I',
+    'int64': 'q',
+    'uint64': 'Q',
+    'float32': 'f',
+    'float64': 'd',
+}
+
+SCALAR_VALUES = [
+    ('bool', True),
+    ('uint8', 200),
+    ('uint16', 40000),
+    ('int32', -123456),
+    ('uint32', 123456),
+    ('int64', -1234567890123),
+    ('uint64', 1234567890123),
+    ('float32', 3.5),
+    ('float64', 3.141592653589793),
+    ('datetime', datetime.datetime(2020, 1, 2, 3, 4, 5, 678000)),
+    ('bytes', b'\x01\x02\x03\x04' * 16),
+    ('str', u'The quick brown fox jumps over'),
+]
+
+# Values that take the flat (non varint) path in marshallUint32/marshallUint64/marshallTimestamp.
+FLAT_VALUES = [
+    ('uint32', 4000000000),
+    ('uint64', 18000000000000000000),
+    ('datetime', datetime.datetime(2200, 1, 1)),
+]
+
+LIST_VALUES = [
+    ('int32', list(range(-32, 32))),
+    ('int64', [value * 1000000007 for value in range(-32, 32)]),
+    ('float32', [value * 0.5 for value in range(64)]),
+    ('float64', [value * 0.25 for value in range(64)]),
+    ('bytes', [bytes(bytearray(range(position, position + 16))) for position in range(16)]),
+    ('str', [u'value-{}'.format(value) for value in range(16)]),
+    # Packed lists, see colf_base.COLFER_PACKED_FORMATS.
+    ('bool', [value % 3 == 0 for value in range(64)]),
+    ('uint8', list(range(0, 256, 4))),
+    ('uint16', [value * 1000 for value in range(64)]),
+    ('uint32', [value * 60000000 for value in range(64)]),
+    ('uint64', [value * 250000000000000000 for value in range(64)]),
+    ('datetime', [datetime.datetime(2020, 1, 2, 3, 4, 5, value * 1000) for value in range(64)]),
+]
+
+
+def makeColferType(name, fields):
+    """
+    Creates a Colfer subclass declaring ``fields``, a list of (name, type, subType).
+    Nested objects unmarshall through ``type(self)()``, so the schema has to live in ``__init__``.
+    """
+    def __init__(self):
+        super(Colfer, self).__init__()
+        for fieldName, fieldType, fieldSubType in fields:
+            self.declareAttribute(fieldName, fieldType, variableSubType=fieldSubType)
+    return type(name, (Colfer,), {'__init__': __init__})
+
+
+class Scenario(object):
+
+    def __init__(self, name, colferType, populate, structFormat=None):
+        self.name = name
+        self.colferType = colferType
+        self.populate = populate
+        self.structFormat = structFormat
+
+    def createObject(self):
+        colferObject = self.colferType()
+        self.populate(colferObject)
+        return colferObject
+
+
+def getScalarScenario(name, variableType, value):
+    colferType = makeColferType(name, [('v', variableType, None)])
+
+    def populate(colferObject):
+        colferObject.v = value
+
+    structFormat = STRUCT_FORMATS.get(variableType)
+    return Scenario(name, colferType, populate, structFormat and '>' + structFormat)
+
+
+def getObjectScenario():
+    colferType = makeColferType('ScalarObject', [('v', 'object', None), ('w', 'int32', None)])
+
+    def populate(colferObject):
+        colferObject.w = 7
+        colferObject.v = colferType()
+        colferObject.v.w = 11
+
+    return Scenario('object', colferType, populate)
+
+
+def getListScenario(variableSubType, values):
+    name = 'list-{}'.format(variableSubType)
+    colferType = makeColferType(name, [('v', 'list', variableSubType)])
+
+    def populate(colferObject):
+        colferObject.v = values
+
+    structFormat = STRUCT_FORMATS.get(variableSubType)
+    return Scenario(name, colferType, populate,
+                    structFormat and '>{}{}'.format(len(values), structFormat))
+
+
+def getListObjectScenario():
+    colferType = makeColferType('ListObject', [('v', 'list', 'object'), ('w', 'int32', None)])
+
+    def populate(colferObject):
+        colferObject.v = [colferType() for _ in range(16)]
+        for position, element in enumerate(colferObject.v):
+            element.w = position + 1
+
+    return Scenario('list-object', colferType, populate)
+
+
+def getSmallScenario():
+    colferType = makeColferType('Small', [
+        ('id', 'uint32', None),
+        ('name', 'str', None),
+        ('value', 'float64', None),
+        ('flag', 'bool', None),
+    ])
+
+    def populate(colferObject):
+        colferObject.id = 4242
+        colferObject.name = u'sensor-17'
+        colferObject.value = 21.5
+        colferObject.flag = True
+
+    return Scenario('shape-small', colferType, populate)
+
+
+def getWideScenario(width=64):
+    numericValues = [(variableType, value) for variableType, value in SCALAR_VALUES if variableType in STRUCT_FORMATS]
+    fields = []
+    values = []
+    for position in range(width):
+        variableType, value = numericValues[position % len(numericValues)]
+        fields.append(('f{:03d}'.format(position), variableType, None))
+        values.append(value)
+    colferType = makeColferType('Wide', fields)
+
+    def populate(colferObject):
+        for (fieldName, _, _), value in zip(fields, values):
+            colferObject[fieldName] = value
+
+    structFormat = '>' + ''.join(STRUCT_FORMATS[variableType] for _, variableType, _ in fields)
+    return Scenario('shape-wide', colferType, populate, structFormat)
+
+
+def getDeepScenario(depth=16):
+    colferType = makeColferType('Deep', [('level', 'int32', None), ('inner', 'object', None)])
+
+    def populate(colferObject):
+        current = colferObject
+        for level in range(depth):
+            current.level = level + 1
+            if level + 1 < depth:
+                current.inner = colferType()
+                current = current.inner
+
+    return Scenario('shape-deep', colferType, populate)
+
+
+def getBlobScenario(blobCount=4, blobSize=BLOB_SIZE):
+    fields = [('id', 'uint64', None)] + [('blob{}'.format(position), 'bytes', None) for position in range(blobCount)]
+    colferType = makeColferType('Blob', fields)
+    blobs = [bytes(bytearray((position + seed) & 0xff for position in range(blobSize))) for seed in range(blobCount)]
+
+    def populate(colferObject):
+        colferObject.id = 99
+        for position, blob in enumerate(blobs):
+            colferObject['blob{}'.format(position)] = blob
+
+    return Scenario('shape-blob', colferType, populate)
+
+
+def getScenarios():
+    scenarios = []
+    for variableType, value in SCALAR_VALUES:
+        scenarios.append(getScalarScenario(variableType, variableType, value))
+    for variableType, value in FLAT_VALUES:
+        scenarios.append(getScalarScenario('{}-flat'.format(variableType), variableType, value))
+    scenarios.append(getObjectScenario())
+    for variableSubType, values in LIST_VALUES:
+        scenarios.append(getListScenario(variableSubType, values))
+    scenarios.append(getListObjectScenario())
+    scenarios.append(getSmallScenario())
+    scenarios.append(getWideScenario())
+    scenarios.append(getDeepScenario())
+    scenarios.append(getBlobScenario())
+    return scenarios
+
+
+def toPlain(value):
+    if isinstance(value, Colfer):
+        return dict((name, toPlain(fieldValue)) for name, fieldValue in value.items())
+    if isinstance(value, (list, tuple, array.array)):
+        return [toPlain(element) for element in value]
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, ColferLazyString):
+        return value.getValue()
+    return value
+
+
+def toJsonable(value):
+    if isinstance(value, dict):
+        return dict((name, toJsonable(fieldValue)) for name, fieldValue in value.items())
+    if isinstance(value, list):
+        return [toJsonable(element) for element in value]
+    if isinstance(value, bytes) and not isinstance(value, str):
+        return base64.b64encode(value).decode('ascii')
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def getStructValues(plainValue):
+    values = []
+    for fieldValue in plainValue.values():
+        if isinstance(fieldValue, list):
+            values.extend(fieldValue)
+        else:
+            values.append(fieldValue)
+    return values
+
+
+class Codec(object):
+    """
+    Encoder/decoder pair for one scenario. ``encode()`` returns the encoded size.
+    """
+
+    def __init__(self, name, encode, decode):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+def getColferCodec(scenario):
+    colferObject = scenario.createObject()
+    scratch = bytearray(ColferConstants.COLFER_MAX_SIZE)
+    length = colferObject.marshall(scratch)
+    encoded = scratch[:length]
+
+    def encode():
+        return colferObject.marshall(bytearray(length))
+
+    def decode():
+        return scenario.colferType().unmarshall(encoded)
+
+    return Codec('colf', encode, decode)
+
+
+def getBaselineCodecs(scenario):
+    plainValue = toPlain(scenario.createObject())
+    codecs = []
+
+    pickled = pickle.dumps(plainValue, pickle.HIGHEST_PROTOCOL)
+    codecs.append(Codec('pickle',
+                        lambda: len(pickle.dumps(plainValue, pickle.HIGHEST_PROTOCOL)),
+                        lambda: pickle.loads(pickled)))
+
+    jsonValue = toJsonable(plainValue)
+    jsoned = json.dumps(jsonValue)
+    codecs.append(Codec('json',
+                        lambda: len(json.dumps(jsonValue)),
+                        lambda: json.loads(jsoned)))
+
+    if scenario.structFormat:
+        packer = struct.Struct(scenario.structFormat)
+        structValues = getStructValues(plainValue)
+        packed = packer.pack(*structValues)
+        codecs.append(Codec('struct',
+                            lambda: len(packer.pack(*structValues)),
+                            lambda: packer.unpack(packed)))
+    return codecs
+
+
+def getPercentile(sortedSamples, percentile):
+    position = int(round((len(sortedSamples) - 1) * percentile / 100.0))
+    return sortedSamples[position]
+
+
+def getMedian(values):
+    sortedValues = sorted(values)
+    middle = len(sortedValues) // 2
+    if len(sortedValues) % 2:
+        return sortedValues[middle]
+    return (sortedValues[middle - 1] + sortedValues[middle]) / 2.0
+
+
+def getMedianAbsoluteDeviation(values):
+    median = getMedian(values)
+    return getMedian([abs(value - median) for value in values])
+
+
+def measure(function, iterations, maxTime, warmup=0, repeats=1):
+    """
+    Runs ``function`` ``warmup`` times untimed, then ``repeats`` timed runs of up to ``iterations``
+    calls each (at least one), a run stopping early after ``maxTime`` seconds.
+    Throughput is the median over runs; latencies are pooled over all runs.
+    """
+    result = None
+    for _ in range(warmup):
+        result = function()
+    samples = []
+    runs = []
+    for _ in range(max(repeats, 1)):
+        runSamples = []
+        started = perfCounter()
+        for _ in range(iterations):
+            before = perfCounter()
+            result = function()
+            runSamples.append(perfCounter() - before)
+            if perfCounter() - started > maxTime:
+                break
+        runTime = sum(runSamples)
+        runs.append(len(runSamples) / runTime if runTime else 0.0)
+        samples.extend(runSamples)
+    totalTime = sum(samples)
+    samples.sort()
+    return result, {
+        'iterations': len(samples),
+        'repeats': len(runs),
+        'opsPerSecond': getMedian(runs),
+        'madOpsPerSecond': getMedianAbsoluteDeviation(runs),
+        'meanMicroseconds': totalTime / len(samples) * 1e6,
+        'p50Microseconds': getPercentile(samples, 50) * 1e6,
+        'p99Microseconds': getPercentile(samples, 99) * 1e6,
+    }
+
+
+def getThroughput(stats, size):
+    opsPerSecond = stats['opsPerSecond']
+    stats['megabytesPerSecond'] = opsPerSecond * size / 1e6 if opsPerSecond else None
+    return stats
+
+
+def runCodec(codec, iterations, maxTime, warmup=0, repeats=1):
+    size, encodeStats = measure(codec.encode, iterations, maxTime, warmup, repeats)
+    _, decodeStats = measure(codec.decode, iterations, maxTime, warmup, repeats)
+    return {
+        'codec': codec.name,
+        'size': size,
+        'encode': getThroughput(encodeStats, size),
+        'decode': getThroughput(decodeStats, size),
+    }
+
+
+def runScenario(scenario, iterations, maxTime, baselines=True, warmup=0, repeats=1):
+    codecs = [getColferCodec(scenario)]
+    if baselines:
+        codecs.extend(getBaselineCodecs(scenario))
+    return {
+        'scenario': scenario.name,
+        'results': [runCodec(codec, iterations, maxTime, warmup, repeats) for codec in codecs],
+    }
+
+
+def runBenchmarks(iterations=200, maxTime=0.5, scenarioPattern=None, baselines=True, warmup=0, repeats=1):
+    scenarios = getScenarios()
+    if scenarioPattern:
+        scenarios = [scenario for scenario in scenarios if re.search(scenarioPattern, scenario.name)]
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'iterations': iterations,
+            'maxTime': maxTime,
+            'warmup': warmup,
+            'repeats': repeats,
+        },
+        'scenarios': [runScenario(scenario, iterations, maxTime, baselines, warmup, repeats)
+                      for scenario in scenarios],
+    }
+
+
+def getCodecResults(report, codecName='colf'):
+    codecResults = {}
+    for scenario in report['scenarios']:
+        for result in scenario['results']:
+            if result['codec'] == codecName:
+                codecResults[scenario['scenario']] = result
+    return codecResults
+
+
+def compareReports(baseline, current, threshold=0.1, madFactor=3.0, codecName='colf'):
+    """
+    Compares median throughput of ``current`` against ``baseline`` for every scenario present in both.
+    An operation regresses when it is slower by more than ``threshold`` (a fraction) and the drop is
+    also larger than ``madFactor`` times the larger of the two median absolute deviations.
+    """
+    baselineResults = getCodecResults(baseline, codecName)
+    comparisons = []
+    for scenarioName, currentResult in sorted(getCodecResults(current, codecName).items()):
+        if scenarioName not in baselineResults:
+            continue
+        for operation in ('encode', 'decode'):
+            before = baselineResults[scenarioName][operation]
+            after = currentResult[operation]
+            drop = before['opsPerSecond'] - after['opsPerSecond']
+            noise = madFactor * max(before.get('madOpsPerSecond', 0.0), after.get('madOpsPerSecond', 0.0))
+            change = -drop / before['opsPerSecond'] if before['opsPerSecond'] else 0.0
+            comparisons.append({
+                'scenario': scenarioName,
+                'operation': operation,
+                'baselineOpsPerSecond': before['opsPerSecond'],
+                'currentOpsPerSecond': after['opsPerSecond'],
+                'change': change,
+                'regressed': change < -threshold and drop > noise,
+            })
+    return comparisons
+
+
+def pinToCpu(cpu):
+    if not hasattr(os, 'sched_setaffinity'):  # pragma: no cover
+        sys.stderr.write('CPU pinning is not supported on this platform.\n')
+        return False
+    os.sched_setaffinity(0, set([cpu]))
+    return True
+
+
+def getArgumentParser():
+    parser = argparse.ArgumentParser(prog='python -m colf.bench',
+                                     description='Benchmark Colfer encode/decode throughput and latency.')
+    parser.add_argument('--iterations', type=int, default=200,
+                        help='Maximum timed iterations per measurement run.')
+    parser.add_argument('--max-time', type=float, default=0.5,
+                        help='Maximum seconds per measurement run.')
+    parser.add_argument('--warmup', type=int, default=10,
+                        help='Untimed calls before each measurement.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Timed runs per measurement; throughput is their median.')
+    parser.add_argument('--cpu', type=int, default=None,
+                        help='Pin the benchmark to this CPU.')
+    parser.add_argument('--scenario', default=None,
+                        help='Only run scenarios whose name matches this regular expression.')
+    parser.add_argument('--no-baselines', action='store_true',
+                        help='Skip the pickle/json/struct comparisons.')
+    parser.add_argument('--output', default=None,
+                        help='Write JSON to this file instead of stdout.')
+    parser.add_argument('--save-baseline', default=None,
+                        help='Also store the results in this baseline file.')
+    parser.add_argument('--compare', default=None,
+                        help='Compare against this baseline file and exit with 1 on regressions.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Allowed throughput drop as a fraction of the baseline.')
+    parser.add_argument('--mad-factor', type=float, default=3.0,
+                        help='A drop must also exceed this many median absolute deviations.')
+    return parser
+
+
+def readJson(inputPath):
+    with open(inputPath) as inputFile:
+        return json.load(inputFile)
+
+
+def writeJson(report, output=None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, 'w') as outputFile:
+            outputFile.write(text)
+    else:
+        sys.stdout.write(text + '\n')
+
+
+def main(argv=None):
+    arguments = getArgumentParser().parse_args(argv)
+    pinned = arguments.cpu is not None and pinToCpu(arguments.cpu)
+    report = runBenchmarks(arguments.iterations, arguments.max_time, arguments.scenario,
+                           not arguments.no_baselines, arguments.warmup, arguments.repeat)
+    report['meta']['cpu'] = arguments.cpu if pinned else None
+    if arguments.save_baseline:
+        writeJson(report, arguments.save_baseline)
+
+    exitCode = 0
+    if arguments.compare:
+        comparisons = compareReports(readJson(arguments.compare), report,
+                                     arguments.threshold, arguments.mad_factor)
+        report['comparison'] = comparisons
+        for comparison in comparisons:
+            if comparison['regressed']:
+                sys.stderr.write('Regression: {scenario} {operation} {change:+.1%} '
+                                 '({baselineOpsPerSecond:.0f} -> {currentOpsPerSecond:.0f} ops/s)\n'
+                                 .format(**comparison))
+                exitCode = 1
+
+    writeJson(report, arguments.output)
+    return exitCode
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,7 +12,7 @@ class Colfer(DictMixIn, TypeDeriveValueMixin, ColferMarshallerMixin, ColferUnmar
         if value is not None:
             if not self.isType(value, variableType):
                 raise AttributeError('Attribute {} is of type {}. Cannot be assigned to {}'.format(name, variableType, value))
-            if variableSubType and self.isList(value):
+            if variableSubType and self.isList(value) and not self.isPackedArray(value, variableSubType):
                 for valueSub in value:
                     if not self.isType(valueSub, variableSubType):
                         raise AttributeError('Attribute {} is of type {}:{}. Cannot be assigned to {}'.format(name, variableType, variableSubType, valueSub))
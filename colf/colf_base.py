@@ -1,6 +1,10 @@
+import array
+import codecs
 import ctypes
 import datetime
+import io
 import json
+import os
 import sys
 from collections import OrderedDict
 
@@ -9,6 +13,56 @@ import six
 if sys.version_info[0:2] >= (3, 0):
     long = int
 
+COLFER_BLOB_CHUNK_SIZE = 64 * 1024
+COLFER_EPOCH = datetime.datetime.utcfromtimestamp(0)
+COLFER_NANOSECONDS = 10 ** 9
+
+
+# Lists of these types are written as a count and the elements packed back to back, big endian.
+COLFER_PACKED_FORMATS = {
+    'bool': 'B',
+    'uint8': 'B',
+    'uint16': 'H',
+    'uint32': 'I',
+    'uint64': 'Q',
+    'datetime': 'qI',
+    'timestamp': 'qI',
+}
+COLFER_PACKED_INTEGER_SIZES = {
+    'uint8': 1,
+    'uint16': 2,
+    'uint32': 4,
+    'uint64': 8,
+}
+
+
+def getArrayTypecodes():
+    typecodes = {}
+    for typecode in 'BHILQ':
+        try:
+            typecodes.setdefault(array.array(typecode).itemsize, typecode)
+        except ValueError:  # pragma: no cover
+            pass  # 'Q' needs Python 3
+    return typecodes
+
+
+# Unsigned array.array typecode per element size.
+COLFER_ARRAY_TYPECODES = getArrayTypecodes()
+
+# ColferFixedLayout per Colfer class, registered by colf_schema.compileSchema.
+COLFER_FIXED_LAYOUTS = {}
+
+
+def getTimestampParts(value):
+    """
+    Seconds and nanoseconds since the epoch of a datetime or of integer nanoseconds.
+    """
+    if isinstance(value, datetime.datetime):
+        timeDelta = value - COLFER_EPOCH
+        return timeDelta.seconds + (timeDelta.days * 24 * 3600), timeDelta.microseconds * (10**3)
+    return divmod(value, COLFER_NANOSECONDS)
+
+
 class TypeCheckMixin(object):
     def __isType(self, variable, typesToCheck):
         for typeToCheck in typesToCheck:
@@ -66,18 +120,36 @@ class TypeCheckMixin(object):
                and self.__checkRange(variable, -1.7976931348623158e+308, 1.7976931348623158e+308)
 
     def isTimestamp(self, variable):
-        return self.__isType(variable, [datetime.datetime])
+        if self.__isType(variable, [datetime.datetime]):
+            return True
+        # Integer nanoseconds since the epoch only in ColferConstants.COLFER_TIMESTAMP_NANOSECONDS mode.
+        return getattr(self, 'getTimestampMode', None) is not None and \
+            self.getTimestampMode() == ColferConstants.COLFER_TIMESTAMP_NANOSECONDS and \
+            type(variable) is not bool and self.__isInt(variable)
 
     def isBinary(self, variable, outputCapable=False):
         if outputCapable:
-            return self.__isType(variable, [bytearray])
-        return self.__isType(variable, [bytes, bytearray])
+            return self.__isType(variable, [bytearray]) or self.isBuffer(variable, True)
+        return self.__isType(variable, [bytes, bytearray, ColferBlob])
+
+    def isBuffer(self, variable, writable=False):
+        # Any flat buffer of unsigned bytes: memoryview, mmap, array('B'), shared memory.
+        try:
+            bufferView = memoryview(variable)
+        except TypeError:
+            return False
+        return bufferView.ndim == 1 and bufferView.format == 'B' and not (writable and bufferView.readonly)
 
     def isString(self, variable):
-        return self.__isType(variable, [six.string_types])
+        return self.__isType(variable, [six.string_types, ColferLazyString])
 
     def isList(self, variable):
-        return self.__isType(variable, [list, tuple])
+        return self.__isType(variable, [list, tuple, array.array])
+
+    def isPackedArray(self, variable, variableSubType):
+        # An unsigned array no wider than the element type needs no check per element.
+        return isinstance(variable, array.array) and variable.typecode in 'BHILQ' and \
+            variable.itemsize <= COLFER_PACKED_INTEGER_SIZES.get(variableSubType, 0)
 
     def isDict(self, variable):  # pragma: no cover
         return self.__isType(variable, [dict])
@@ -162,7 +234,10 @@ class TypeDeriveValueMixin(object):
         return 0.0
 
     def getTimestamp(self):
-        return datetime.datetime.utcfromtimestamp(0)
+        if getattr(self, 'getTimestampMode', None) and \
+                self.getTimestampMode() == ColferConstants.COLFER_TIMESTAMP_NANOSECONDS:
+            return 0
+        return COLFER_EPOCH
 
     def getBinary(self):
         return b''
@@ -306,9 +381,139 @@ class RawFloatConvertUtils(object):
         return cDoubleValue.value
 
 
+class ColferLazyString(object):
+    """
+    String field value decoded only on first use, holding the UTF-8 bytes: a view into messages in
+    ``bytes`` and a copy from any other buffer, which can then be resized or closed. Equality,
+    ordering, ``startswith`` and ``endswith`` work on the bytes where UTF-8 preserves the answer;
+    everything else, including ``len`` and ``hash``, uses the decoded ``str``, so lazy and plain
+    strings mix in sets and dicts. Marshalling writes the bytes back without encoding them again;
+    copies and pickles are plain ``str``.
+    """
+    __slots__ = ('raw', 'value')
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.value = None
+
+    def getValue(self):
+        if self.value is None:
+            self.value = codecs.decode(self.raw, 'utf-8')
+        return self.value
+
+    def getBytes(self):
+        return self.raw
+
+    def getOtherBytes(self, other):
+        if isinstance(other, ColferLazyString):
+            return other.raw
+        if isinstance(other, six.text_type):
+            return other.encode('utf-8')
+        return None
+
+    def __str__(self):
+        return self.getValue() if six.PY3 else self.getValue().encode('utf-8')
+
+    def __unicode__(self):  # pragma: no cover
+        return self.getValue()
+
+    def __repr__(self):
+        return repr(self.getValue())
+
+    def __reduce__(self):
+        return six.text_type, (self.getValue(),)
+
+    def __len__(self):
+        return len(self.getValue())
+
+    def __bool__(self):
+        return len(self.raw) != 0
+
+    __nonzero__ = __bool__
+
+    def __hash__(self):
+        return hash(self.getValue())
+
+    def __eq__(self, other):
+        otherBytes = self.getOtherBytes(other)
+        if otherBytes is None:
+            return NotImplemented
+        return self.raw == otherBytes
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    def compare(self, other):
+        # UTF-8 byte order is code point order.
+        otherBytes = self.getOtherBytes(other)
+        if otherBytes is None:
+            return None
+        selfBytes = bytes(self.raw)
+        otherBytes = bytes(otherBytes)
+        return (selfBytes > otherBytes) - (selfBytes < otherBytes)
+
+    def __lt__(self, other):
+        result = self.compare(other)
+        return NotImplemented if result is None else result < 0
+
+    def __le__(self, other):
+        result = self.compare(other)
+        return NotImplemented if result is None else result <= 0
+
+    def __gt__(self, other):
+        result = self.compare(other)
+        return NotImplemented if result is None else result > 0
+
+    def __ge__(self, other):
+        result = self.compare(other)
+        return NotImplemented if result is None else result >= 0
+
+    def startswith(self, prefix, *args):
+        if args or not isinstance(prefix, six.text_type):
+            return self.getValue().startswith(prefix, *args)
+        prefixBytes = prefix.encode('utf-8')
+        return self.raw[:len(prefixBytes)] == prefixBytes
+
+    def endswith(self, suffix, *args):
+        if args or not isinstance(suffix, six.text_type):
+            return self.getValue().endswith(suffix, *args)
+        suffixBytes = suffix.encode('utf-8')
+        rawLength = len(self.raw)
+        return rawLength >= len(suffixBytes) and self.raw[rawLength - len(suffixBytes):] == suffixBytes
+
+    def __contains__(self, item):
+        return item in self.getValue()
+
+    def __getitem__(self, key):
+        return self.getValue()[key]
+
+    def __iter__(self):
+        return iter(self.getValue())
+
+    def __add__(self, other):
+        return self.getValue() + other
+
+    def __radd__(self, other):
+        return other + self.getValue()
+
+    def __getattr__(self, name):
+        if name in ColferLazyString.__slots__:
+            raise AttributeError(name)
+        return getattr(self.getValue(), name)
+
+
+def getJsonValue(value):
+    if type(value) is ColferLazyString:
+        return value.getValue()
+    return repr(value)
+
+
 class UTFUtils(EntropyUtils):
 
     def encodeUTFBytes(self, stringValue):
+        if type(stringValue) is ColferLazyString:
+            return stringValue.raw, len(stringValue.raw)
         stringAsBytes = stringValue.encode('utf-8')
         return stringAsBytes, len(stringAsBytes)
 
@@ -363,6 +568,16 @@ class DictMixIn(dict, TypeCheckMixin):
     def setKnownAttribute(self, name, variableType, value, variableSubType = None):
         value = self.validateKnownAttribute(name, variableType, value, variableSubType)
         self.__dict__['__variables'][name] = [variableType, value, variableSubType]
+        self.markDirty(name)
+
+    def markDirty(self, name=None):
+        # Drops the cached encoding of a field, or of all fields; see ColferMarshallerMixin.cacheEncodings.
+        encodings = self.__dict__.get('__encodings')
+        if encodings:
+            if name is None:
+                encodings.clear()
+            else:
+                encodings.pop(name, None)
 
     def __setattr__(self, name, value):
         if name in self.__dict__['__variables']:
@@ -376,15 +591,331 @@ class DictMixIn(dict, TypeCheckMixin):
                 variableSubType = None
         value = self.validateKnownAttribute(name, variableType, value, variableSubType)
         self.__dict__['__variables'][name] = [variableType, value, variableSubType]
+        self.markDirty(name)
 
     def setAttribute(self, name, value):  # pragma: no cover
         return self.__setattr__(name, value)
 
     def toJson(self):
-        return json.dumps(dict(self.items()), default=repr)
+        return json.dumps(dict(self.items()), default=getJsonValue)
 
 
 class ColferConstants(object):
     COLFER_MAX_INDEX = 127
     COLFER_MAX_SIZE = 16 * 1024 * 1024
     COLFER_LIST_MAX = 64 * 1024
+
+    # Legacy writes a 0x7f terminator after every field; standard (upstream Colfer) one per message.
+    COLFER_WIRE_LEGACY = 'legacy'
+    COLFER_WIRE_STANDARD = 'standard'
+    COLFER_WIRE_FORMAT = COLFER_WIRE_LEGACY
+
+    # Timestamps decode to datetime (microsecond precision) or to integer nanoseconds since the epoch.
+    COLFER_TIMESTAMP_DATETIME = 'datetime'
+    COLFER_TIMESTAMP_NANOSECONDS = 'nanoseconds'
+    COLFER_TIMESTAMP_MODE = COLFER_TIMESTAMP_DATETIME
+
+
+class ColferStringTable(object):
+    """
+    Dictionary of decoded strings keyed by their UTF-8 bytes, passed to unmarshall as the ``stringTable``
+    codec option. Repeated values decode once and share one ``str``. Only strings of up to ``maxLength``
+    bytes are kept, and once ``maxEntries`` are kept new strings are decoded without being added.
+    """
+
+    def __init__(self, maxEntries=4096, maxLength=64):
+        self.maxEntries = maxEntries
+        self.maxLength = maxLength
+        self.strings = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.strings)
+
+    def decode(self, valueAsBytes, decodeFunction):
+        if type(valueAsBytes) is not bytes:
+            valueAsBytes = bytes(valueAsBytes)
+        value = self.strings.get(valueAsBytes)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = decodeFunction(valueAsBytes)
+        if len(valueAsBytes) <= self.maxLength and len(self.strings) < self.maxEntries:
+            self.strings[valueAsBytes] = value
+        return value
+
+
+class ColferSegmentedOutput(bytearray):
+    """
+    Marshall target that references binary and string payloads of at least ``threshold`` bytes,
+    and any ColferBlob, instead of copying them; everything else is written into the buffer itself.
+    ``getSegments(length)`` returns the message as a list of memoryviews, ready for
+    ``socket.sendmsg`` or ``os.writev``, and ColferBlob values.
+    """
+
+    def __init__(self, size, threshold=64 * 1024):
+        super(ColferSegmentedOutput, self).__init__(size)
+        self.threshold = threshold
+        self.references = []
+
+    def reset(self):
+        self.references = []
+
+    def addReference(self, offset, value):
+        self.references.append((offset, value if isinstance(value, ColferBlob) else memoryview(value)))
+
+    def getSegments(self, length):
+        segments = []
+        start = 0
+        bufferView = memoryview(self)
+        for offset, reference in self.references:
+            if offset > start:
+                segments.append(bufferView[start:offset])
+            segments.append(reference)
+            start = offset
+        if length > start:
+            segments.append(bufferView[start:length])
+        return segments
+
+
+class ColferBlob(io.RawIOBase):
+    """
+    Value of a binary field backed by ``length`` bytes of a file, given as a path or as a file object,
+    from ``position`` (by default the start of the path, or the current position of the file object).
+
+    Encoding streams the content in chunks: ColferRecordWriter writes it straight from the file, with
+    ``os.sendfile`` where possible, instead of holding it in memory. A ColferBlob is also a read only,
+    seekable file object over its bytes, which is how ColferRecordReader returns large binary fields.
+    Every read seeks the underlying file first, so several blobs can share one file object.
+    """
+
+    def __init__(self, source, length=None, position=None):
+        super(ColferBlob, self).__init__()
+        if isinstance(source, six.string_types):
+            self.path = source
+            self.source = None
+            self.start = position or 0
+            if length is None:
+                length = os.path.getsize(source) - self.start
+        else:
+            self.path = None
+            self.source = source
+            self.start = source.tell() if position is None else position
+            if length is None:
+                source.seek(0, os.SEEK_END)
+                length = source.tell() - self.start
+        assert (length >= 0)
+        self.length = length
+        self.offset = 0
+
+    def __len__(self):
+        return self.length
+
+    def getSource(self):
+        if self.source is None:
+            self.source = open(self.path, 'rb')
+        return self.source
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.offset
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.offset
+        elif whence == os.SEEK_END:
+            offset += self.length
+        self.offset = max(offset, 0)
+        return self.offset
+
+    def readinto(self, target):
+        count = min(len(target), self.length - self.offset)
+        if count <= 0:
+            return 0
+        source = self.getSource()
+        source.seek(self.start + self.offset)
+        count = source.readinto(memoryview(target)[:count])
+        self.offset += count
+        return count
+
+    def readExactly(self, target):
+        self.seek(0)
+        targetView = memoryview(target)
+        received = 0
+        while received < self.length:
+            count = self.readinto(targetView[received:self.length])
+            if not count:
+                raise EOFError('Blob source ended after {} of {} bytes'.format(received, self.length))
+            received += count
+
+    def iterChunks(self, chunkSize=COLFER_BLOB_CHUNK_SIZE):
+        self.seek(0)
+        chunkView = memoryview(bytearray(chunkSize))
+        while self.offset < self.length:
+            count = self.readinto(chunkView)
+            if not count:
+                raise EOFError('Blob source ended after {} of {} bytes'.format(self.offset, self.length))
+            yield chunkView[:count]
+
+    def writeTo(self, output, chunkSize=COLFER_BLOB_CHUNK_SIZE):
+        if not self.sendTo(output):
+            for chunk in self.iterChunks(chunkSize):
+                output.write(chunk)
+        return self.length
+
+    def sendTo(self, output):
+        sendfile = getattr(os, 'sendfile', None)
+        if sendfile is None or not self.length:
+            return False
+        try:
+            sourceDescriptor = self.getSource().fileno()
+            outputDescriptor = output.fileno()
+        except (AttributeError, ValueError, EnvironmentError):
+            return False
+        output.flush()
+        sent = 0
+        while sent < self.length:
+            try:
+                count = sendfile(outputDescriptor, sourceDescriptor, self.start + sent, self.length - sent)
+            except EnvironmentError:
+                if sent:
+                    raise
+                return False
+            if not count:
+                raise EOFError('Blob source ended after {} of {} bytes'.format(sent, self.length))
+            sent += count
+        return True
+
+    def close(self):
+        if self.path is not None and self.source is not None:
+            self.source.close()
+            self.source = None
+        super(ColferBlob, self).close()
+
+
+class ColferFileInput(object):
+    """
+    Read only byte access to ``length`` bytes of a seekable file object from ``start``, read through a
+    window of ``windowSize`` bytes, so that a message can be decoded without loading it. Binary fields
+    of at least ``threshold`` bytes are decoded as ColferBlob readers over the file instead of being read.
+    """
+
+    def __init__(self, fileObject, start, length, threshold=64 * 1024, windowSize=64 * 1024):
+        self.fileObject = fileObject
+        self.start = start
+        self.length = length
+        self.threshold = threshold
+        self.windowSize = windowSize
+        self.window = bytearray()
+        self.windowStart = 0
+
+    def __len__(self):
+        return self.length
+
+    def load(self, offset, count):
+        count = min(max(count, self.windowSize), self.length - offset)
+        self.window = bytearray(count)
+        self.windowStart = offset
+        self.fileObject.seek(self.start + offset)
+        received = 0
+        while received < count:
+            readCount = self.fileObject.readinto(memoryview(self.window)[received:])
+            if not readCount:
+                raise EOFError('Truncated record')
+            received += readCount
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start = key.start or 0
+            stop = min(self.length, self.length if key.stop is None else key.stop)
+            if start < self.windowStart or stop > self.windowStart + len(self.window):
+                self.load(start, stop - start)
+            return self.window[start - self.windowStart:stop - self.windowStart]
+        if not 0 <= key < self.length:
+            raise IndexError('Read past the end of the record')
+        if not self.windowStart <= key < self.windowStart + len(self.window):
+            self.load(key, 1)
+        return self.window[key - self.windowStart]
+
+    def getBlob(self, offset, length):
+        return ColferBlob(self.fileObject, length, self.start + offset)
+
+
+class CodecOptionsMixin(ColferConstants):
+
+    def getCodecOptions(self):
+        return self.__dict__.get('__codecOptions')
+
+    def getCodecOption(self, name):
+        options = self.__dict__.get('__codecOptions')
+        if options:
+            return options.get(name)
+        return None
+
+    def getWireFormat(self):
+        options = self.__dict__.get('__codecOptions')
+        if options and 'wireFormat' in options:
+            return options['wireFormat']
+        return self.COLFER_WIRE_FORMAT
+
+    def cacheEncodings(self, enabled=True):
+        """
+        Keeps the encoded bytes of every field from the last ``marshall`` or ``unmarshall`` and copies
+        them on the next ``marshall``, so only the fields assigned since are encoded again. Lists and
+        binary values are also compared to a copy taken when they were encoded, which catches changes
+        made in place. Nested objects are always marshalled, each caching its own fields.
+        """
+        self.__dict__['__encodings'] = {} if enabled else None
+
+    def getEncodingCache(self, byteBuffer=None):
+        encodings = self.__dict__.get('__encodings')
+        # Referenced payloads of a ColferSegmentedOutput are not part of the buffer.
+        if encodings is None or type(byteBuffer) is ColferSegmentedOutput:
+            return None
+        wireFormat = self.getWireFormat()
+        if self.__dict__.get('__encodingsFormat') != wireFormat:
+            encodings.clear()
+            self.__dict__['__encodingsFormat'] = wireFormat
+        return encodings
+
+    def getEncodingSnapshot(self, value):
+        if isinstance(value, array.array):
+            return array.array(value.typecode, value)
+        if isinstance(value, (list, tuple)):
+            snapshot = [bytes(element) if isinstance(element, (bytearray, memoryview)) else element
+                        for element in value]
+            return tuple(snapshot) if isinstance(value, tuple) else snapshot
+        if isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
+        return value
+
+    def isEncodingCacheable(self, variableType, variableSubType, value):
+        return variableType != 'object' and variableSubType != 'object' and not isinstance(value, ColferBlob)
+
+    def getTimestampMode(self):
+        options = self.__dict__.get('__codecOptions')
+        if options and 'timestampMode' in options:
+            return options['timestampMode']
+        return self.COLFER_TIMESTAMP_MODE
+
+    def withCodecOptions(self, options, function, *args):
+        savedOptions = self.__dict__.get('__codecOptions')
+        if savedOptions:
+            mergedOptions = dict(savedOptions)
+            mergedOptions.update(options)
+            options = mergedOptions
+        self.__dict__['__codecOptions'] = options
+        try:
+            return function(*args)
+        finally:
+            if savedOptions is None:
+                del self.__dict__['__codecOptions']
+            else:
+                self.__dict__['__codecOptions'] = savedOptions
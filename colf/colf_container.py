@@ -0,0 +1,227 @@
+import bisect
+import collections
+import io
+import struct
+import zlib
+
+try:
+    import lzma
+except ImportError:  # pragma: no cover
+    lzma = None
+
+from .colf import Colfer
+from .colf_record import ColferRecordWriter, ColferRecordReader, marshallToBytes
+
+# Container layout: magic, compressed blocks, block index (a ColferBlockIndex message),
+# index length as 8 byte big endian, magic. Every block is a compressed record stream (see colf_record).
+COLFER_CONTAINER_MAGIC = b'COLFBLK\x01'
+COLFER_CONTAINER_TRAILER = struct.Struct('>Q')
+
+COLFER_CONTAINER_CODECS = {
+    'none': (bytes, bytes),
+    'zlib': (zlib.compress, zlib.decompress),
+}
+if lzma is not None:
+    COLFER_CONTAINER_CODECS['lzma'] = (lzma.compress, lzma.decompress)
+
+
+def registerCodec(name, compress, decompress):
+    """
+    Makes a block codec available to writers and readers; both functions take and return bytes.
+    """
+    COLFER_CONTAINER_CODECS[name] = (compress, decompress)
+
+
+def getCodec(name):
+    if name not in COLFER_CONTAINER_CODECS:
+        raise ValueError('Unknown container codec {}'.format(name))
+    return COLFER_CONTAINER_CODECS[name]
+
+
+class ColferBlockIndex(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('codec', 'str')
+        self.declareAttribute('offsets', 'list', variableSubType='int64')
+        self.declareAttribute('lengths', 'list', variableSubType='int64')
+        self.declareAttribute('rawLengths', 'list', variableSubType='int64')
+        self.declareAttribute('records', 'list', variableSubType='int64')
+
+
+def decompressBlock(codec, compressed):
+    """
+    Decompresses one block. Module level so that it can be handed to a process pool.
+    """
+    return getCodec(codec)[1](compressed)
+
+
+def decodeBlock(colferType, codec, compressed):
+    """
+    Decompresses and decodes one block.
+    """
+    return list(ColferRecordReader(decompressBlock(codec, compressed)).iterRecords(colferType))
+
+
+class ColferContainerWriter(object):
+    """
+    Writes records into blocks of about ``blockSize`` uncompressed bytes, each compressed with
+    ``codec``, followed by an index of the blocks. ``close()`` writes the last block and the index.
+    """
+
+    def __init__(self, output, codec='zlib', blockSize=1024 * 1024):
+        self.output = output
+        self.codec = codec
+        self.compress = getCodec(codec)[0]
+        self.blockSize = blockSize
+        self.block = io.BytesIO()
+        self.blockWriter = ColferRecordWriter(self.block)
+        self.blockRecords = 0
+        self.index = ColferBlockIndex()
+        self.index.codec = codec
+        self.position = 0
+        self.closed = False
+        self.writeBytes(COLFER_CONTAINER_MAGIC)
+
+    def writeBytes(self, data):
+        self.output.write(data)
+        self.position += len(data)
+
+    def write(self, colferObject):
+        self.blockWriter.write(colferObject)
+        self.blockRecords += 1
+        if self.block.tell() >= self.blockSize:
+            self.flushBlock()
+
+    def flushBlock(self):
+        if not self.blockRecords:
+            return
+        rawBlock = self.block.getvalue()
+        compressed = self.compress(rawBlock)
+        self.index.offsets.append(self.position)
+        self.index.lengths.append(len(compressed))
+        self.index.rawLengths.append(len(rawBlock))
+        self.index.records.append(self.blockRecords)
+        self.writeBytes(compressed)
+        self.block.seek(0)
+        self.block.truncate()
+        self.blockRecords = 0
+
+    def close(self):
+        if self.closed:
+            return
+        self.flushBlock()
+        indexOutput, indexLength = marshallToBytes(self.index)
+        self.writeBytes(memoryview(indexOutput)[:indexLength])
+        self.writeBytes(COLFER_CONTAINER_TRAILER.pack(indexLength))
+        self.writeBytes(COLFER_CONTAINER_MAGIC)
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+class ColferContainerReader(object):
+    """
+    Reads a container from a buffer (``bytes``, ``mmap``, ...) or a seekable file object.
+    Only the blocks that are asked for are read and decompressed.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.isFile = hasattr(source, 'read') and hasattr(source, 'seek') and not isinstance(source, memoryview)
+        if self.isFile:
+            source.seek(0, io.SEEK_END)
+            self.length = source.tell()
+        else:
+            self.length = len(source)
+        trailerLength = COLFER_CONTAINER_TRAILER.size + len(COLFER_CONTAINER_MAGIC)
+        if self.length < len(COLFER_CONTAINER_MAGIC) + trailerLength \
+                or self.readRange(0, len(COLFER_CONTAINER_MAGIC)) != COLFER_CONTAINER_MAGIC \
+                or self.readRange(self.length - len(COLFER_CONTAINER_MAGIC), len(COLFER_CONTAINER_MAGIC)) \
+                != COLFER_CONTAINER_MAGIC:
+            raise ValueError('Not a Colfer container')
+        indexLength, = COLFER_CONTAINER_TRAILER.unpack(
+            self.readRange(self.length - trailerLength, COLFER_CONTAINER_TRAILER.size))
+        self.index, _ = ColferBlockIndex().unmarshall(self.readRange(self.length - trailerLength - indexLength,
+                                                                     indexLength))
+        self.decompress = getCodec(self.index.codec)[1]
+        self.firstRecords = [0]
+        for records in self.index.records:
+            self.firstRecords.append(self.firstRecords[-1] + records)
+
+    def readRange(self, offset, length):
+        if self.isFile:
+            self.source.seek(offset)
+            data = self.source.read(length)
+            if len(data) != length:
+                raise EOFError('Truncated container')
+            return data
+        return bytes(self.source[offset:offset + length])
+
+    def getBlockCount(self):
+        return len(self.index.offsets)
+
+    def getRecordCount(self):
+        return self.firstRecords[-1]
+
+    def readBlock(self, blockNumber):
+        return self.readRange(self.index.offsets[blockNumber], self.index.lengths[blockNumber])
+
+    def decodeBlock(self, colferType, blockNumber):
+        records = decodeBlock(colferType, self.index.codec, self.readBlock(blockNumber))
+        assert (len(records) == self.index.records[blockNumber])
+        return records
+
+    def getRecord(self, colferType, recordNumber):
+        """
+        Decodes the ``recordNumber``-th record, decompressing only its block.
+        """
+        if not 0 <= recordNumber < self.getRecordCount():
+            raise IndexError('Record {} out of range'.format(recordNumber))
+        blockNumber = bisect.bisect_right(self.firstRecords, recordNumber) - 1
+        block = self.decompress(self.readBlock(blockNumber))
+        frames = ColferRecordReader(block).iterFrames()
+        for _ in range(recordNumber - self.firstRecords[blockNumber]):
+            next(frames)
+        byteInput, start, end = next(frames)
+        colferObject, offset = colferType().unmarshall(byteInput, start)
+        assert (offset == end)
+        return colferObject
+
+    def iterRecords(self, colferType, blocks=None, executor=None, readAhead=None):
+        """
+        Yields the records of ``blocks`` (all by default) in order. With a ``concurrent.futures``
+        executor blocks are decompressed in parallel, up to ``readAhead`` blocks (twice the workers by
+        default) ahead of decoding them here; only bytes are passed to and from the workers, so a process
+        pool works too as long as the codec is registered when ``colf.colf_container`` is imported.
+        """
+        if blocks is None:
+            blocks = range(self.getBlockCount())
+        if executor is None:
+            for blockNumber in blocks:
+                for colferObject in self.decodeBlock(colferType, blockNumber):
+                    yield colferObject
+            return
+        if readAhead is None:
+            readAhead = 2 * (getattr(executor, '_max_workers', None) or 4)
+        blocks = iter(blocks)
+        pending = collections.deque()
+        while True:
+            # Blocks are read only when submitted, so at most readAhead of them are held at a time.
+            while len(pending) < readAhead:
+                blockNumber = next(blocks, None)
+                if blockNumber is None:
+                    break
+                pending.append((blockNumber, executor.submit(decompressBlock, self.index.codec,
+                                                             self.readBlock(blockNumber))))
+            if not pending:
+                return
+            blockNumber, future = pending.popleft()
+            records = list(ColferRecordReader(future.result()).iterRecords(colferType))
+            assert (len(records) == self.index.records[blockNumber])
+            for colferObject in records:
+                yield colferObject
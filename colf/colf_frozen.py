@@ -0,0 +1,146 @@
+import array
+import threading
+from collections import OrderedDict
+
+from .colf import Colfer
+from .colf_base import DictMixIn
+
+
+class FrozenColfer(Colfer):
+    """
+    Colfer that becomes immutable with ``freeze()``: fields can no longer be assigned, lists become
+    tuples and binary values bytes, nested objects are frozen as well and have to be FrozenColfer objects
+    themselves. A frozen object is hashable and compares by value.
+
+    Set ``COLFER_ENCODE_CACHE`` on the class to a ColferEncodeCache and ``marshall`` of frozen objects,
+    also as nested objects, copies their encoding from the cache instead of walking the fields.
+    """
+    COLFER_ENCODE_CACHE = None
+
+    def isFrozen(self):
+        return self.__dict__.get('__frozen', False)
+
+    def getFrozenValue(self, value):
+        if isinstance(value, (list, tuple, array.array)):
+            return tuple(self.getFrozenValue(element) for element in value)
+        if isinstance(value, (bytearray, memoryview)):
+            return bytes(value)
+        if isinstance(value, FrozenColfer):
+            return value.freeze()
+        if isinstance(value, DictMixIn):
+            raise TypeError('Cannot freeze nested {}: it is not a FrozenColfer'.format(type(value).__name__))
+        return value
+
+    def freeze(self):
+        if not self.isFrozen():
+            variables = self.__dict__['__variables']
+            frozenValues = [(name, self.getFrozenValue(variables[name][1])) for name in dir(self)]
+            for name, value in frozenValues:
+                variables[name][1] = value
+            self.__dict__['__frozen'] = True
+        return self
+
+    def setKnownAttribute(self, name, variableType, value, variableSubType=None):
+        if self.isFrozen():
+            raise AttributeError('Cannot assign attribute {} of a frozen object'.format(name))
+        super(FrozenColfer, self).setKnownAttribute(name, variableType, value, variableSubType)
+
+    def __setattr__(self, name, value):
+        if self.isFrozen():
+            raise AttributeError('Cannot assign attribute {} of a frozen object'.format(name))
+        super(FrozenColfer, self).__setattr__(name, value)
+
+    def __hash__(self):
+        if not self.isFrozen():
+            raise TypeError('Unhashable: {} is not frozen'.format(type(self).__name__))
+        if '__hash' not in self.__dict__:
+            self.__dict__['__hash'] = hash((type(self).__name__, tuple(self.items())))
+        return self.__dict__['__hash']
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        return type(other) is type(self) and list(self.items()) == list(other.items())
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def encode(self, wireFormat=None):
+        """
+        Returns the encoding as bytes, bypassing the cache.
+        """
+        if wireFormat is not None:
+            return self.withCodecOptions({'wireFormat': wireFormat}, self.encode)
+        byteOutput = bytearray(256)
+        while True:
+            try:
+                length = super(FrozenColfer, self).marshall(byteOutput, 0)
+                return bytes(byteOutput[:length])
+            except IndexError:
+                byteOutput = bytearray(len(byteOutput) * 4)
+
+    def marshall(self, byteOutput, offset=0, wireFormat=None):
+        cache = self.COLFER_ENCODE_CACHE
+        if cache is None or not self.isFrozen():
+            return super(FrozenColfer, self).marshall(byteOutput, offset, wireFormat)
+        encoded = cache.encode(self, wireFormat or self.getWireFormat())
+        return self.marshallBytes(encoded, self.getOutputBuffer(byteOutput), offset)
+
+
+class ColferEncodeCache(object):
+    """
+    Least recently used cache of the encodings of frozen objects, holding at most ``maxBytes``
+    encoded bytes. Encodings larger than ``maxBytes`` are not cached. Thread safe.
+    """
+
+    def __init__(self, maxBytes=16 * 1024 * 1024):
+        self.maxBytes = maxBytes
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.currentBytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def encode(self, frozenObject, wireFormat=None):
+        """
+        Returns the encoding of ``frozenObject`` as bytes, from the cache if possible.
+        """
+        key = (frozenObject, wireFormat or frozenObject.getWireFormat())
+        with self.lock:
+            encoded = self.entries.pop(key, None)
+            if encoded is not None:
+                self.entries[key] = encoded
+                self.hits += 1
+                return encoded
+            self.misses += 1
+
+        encoded = frozenObject.encode(key[1])
+        if len(encoded) > self.maxBytes:
+            return encoded
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = encoded
+                self.currentBytes += len(encoded)
+                while self.currentBytes > self.maxBytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.currentBytes -= len(evicted)
+                    self.evictions += 1
+        return encoded
+
+    def getStats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.currentBytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,183 @@
+import heapq
+import mmap
+import os
+import struct
+
+from .colf_record import ColferRecordReader
+from .colf_scan import ColferScanner, ColferFieldPredicate
+from .colf_sortkey import encodeFieldKey
+
+# Sidecar layout: magic, header, the field name, a table of (end of key, record offset) per entry
+# sorted by key, then the keys (see encodeFieldKey). ``coveredLength`` is how much of the record file is indexed.
+COLFER_INDEX_MAGIC = b'COLFIDX\x01'
+COLFER_INDEX_HEADER = struct.Struct('>QQQH')
+COLFER_INDEX_ENTRY = struct.Struct('>QQ')
+
+
+def getIndexPath(recordPath, field):
+    return '{}.{}.colfidx'.format(recordPath, field)
+
+
+def readIndexFile(indexPath):
+    """
+    Returns the field name, covered length and the sorted ``(key, recordOffset)`` entries of a sidecar.
+    """
+    with open(indexPath, 'rb') as indexFile:
+        data = indexFile.read()
+    if data[:len(COLFER_INDEX_MAGIC)] != COLFER_INDEX_MAGIC:
+        raise ValueError('{} is not a Colfer index'.format(indexPath))
+    coveredLength, entryCount, keysLength, fieldLength = COLFER_INDEX_HEADER.unpack_from(data, len(COLFER_INDEX_MAGIC))
+    offset = len(COLFER_INDEX_MAGIC) + COLFER_INDEX_HEADER.size
+    field = data[offset:offset + fieldLength].decode('utf-8')
+    offset += fieldLength
+    keysStart = offset + entryCount * COLFER_INDEX_ENTRY.size
+    entries = []
+    keyStart = keysStart
+    for position in range(entryCount):
+        keyEnd, recordOffset = COLFER_INDEX_ENTRY.unpack_from(data, offset + position * COLFER_INDEX_ENTRY.size)
+        entries.append((data[keyStart:keysStart + keyEnd], recordOffset))
+        keyStart = keysStart + keyEnd
+    return field, coveredLength, entries
+
+
+def writeIndexFile(indexPath, field, coveredLength, entries):
+    fieldBytes = field.encode('utf-8')
+    keysLength = sum(len(key) for key, _ in entries)
+    temporaryPath = indexPath + '.tmp'
+    with open(temporaryPath, 'wb') as indexFile:
+        indexFile.write(COLFER_INDEX_MAGIC)
+        indexFile.write(COLFER_INDEX_HEADER.pack(coveredLength, len(entries), keysLength, len(fieldBytes)))
+        indexFile.write(fieldBytes)
+        keyEnd = 0
+        for key, recordOffset in entries:
+            keyEnd += len(key)
+            indexFile.write(COLFER_INDEX_ENTRY.pack(keyEnd, recordOffset))
+        for key, _ in entries:
+            indexFile.write(key)
+        indexFile.flush()
+        os.fsync(indexFile.fileno())
+    os.rename(temporaryPath, indexPath)
+
+
+def updateIndex(recordPath, colferType, field, indexPath=None, checkpointRecords=None):
+    """
+    Indexes ``field`` of the records in a record file (see colf_record) appended since the last update,
+    or of all of them for a new index, and returns the number of records added. Only the field itself
+    is decoded; the fields before it are skipped. A frame still being written at the end of the file is
+    left for the next update. With ``checkpointRecords`` the sidecar is rewritten after that many records,
+    so an interrupted build resumes from the last checkpoint.
+    """
+    indexPath = indexPath or getIndexPath(recordPath, field)
+    entries = []
+    coveredLength = 0
+    if os.path.exists(indexPath):
+        indexedField, coveredLength, entries = readIndexFile(indexPath)
+        if indexedField != field:
+            raise ValueError('{} indexes {}, not {}'.format(indexPath, indexedField, field))
+
+    predicate = ColferFieldPredicate(field)
+    scanner = ColferScanner(colferType, [predicate])
+    added = []
+    addedCount = 0
+    recordLength = os.path.getsize(recordPath)
+    if recordLength > coveredLength:
+        with open(recordPath, 'rb') as recordFile:
+            mapping = mmap.mmap(recordFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                frames = ColferRecordReader(mapping, coveredLength).iterFrames()
+                while True:
+                    try:
+                        _, start, end = next(frames)
+                    except (StopIteration, EOFError, IndexError):
+                        break
+                    fieldOffset = scanner.locateField(predicate.index, mapping, start)
+                    value = predicate.decode(mapping, fieldOffset)
+                    added.append((encodeFieldKey(predicate.variableType, value), start))
+                    coveredLength = end
+                    if checkpointRecords and len(added) >= checkpointRecords:
+                        added.sort()
+                        entries = list(heapq.merge(entries, added))
+                        addedCount += len(added)
+                        added = []
+                        writeIndexFile(indexPath, field, coveredLength, entries)
+            finally:
+                mapping.close()
+
+    added.sort()
+    entries = list(heapq.merge(entries, added))
+    writeIndexFile(indexPath, field, coveredLength, entries)
+    return addedCount + len(added)
+
+
+class ColferIndex(object):
+    """
+    Point and range lookups on a sidecar written by ``updateIndex``. Keys are binary searched in the
+    mapped sidecar and only the hits are decoded from the mapped record file.
+    """
+
+    def __init__(self, recordPath, colferType, field, indexPath=None):
+        self.colferType = colferType
+        self.variableType = colferType().getAttributeWithType(field)[0]
+        indexPath = indexPath or getIndexPath(recordPath, field)
+        self.indexFile = open(indexPath, 'rb')
+        self.index = mmap.mmap(self.indexFile.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.index[:len(COLFER_INDEX_MAGIC)] != COLFER_INDEX_MAGIC:
+            raise ValueError('{} is not a Colfer index'.format(indexPath))
+        self.coveredLength, self.entryCount, _, fieldLength = COLFER_INDEX_HEADER.unpack_from(
+            self.index, len(COLFER_INDEX_MAGIC))
+        self.tableStart = len(COLFER_INDEX_MAGIC) + COLFER_INDEX_HEADER.size + fieldLength
+        self.keysStart = self.tableStart + self.entryCount * COLFER_INDEX_ENTRY.size
+        self.recordFile = open(recordPath, 'rb')
+        self.records = mmap.mmap(self.recordFile.fileno(), 0, access=mmap.ACCESS_READ) \
+            if self.coveredLength else b''
+
+    def getEntry(self, position):
+        keyEnd, recordOffset = COLFER_INDEX_ENTRY.unpack_from(self.index,
+                                                              self.tableStart + position * COLFER_INDEX_ENTRY.size)
+        keyStart = COLFER_INDEX_ENTRY.unpack_from(self.index, self.tableStart + (position - 1) *
+                                                  COLFER_INDEX_ENTRY.size)[0] if position else 0
+        return self.index[self.keysStart + keyStart:self.keysStart + keyEnd], recordOffset
+
+    def bisect(self, key, right=False):
+        low = 0
+        high = self.entryCount
+        while low < high:
+            middle = (low + high) // 2
+            middleKey = self.getEntry(middle)[0]
+            if middleKey < key or (right and middleKey == key):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def getOffsets(self, low=None, high=None):
+        """
+        Record offsets of the entries with ``low <= value <= high`` in value order; either bound may be None.
+        """
+        start = 0 if low is None else self.bisect(encodeFieldKey(self.variableType, low))
+        end = self.entryCount if high is None else self.bisect(encodeFieldKey(self.variableType, high), True)
+        return [self.getEntry(position)[1] for position in range(start, end)]
+
+    def decode(self, recordOffset):
+        colferObject, _ = self.colferType().unmarshall(self.records, recordOffset)
+        return colferObject
+
+    def lookup(self, value):
+        return [self.decode(recordOffset) for recordOffset in self.getOffsets(value, value)]
+
+    def range(self, low=None, high=None):
+        for recordOffset in self.getOffsets(low, high):
+            yield self.decode(recordOffset)
+
+    def close(self):
+        if self.coveredLength:
+            self.records.close()
+        self.recordFile.close()
+        self.index.close()
+        self.indexFile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
@@ -1,14 +1,33 @@
-import datetime
+import array
+import struct
+import sys
 
-from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants
+from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants, \
+    CodecOptionsMixin, ColferSegmentedOutput, ColferBlob, getTimestampParts, COLFER_PACKED_FORMATS, \
+    COLFER_FIXED_LAYOUTS
 
 
-class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants):
+class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, CodecOptionsMixin):
 
     def marshallHeader(self, byteOutput, offset):
+        if self.getWireFormat() == ColferConstants.COLFER_WIRE_STANDARD:
+            return offset
         byteOutput[offset] = 0x7f; offset += 1
         return offset
 
+    def marshallFooter(self, byteOutput, offset):
+        if self.getWireFormat() == ColferConstants.COLFER_WIRE_STANDARD:
+            byteOutput[offset] = 0x7f; offset += 1
+        return offset
+
+    def marshallNested(self, value, byteOutput, offset):
+        if self.__dict__.get('__encodings') is not None and value.__dict__.get('__encodings') is None:
+            value.cacheEncodings()
+        options = self.getCodecOptions()
+        if options:
+            return value.withCodecOptions(options, value.marshall, byteOutput, offset)
+        return value.marshall(byteOutput, offset)
+
     def marshallInt(self, value, byteOutput, offset, length):
         for index in range(1, length+1):
             byteOutput[offset+(length-index)] = value & 0xff
@@ -27,6 +46,28 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
         byteOutput[offset] = value & 0xff; offset += 1
         return offset
 
+    def marshallBytes(self, valueAsBytes, byteOutput, offset):
+        valueLength = len(valueAsBytes)
+        isBlob = isinstance(valueAsBytes, ColferBlob)
+        if type(byteOutput) is ColferSegmentedOutput and (isBlob or valueLength >= byteOutput.threshold):
+            byteOutput.addReference(offset, valueAsBytes)
+            return offset
+        # Slice assignment would resize a bytearray instead of failing like the per byte writes.
+        if offset + valueLength > len(byteOutput):
+            raise IndexError('Output buffer too small')
+        if isBlob:
+            valueAsBytes.readExactly(memoryview(byteOutput)[offset:offset+valueLength])
+        else:
+            byteOutput[offset:offset+valueLength] = valueAsBytes
+        return offset+valueLength
+
+    def getOutputBuffer(self, byteOutput):
+        assert (byteOutput != None)
+        assert (self.isBinary(byteOutput, True))
+        if isinstance(byteOutput, (bytearray, memoryview)):
+            return byteOutput
+        return memoryview(byteOutput)
+
     def marshallBool(self, value, index, byteOutput, offset):
 
         if value:
@@ -155,8 +196,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             # Convert
             valueAsBytes = self.getFloatAsBytes(value)
             # Flat
-            for valueAsByte in valueAsBytes:
-                byteOutput[offset] = valueAsByte; offset += 1
+            offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
         return self.marshallHeader(byteOutput, offset)
 
     def marshallListFloat32(self, value, index, byteOutput, offset):
@@ -174,8 +214,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
                 # Convert
                 valueAsBytes = self.getFloatAsBytes(valueElement)
                 # Flat
-                for valueAsByte in valueAsBytes:
-                    byteOutput[offset] = valueAsByte; offset += 1
+                offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -185,8 +224,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             # Convert
             valueAsBytes = self.getDoubleAsBytes(value)
             # Flat
-            for valueAsByte in valueAsBytes:
-                byteOutput[offset] = valueAsByte; offset += 1
+            offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -205,24 +243,21 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
                 # Convert
                 valueAsBytes = self.getDoubleAsBytes(valueElement)
                 # Flat
-                for valueAsByte in valueAsBytes:
-                    byteOutput[offset] = valueAsByte; offset += 1
+                offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
     def marshallTimestamp(self, value, index, byteOutput, offset):
-        timeDelta = value - datetime.datetime.utcfromtimestamp(0)
-        nanoSeconds = timeDelta.microseconds * (10**3)
-        seconds = timeDelta.seconds + (timeDelta.days * 24 * 3600)
+        seconds, nanoSeconds = getTimestampParts(value)
         if nanoSeconds != 0 or seconds != 0:
             if (seconds & self.getComplementaryMaskUnsigned(32)) != 0:
                 # Flat
-                byteOutput[offset] += index | 0x80; offset += 1
+                byteOutput[offset] = index | 0x80; offset += 1
                 offset = self.marshallInt(seconds, byteOutput, offset, 8)
                 offset = self.marshallInt(nanoSeconds, byteOutput, offset, 4)
             else:
                 # Compressed Path
-                byteOutput[offset] += index; offset += 1
+                byteOutput[offset] = index; offset += 1
                 offset = self.marshallInt(seconds, byteOutput, offset, 4)
                 offset = self.marshallInt(nanoSeconds, byteOutput, offset, 4)
 
@@ -238,8 +273,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
             # Flat
-            for valueAsByte in value:
-                byteOutput[offset] = valueAsByte; offset += 1
+            offset = self.marshallBytes(value, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -261,27 +295,23 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
                 offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
                 # Flat
-                for valueAsByte in valueAsBytes:
-                    byteOutput[offset] = valueAsByte; offset += 1
+                offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
     def marshallString(self, value, index, byteOutput, offset):
-        valueLength = len(value)
+        # Encoded first: the length of a ColferLazyString would decode it.
+        valueAsBytes, valueLength = self.encodeUTFBytes(value)
         if valueLength != 0:
-            assert(valueLength <= ColferConstants.COLFER_MAX_SIZE)
+            assert(valueLength <= self.COLFER_MAX_SIZE)
 
             # Compressed Path
             byteOutput[offset] = index; offset += 1
 
-            valueAsBytes, valueLength = self.encodeUTFBytes(value)
-            assert(valueLength <= self.COLFER_MAX_SIZE)
-
             offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
             # Flat
-            for valueAsByte in valueAsBytes:
-                byteOutput[offset] = valueAsByte; offset += 1
+            offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -298,9 +328,6 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
 
             # Flat
             for valueAsString in value:
-                valueLength = len(valueAsString)
-                assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
-
                 valueAsBytes, valueLength = self.encodeUTFBytes(valueAsString)
                 assert (valueLength <= self.COLFER_MAX_SIZE)
 
@@ -308,8 +335,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
                 offset = self.marshallVarInt(valueLength, byteOutput, offset)
 
                 # Flat
-                for valueAsByte in valueAsBytes:
-                    byteOutput[offset] = valueAsByte; offset += 1
+                offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -319,7 +345,7 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             byteOutput[offset] = index; offset += 1
 
             # Flat
-            offset = value.marshall(byteOutput, offset)
+            offset = self.marshallNested(value, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
@@ -338,10 +364,60 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             # Flat
             for valueAsObject in value:
                 # Flat
-                offset = valueAsObject.marshall(byteOutput, offset)
+                offset = self.marshallNested(valueAsObject, byteOutput, offset)
 
         return self.marshallHeader(byteOutput, offset)
 
+    def packElements(self, value, elementFormat):
+        if isinstance(value, array.array) and value.typecode in 'BHILQ' and \
+                value.itemsize == struct.calcsize('>' + elementFormat):
+            if value.itemsize > 1 and sys.byteorder == 'little':
+                value = array.array(value.typecode, value)
+                value.byteswap()
+            return value.tobytes() if hasattr(value, 'tobytes') else value.tostring()
+        return struct.pack('>{}{}'.format(len(value), elementFormat), *value)
+
+    def marshallPacked(self, valueLength, valueAsBytes, index, byteOutput, offset):
+        if valueLength != 0:
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+
+            byteOutput[offset] = index; offset += 1
+
+            # Compressed Path
+            offset = self.marshallVarInt(valueLength, byteOutput, offset)
+
+            # Flat
+            offset = self.marshallBytes(valueAsBytes, byteOutput, offset)
+
+        return self.marshallHeader(byteOutput, offset)
+
+    def marshallListBool(self, value, index, byteOutput, offset):
+        return self.marshallPacked(len(value), self.packElements(value, COLFER_PACKED_FORMATS['bool']),
+                                   index, byteOutput, offset)
+
+    def marshallListUint8(self, value, index, byteOutput, offset):
+        return self.marshallPacked(len(value), self.packElements(value, COLFER_PACKED_FORMATS['uint8']),
+                                   index, byteOutput, offset)
+
+    def marshallListUint16(self, value, index, byteOutput, offset):
+        return self.marshallPacked(len(value), self.packElements(value, COLFER_PACKED_FORMATS['uint16']),
+                                   index, byteOutput, offset)
+
+    def marshallListUint32(self, value, index, byteOutput, offset):
+        return self.marshallPacked(len(value), self.packElements(value, COLFER_PACKED_FORMATS['uint32']),
+                                   index, byteOutput, offset)
+
+    def marshallListUint64(self, value, index, byteOutput, offset):
+        return self.marshallPacked(len(value), self.packElements(value, COLFER_PACKED_FORMATS['uint64']),
+                                   index, byteOutput, offset)
+
+    def marshallListTimestamp(self, value, index, byteOutput, offset):
+        parts = []
+        for valueElement in value:
+            parts.extend(getTimestampParts(valueElement))
+        valueAsBytes = struct.pack('>' + COLFER_PACKED_FORMATS['datetime'] * len(value), *parts)
+        return self.marshallPacked(len(value), valueAsBytes, index, byteOutput, offset)
+
     def marshallList(self, value, index, byteOutput, offset, variableSubType=None):
         STRING_TYPES_MAP = {
             'int32': ColferMarshallerMixin.marshallListInt32,
@@ -353,13 +429,21 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
             'str': ColferMarshallerMixin.marshallListString,
             'unicode': ColferMarshallerMixin.marshallListString,
             'object': ColferMarshallerMixin.marshallListObject,
+            'bool': ColferMarshallerMixin.marshallListBool,
+            'uint8': ColferMarshallerMixin.marshallListUint8,
+            'uint16': ColferMarshallerMixin.marshallListUint16,
+            'uint32': ColferMarshallerMixin.marshallListUint32,
+            'uint64': ColferMarshallerMixin.marshallListUint64,
+            'datetime': ColferMarshallerMixin.marshallListTimestamp,
+            'timestamp': ColferMarshallerMixin.marshallListTimestamp,
         }
 
         if variableSubType in STRING_TYPES_MAP:
             functionToCall = STRING_TYPES_MAP[variableSubType]
             return functionToCall(self, value, index, byteOutput, offset)
-        else:  # pragma: no cover
-            return offset
+        else:
+            # Writing nothing, not even the terminator, would corrupt the message.
+            raise ValueError('Lists of {} are not supported'.format(variableSubType))
 
     def marshallType(self, variableType, variableSubType, value, index, byteOutput, offset):
         STRING_TYPES_MAP = {
@@ -391,16 +475,37 @@ class ColferMarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeU
         else:  # pragma: no cover
             return offset
 
-    def marshall(self, byteOutput, offset=0):
-        assert (byteOutput != None)
-        assert (self.isBinary(byteOutput, True))
+    def marshall(self, byteOutput, offset=0, wireFormat=None):
+        if wireFormat is not None:
+            return self.withCodecOptions({'wireFormat': wireFormat}, self.marshall, byteOutput, offset)
+        byteOutput = self.getOutputBuffer(byteOutput)
         assert (offset >= 0)
+        layout = COLFER_FIXED_LAYOUTS.get(type(self))
+        if layout is not None and layout.matches(self):
+            newOffset = layout.marshall(self, byteOutput, offset)
+            if newOffset is not None:
+                return newOffset
+        encodings = self.getEncodingCache(byteOutput)
         index = 0
         for name in dir(self):
             variableType, value, variableSubType = self.getAttributeWithType(name)
-            offset = self.marshallType(variableType, variableSubType, value, index, byteOutput, offset)
+            if encodings is None:
+                offset = self.marshallType(variableType, variableSubType, value, index, byteOutput, offset)
+            else:
+                offset = self.marshallCached(encodings, name, variableType, variableSubType, value, index,
+                                             byteOutput, offset)
             index += 1
-        return offset
+        return self.marshallFooter(byteOutput, offset)
+
+    def marshallCached(self, encodings, name, variableType, variableSubType, value, index, byteOutput, offset):
+        if not self.isEncodingCacheable(variableType, variableSubType, value):
+            return self.marshallType(variableType, variableSubType, value, index, byteOutput, offset)
+        cached = encodings.get(name)
+        if cached is not None and (cached[0] is value or cached[0] == value):
+            return self.marshallBytes(cached[1], byteOutput, offset)
+        newOffset = self.marshallType(variableType, variableSubType, value, index, byteOutput, offset)
+        encodings[name] = (self.getEncodingSnapshot(value), bytes(byteOutput[offset:newOffset]))
+        return newOffset
 
     def getAttributeWithType(self, name):  # pragma: no cover
         value = self.__getattr__(name)
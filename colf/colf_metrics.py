@@ -0,0 +1,326 @@
+import bisect
+import threading
+import time
+
+from .colf_base import ColferSegmentedOutput
+from .colf_frozen import FrozenColfer
+from .colf_marshall import ColferMarshallerMixin
+from .colf_schema import ColferFixedLayout
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+perfCounter = getattr(time, 'perf_counter', time.time)
+
+SIZE_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LATENCY_BUCKETS = (1e-6, 5e-6, 1e-5, 5e-5, 1e-4, 5e-4, 1e-3, 5e-3, 1e-2, 5e-2, 1e-1, 5e-1, 1.0)
+
+# Marshallers that choose between a compressed (varint) and a flat encoding; 0x80 on the header marks flat.
+PATH_METHODS = (
+    ('uint32', 'marshallUint32'),
+    ('uint64', 'marshallUint64'),
+    ('timestamp', 'marshallTimestamp'),
+)
+# Field types encoded by those marshallers; fixed layouts (see colf_schema) always take the flat encoding.
+PATH_TYPES = {'uint32': 'uint32', 'uint64': 'uint64', 'datetime': 'timestamp', 'timestamp': 'timestamp'}
+
+
+class ColferHistogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def toDict(self):
+        cumulative = []
+        total = 0
+        for bucket, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            cumulative.append([bucket, total])
+        return {'buckets': cumulative, 'sum': self.sum, 'count': self.count}
+
+
+class ColferClassMetrics(object):
+
+    def __init__(self):
+        self.messagesEncoded = 0
+        self.bytesEncoded = 0
+        self.messagesDecoded = 0
+        self.bytesDecoded = 0
+        self.encodedSizes = ColferHistogram(SIZE_BUCKETS)
+        self.decodedSizes = ColferHistogram(SIZE_BUCKETS)
+        self.encodeLatency = ColferHistogram(LATENCY_BUCKETS)
+        self.decodeLatency = ColferHistogram(LATENCY_BUCKETS)
+
+    def toDict(self):
+        return {
+            'messagesEncoded': self.messagesEncoded,
+            'bytesEncoded': self.bytesEncoded,
+            'messagesDecoded': self.messagesDecoded,
+            'bytesDecoded': self.bytesDecoded,
+            'encodedSizes': self.encodedSizes.toDict(),
+            'decodedSizes': self.decodedSizes.toDict(),
+            'encodeSeconds': self.encodeLatency.toDict(),
+            'decodeSeconds': self.decodeLatency.toDict(),
+        }
+
+
+class ColferMetrics(object):
+    """
+    Counts messages and bytes, and keeps size and latency histograms, per class for the
+    generic ``marshall``/``unmarshall`` while enabled, plus how often the uint32/uint64/timestamp
+    marshallers or a fixed layout chose the flat or the compressed encoding.
+
+    Nested objects are part of their outermost message and are not counted separately;
+    classes overriding ``marshall``/``unmarshall`` are not counted, except FrozenColfer. Payloads referenced
+    by a ColferSegmentedOutput count towards the message size. Values copied from the encoding cache
+    (see ``cacheEncodings``) count towards the encodings, while a frozen object copied whole from its
+    ColferEncodeCache counts as a message only. Updates are serialized by a lock, so metrics can be
+    enabled while threads encode and decode. Like the profiler, metrics wrap the mixin methods process-wide only while enabled.
+    Both restore the methods they wrapped, so when combining the two disable them in the
+    reverse order of enabling them.
+    """
+
+    def __init__(self):
+        self.classMetrics = {}
+        self.pathCounts = dict(((name, path), 0) for name, _ in PATH_METHODS for path in ('flat', 'compressed'))
+        self.savedMethods = None
+        self.depth = threading.local()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.classMetrics = {}
+            for key in self.pathCounts:
+                self.pathCounts[key] = 0
+
+    def isEnabled(self):
+        return self.savedMethods is not None
+
+    def getClassMetrics(self, className):
+        classMetrics = self.classMetrics.get(className)
+        if classMetrics is None:
+            classMetrics = self.classMetrics[className] = ColferClassMetrics()
+        return classMetrics
+
+    def enable(self):
+        if self.isEnabled():
+            raise RuntimeError('Metrics are already enabled.')
+        self.savedMethods = dict((name, getattr(ColferMarshallerMixin, name))
+                                 for name in ['marshall', 'marshallCached'] + [method for _, method in PATH_METHODS])
+        self.savedMethods['unmarshall'] = ColferUnmarshallerMixin.unmarshall
+        self.savedMethods['fixedLayoutMarshall'] = ColferFixedLayout.marshall
+        self.savedMethods['frozenMarshall'] = FrozenColfer.__dict__['marshall']
+        ColferFixedLayout.marshall = self.wrapFixedLayoutMarshall(self.savedMethods['fixedLayoutMarshall'])
+        FrozenColfer.marshall = self.wrapMarshall(self.savedMethods['frozenMarshall'])
+        ColferMarshallerMixin.marshall = self.wrapMarshall(self.savedMethods['marshall'])
+        ColferMarshallerMixin.marshallCached = self.wrapMarshallCached(self.savedMethods['marshallCached'])
+        ColferUnmarshallerMixin.unmarshall = self.wrapUnmarshall(self.savedMethods['unmarshall'])
+        for name, method in PATH_METHODS:
+            setattr(ColferMarshallerMixin, method, self.wrapPathMethod(name, self.savedMethods[method]))
+        return self
+
+    def disable(self):
+        if not self.isEnabled():
+            raise RuntimeError('Metrics are not enabled.')
+        ColferUnmarshallerMixin.unmarshall = self.savedMethods.pop('unmarshall')
+        ColferFixedLayout.marshall = self.savedMethods.pop('fixedLayoutMarshall')
+        FrozenColfer.marshall = self.savedMethods.pop('frozenMarshall')
+        for name, method in self.savedMethods.items():
+            setattr(ColferMarshallerMixin, name, method)
+        self.savedMethods = None
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *_):
+        self.disable()
+
+    def enter(self):
+        depth = getattr(self.depth, 'value', 0)
+        self.depth.value = depth + 1
+        return depth == 0
+
+    def leave(self):
+        self.depth.value -= 1
+
+    def countPath(self, key):
+        with self.lock:
+            self.pathCounts[key] += 1
+
+    def wrapMarshall(self, marshall):
+        metrics = self
+
+        def wrappedMarshall(self, byteOutput, offset=0, wireFormat=None):
+            if not metrics.enter():
+                try:
+                    return marshall(self, byteOutput, offset, wireFormat)
+                finally:
+                    metrics.leave()
+            segmented = type(byteOutput) is ColferSegmentedOutput
+            references = len(byteOutput.references) if segmented else 0
+            try:
+                started = perfCounter()
+                newOffset = marshall(self, byteOutput, offset, wireFormat)
+                elapsed = perfCounter() - started
+            finally:
+                metrics.leave()
+            size = newOffset - offset
+            if segmented:
+                size += sum(len(reference) for _, reference in byteOutput.references[references:])
+            with metrics.lock:
+                classMetrics = metrics.getClassMetrics(type(self).__name__)
+                classMetrics.messagesEncoded += 1
+                classMetrics.bytesEncoded += size
+                classMetrics.encodedSizes.observe(size)
+                classMetrics.encodeLatency.observe(elapsed)
+            return newOffset
+
+        return wrappedMarshall
+
+    def wrapUnmarshall(self, unmarshall):
+        metrics = self
+
+        def wrappedUnmarshall(self, byteInput, offset=0, wireFormat=None):
+            if not metrics.enter():
+                try:
+                    return unmarshall(self, byteInput, offset, wireFormat)
+                finally:
+                    metrics.leave()
+            try:
+                started = perfCounter()
+                value, newOffset = unmarshall(self, byteInput, offset, wireFormat)
+                elapsed = perfCounter() - started
+            finally:
+                metrics.leave()
+            with metrics.lock:
+                classMetrics = metrics.getClassMetrics(type(self).__name__)
+                classMetrics.messagesDecoded += 1
+                classMetrics.bytesDecoded += newOffset - offset
+                classMetrics.decodedSizes.observe(newOffset - offset)
+                classMetrics.decodeLatency.observe(elapsed)
+            return value, newOffset
+
+        return wrappedUnmarshall
+
+    def countEncoding(self, name, byteOutput, offset, newOffset):
+        # A lone terminator means the value was zero and nothing was encoded.
+        if newOffset - offset > 1:
+            self.countPath((name, 'flat' if byteOutput[offset] & 0x80 else 'compressed'))
+
+    def wrapPathMethod(self, name, method):
+        metrics = self
+
+        def wrappedPathMethod(self, value, index, byteOutput, offset):
+            newOffset = method(self, value, index, byteOutput, offset)
+            metrics.countEncoding(name, byteOutput, offset, newOffset)
+            return newOffset
+
+        return wrappedPathMethod
+
+    def wrapMarshallCached(self, method):
+        metrics = self
+
+        def wrappedMarshallCached(self, encodings, name, variableType, variableSubType, value, index, byteOutput,
+                                  offset):
+            cached = encodings.get(name)
+            newOffset = method(self, encodings, name, variableType, variableSubType, value, index, byteOutput, offset)
+            # A miss encodes the value again, counted by the wrapped marshaller, and replaces the cached entry.
+            if variableType in PATH_TYPES and cached is not None and encodings.get(name) is cached:
+                metrics.countEncoding(PATH_TYPES[variableType], byteOutput, offset, newOffset)
+            return newOffset
+
+        return wrappedMarshallCached
+
+    def wrapFixedLayoutMarshall(self, method):
+        metrics = self
+
+        def wrappedFixedLayoutMarshall(self, colferObject, byteOutput, offset):
+            newOffset = method(self, colferObject, byteOutput, offset)
+            if newOffset is not None:
+                for _, variableType, _ in self.schema.fields:
+                    if variableType in PATH_TYPES:
+                        metrics.countPath((PATH_TYPES[variableType], 'flat'))
+            return newOffset
+
+        return wrappedFixedLayoutMarshall
+
+    def collect(self):
+        """
+        Returns all metrics as plain dicts: ``{'classes': {className: {...}}, 'encodings': {...}}``.
+        """
+        encodings = {}
+        with self.lock:
+            for (name, path), count in self.pathCounts.items():
+                encodings.setdefault(name, {})[path] = count
+            return {
+                'classes': dict((className, classMetrics.toDict())
+                                for className, classMetrics in self.classMetrics.items()),
+                'encodings': encodings,
+            }
+
+    def toPrometheus(self, prefix='colf'):
+        return renderPrometheus(self.collect(), prefix)
+
+
+def escapeLabel(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def formatNumber(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def renderPrometheus(collected, prefix='colf'):
+    """
+    Renders the output of ``ColferMetrics.collect()`` in the Prometheus text exposition format.
+    """
+    lines = []
+    counters = (
+        ('messages_encoded_total', 'messagesEncoded', 'Messages marshalled.'),
+        ('bytes_encoded_total', 'bytesEncoded', 'Bytes produced by marshall.'),
+        ('messages_decoded_total', 'messagesDecoded', 'Messages unmarshalled.'),
+        ('bytes_decoded_total', 'bytesDecoded', 'Bytes consumed by unmarshall.'),
+    )
+    histograms = (
+        ('encoded_message_bytes', 'encodedSizes', 'Size of marshalled messages.'),
+        ('decoded_message_bytes', 'decodedSizes', 'Size of unmarshalled messages.'),
+        ('encode_seconds', 'encodeSeconds', 'Latency of marshall.'),
+        ('decode_seconds', 'decodeSeconds', 'Latency of unmarshall.'),
+    )
+    classes = sorted(collected['classes'].items())
+
+    for metricName, key, helpText in counters:
+        name = '{}_{}'.format(prefix, metricName)
+        lines.append('# HELP {} {}'.format(name, helpText))
+        lines.append('# TYPE {} counter'.format(name))
+        for className, classMetrics in classes:
+            lines.append('{}{{class="{}"}} {}'.format(name, escapeLabel(className), classMetrics[key]))
+
+    for metricName, key, helpText in histograms:
+        name = '{}_{}'.format(prefix, metricName)
+        lines.append('# HELP {} {}'.format(name, helpText))
+        lines.append('# TYPE {} histogram'.format(name))
+        for className, classMetrics in classes:
+            label = escapeLabel(className)
+            histogram = classMetrics[key]
+            for bucket, count in histogram['buckets']:
+                lines.append('{}_bucket{{class="{}",le="{}"}} {}'.format(name, label, formatNumber(bucket), count))
+            lines.append('{}_sum{{class="{}"}} {}'.format(name, label, formatNumber(histogram['sum'])))
+            lines.append('{}_count{{class="{}"}} {}'.format(name, label, histogram['count']))
+
+    name = '{}_encodings_total'.format(prefix)
+    lines.append('# HELP {} Values encoded by the flat or the compressed path.'.format(name))
+    lines.append('# TYPE {} counter'.format(name))
+    for encodingType, paths in sorted(collected['encodings'].items()):
+        for path, count in sorted(paths.items()):
+            lines.append('{}{{type="{}",path="{}"}} {}'.format(name, encodingType, path, count))
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,187 @@
+"""
+colf.colf_numpy: Optional NumPy representations of decoded data; needs ``pip install colf[numpy]``.
+"""
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+from .colf_base import ColferConstants, getTimestampParts, COLFER_NANOSECONDS, COLFER_FIXED_LAYOUTS
+from .colf_record import ColferRecordReader, ColferRecordWriter
+from .colf_schema import ColferSchema, FIXED_LAYOUT_FORMATS
+
+
+def requireNumpy():
+    if numpy is None:
+        raise ImportError('NumPy is not installed; install colf[numpy]')
+
+
+def toDatetime64(values):
+    """
+    Converts timestamps, as datetime or integer nanoseconds since the epoch, to a ``datetime64[ns]`` array.
+    """
+    requireNumpy()
+    nanoSeconds = []
+    for value in values:
+        seconds, fraction = getTimestampParts(value)
+        nanoSeconds.append(seconds * COLFER_NANOSECONDS + fraction)
+    return numpy.array(nanoSeconds, dtype='int64').view('datetime64[ns]')
+
+
+def fromDatetime64(array):
+    """
+    Integer nanoseconds since the epoch of a ``datetime64`` array, for assigning to timestamp fields.
+    """
+    requireNumpy()
+    return numpy.asarray(array).astype('datetime64[ns]').view('int64').tolist()
+
+
+# NumPy dtype per scalar Colfer type; timestamps become datetime64[ns].
+NUMPY_DTYPES = {
+    'bool': '?',
+    'uint8': 'u1',
+    'uint16': 'u2',
+    'uint32': 'u4',
+    'uint64': 'u8',
+    'int32': 'i4',
+    'int64': 'i8',
+    'float32': 'f4',
+    'float64': 'f8',
+    'datetime': 'M8[ns]',
+    'timestamp': 'M8[ns]',
+}
+
+
+def getSchemaDtype(schema, timestampDtype='M8[ns]'):
+    fields = []
+    for name, variableType, variableSubType in schema.fields:
+        if variableSubType or variableType not in NUMPY_DTYPES:
+            raise ValueError('Attribute {} of type {} has no NumPy scalar dtype'.format(name, variableType))
+        dtype = NUMPY_DTYPES[variableType]
+        fields.append((str(name), timestampDtype if dtype == 'M8[ns]' else dtype))
+    return numpy.dtype(fields)
+
+
+def getRecordDtype(colferType):
+    """
+    The structured dtype of ``colferType``, one field per attribute in field order.
+    """
+    requireNumpy()
+    return getSchemaDtype(ColferSchema(colferType))
+
+
+def getFixedFrameLayout(layout, wireFormat):
+    """
+    Returns the bytes of a frame of ``layout`` with all values zero, the dtype of the values in it (timestamps
+    as ``name.seconds`` and ``name.nanos``) and the offsets of its header bytes.
+    """
+    message = layout.getTemplate(wireFormat)
+    writer = ColferRecordWriter(None)
+    headerLength = writer.marshallFrameHeader(len(message))
+    frame = bytes(writer.header[:headerLength]) + message
+    values, headers = layout.getOffsets(wireFormat)
+    names, formats, offsets = [], [], []
+    for name, variableType, offset in values:
+        valueFormat = FIXED_LAYOUT_FORMATS[variableType][1]
+        if len(valueFormat) > 1:
+            names.extend([str(name + '.seconds'), str(name + '.nanos')])
+            offsets.extend([headerLength + offset, headerLength + offset + 8])
+        else:
+            names.append(str(name))
+            offsets.append(headerLength + offset)
+        formats.extend('>' + code for code in valueFormat)
+    dtype = numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets, 'itemsize': len(frame)})
+    return frame, dtype, list(range(headerLength)) + [headerLength + header for header in headers]
+
+
+def readFixedRecords(layout, source, wireFormat, dtype):
+    frame, frameDtype, headers = getFixedFrameLayout(layout, wireFormat)
+    raw = numpy.frombuffer(source, dtype=numpy.uint8)
+    if len(raw) % len(frame):
+        return None
+    raw = raw.reshape(-1, len(frame))
+    if not (raw[:, headers] == numpy.frombuffer(frame, dtype=numpy.uint8)[headers]).all():
+        return None
+    frames = numpy.frombuffer(source, dtype=frameDtype)
+    result = numpy.empty(len(frames), dtype=dtype)
+    for name, variableType, _ in layout.schema.fields:
+        if dtype[name].kind == 'M':
+            nanoSeconds = frames[name + '.seconds'].astype('int64') * COLFER_NANOSECONDS + frames[name + '.nanos']
+            result[name] = nanoSeconds.view('M8[ns]')
+        else:
+            result[name] = frames[name]
+    return result
+
+
+def readStructuredArray(colferType, source, wireFormat=None):
+    """
+    Decodes a record stream (see colf_record) of ``colferType`` into a structured array of ``getRecordDtype``.
+    Streams of fixed width schemas written in their fixed layout (see colf_schema.compileSchema) are
+    converted as a whole; other streams are decoded into one reused object and copied row by row into
+    the preallocated array.
+    """
+    requireNumpy()
+    schema = ColferSchema(colferType)
+    dtype = getSchemaDtype(schema)
+    wireFormat = wireFormat or colferType.COLFER_WIRE_FORMAT
+    reader = ColferRecordReader(source)
+    if schema.fixedLayout is not None and reader.isBuffer(source):
+        result = readFixedRecords(schema.fixedLayout, source, wireFormat, dtype)
+        if result is not None:
+            return result
+
+    frames = list(reader.iterFrames())
+    result = numpy.empty(len(frames), dtype=getSchemaDtype(schema, 'i8'))
+    template = colferType()
+    options = {'wireFormat': wireFormat, 'timestampMode': ColferConstants.COLFER_TIMESTAMP_NANOSECONDS}
+    for position, (byteInput, start, end) in enumerate(frames):
+        _, offset = template.withCodecOptions(options, template.unmarshall, byteInput, start)
+        assert (offset == end)
+        result[position] = tuple(template.getAttributeWithType(name)[1] for name in schema.names)
+    return result.view(dtype)
+
+
+def writeStructuredArray(colferType, array, output, wireFormat=None):
+    """
+    Appends the rows of a structured array as a record stream of ``colferType`` to the file object
+    ``output``, matching fields by name. An array of ``getRecordDtype`` for a type compiled to a fixed
+    layout is converted as a whole. Returns the number of bytes written.
+    """
+    requireNumpy()
+    wireFormat = wireFormat or colferType.COLFER_WIRE_FORMAT
+    layout = COLFER_FIXED_LAYOUTS.get(colferType)
+    if layout is not None and array.dtype == getSchemaDtype(layout.schema):
+        encoded = writeFixedRecords(layout, array, wireFormat)
+        if encoded is not None:
+            output.write(encoded)
+            return len(encoded)
+
+    writer = ColferRecordWriter(output)
+    template = colferType()
+    names = array.dtype.names
+    written = 0
+    # datetime64 values convert to integer nanoseconds.
+    valueOptions = {'timestampMode': ColferConstants.COLFER_TIMESTAMP_NANOSECONDS}
+    for row in array:
+        for name, value in zip(names, row.tolist()):
+            variableType, _, variableSubType = template.getAttributeWithType(name)
+            template.withCodecOptions(valueOptions, template.setKnownAttribute, name, variableType, value,
+                                      variableSubType)
+        written += template.withCodecOptions({'wireFormat': wireFormat}, writer.write, template)
+    return written
+
+
+def writeFixedRecords(layout, array, wireFormat):
+    frame, frameDtype, _ = getFixedFrameLayout(layout, wireFormat)
+    frames = numpy.empty(len(array), dtype=frameDtype)
+    frames.view(numpy.uint8).reshape(len(array), len(frame))[:] = numpy.frombuffer(frame, dtype=numpy.uint8)
+    for name, variableType, _ in layout.schema.fields:
+        if array.dtype[name].kind == 'M':
+            seconds, nanoSeconds = numpy.divmod(array[name].view('int64'), COLFER_NANOSECONDS)
+            if (seconds < 0).any():
+                return None
+            frames[name + '.seconds'] = seconds
+            frames[name + '.nanos'] = nanoSeconds
+        else:
+            frames[name] = array[name]
+    return frames.tobytes()
@@ -0,0 +1,106 @@
+import struct
+
+from .colf_base import getTimestampParts
+from .colf_scan import ColferScanner
+
+# Types with a fixed width layout: the header flag (None when there is no flag) marking it and its size.
+FLAT_LAYOUTS = {
+    'uint8': (None, 1),
+    'uint16': (0x00, 2),
+    'uint32': (0x80, 4),
+    'uint64': (0x80, 8),
+    'float32': (None, 4),
+    'float64': (None, 8),
+}
+FLAT_FLOAT_FORMATS = {'float32': '>f', 'float64': '>d'}
+
+
+class ColferPatcher(object):
+    """
+    Overwrites top level fields of messages of ``colferType`` inside an encoded buffer (``bytearray``,
+    ``mmap``, writable ``memoryview``, ...) without decoding or re-encoding the rest of the message.
+
+    ``patch`` succeeds when the new encoding of the field has the same length as the old one, or when
+    the field is stored in a fixed width layout (flat uint16/uint32/uint64, uint8, float32/float64
+    and timestamps) the new value fits in; a zero value is then stored explicitly instead of being
+    left out. Otherwise, e.g. for an absent field or a longer string, it returns False and the message
+    has to be marshalled again.
+    """
+
+    def __init__(self, colferType, wireFormat=None):
+        self.template = colferType()
+        self.scanner = ColferScanner(colferType, [], wireFormat)
+        self.indexes = dict((name, index) for index, name in enumerate(dir(self.template)))
+        self.scratch = bytearray(64)
+
+    def getIndex(self, name):
+        if name not in self.indexes:
+            raise AttributeError('Attribute {} does not exist.'.format(name))
+        return self.indexes[name]
+
+    def locate(self, byteOutput, name, offset=0):
+        """
+        Returns ``(start, end)`` of the encoded field ``name`` of the message at ``offset``.
+        """
+        index = self.getIndex(name)
+        start = self.scanner.locateField(index, byteOutput, offset)
+        return start, self.scanner.skipField(index, byteOutput, start)
+
+    def encode(self, name, variableType, variableSubType, value, index):
+        self.template.validateKnownAttribute(name, variableType, value, variableSubType)
+        while True:
+            try:
+                length = self.template.withCodecOptions({'wireFormat': self.scanner.wireFormat},
+                                                        self.template.marshallType, variableType, variableSubType,
+                                                        value, index, self.scratch, 0)
+                return bytes(self.scratch[:length])
+            except IndexError:
+                self.scratch = bytearray(len(self.scratch) * 4)
+
+    def encodeFlat(self, variableType, value, header):
+        if variableType in ('datetime', 'timestamp'):
+            seconds, nanoSeconds = getTimestampParts(value)
+            secondsLength = 8 if header & 0x80 else 4
+            if not 0 <= seconds < 2 ** (8 * secondsLength):
+                return None
+            return struct.pack('>Q', seconds)[8 - secondsLength:] + struct.pack('>I', nanoSeconds)
+        if variableType not in FLAT_LAYOUTS:
+            return None
+        flag, size = FLAT_LAYOUTS[variableType]
+        if flag is not None and (header & 0x80) != flag:
+            return None
+        if variableType in FLAT_FLOAT_FORMATS:
+            return struct.pack(FLAT_FLOAT_FORMATS[variableType], value)
+        if not 0 <= value < 2 ** (8 * size):
+            return None
+        return struct.pack('>Q', value)[8 - size:]
+
+    def patch(self, byteOutput, name, value, offset=0):
+        """
+        Sets field ``name`` of the message at ``offset`` to ``value`` in place; returns whether it could.
+        """
+        index = self.getIndex(name)
+        variableType, _, variableSubType = self.template.getAttributeWithType(name)
+        start, end = self.locate(byteOutput, name, offset)
+        header = byteOutput[start]
+        if (header & 0x7f) != index:
+            return False
+        encoded = self.encode(name, variableType, variableSubType, value, index)
+        if len(encoded) == end - start:
+            byteOutput[start:end] = encoded
+            return True
+        if variableSubType:
+            return False
+        encoded = self.encodeFlat(variableType, value, header)
+        if encoded is None:
+            return False
+        byteOutput[start + 1:start + 1 + len(encoded)] = encoded
+        return True
+
+
+def patchField(colferType, byteOutput, name, value, offset=0, wireFormat=None):
+    """
+    Sets one field of an encoded message in place, see ColferPatcher; returns whether it could.
+    Reuse a ColferPatcher to patch many messages.
+    """
+    return ColferPatcher(colferType, wireFormat).patch(byteOutput, name, value, offset)
@@ -0,0 +1,222 @@
+from .colf_base import ColferConstants, ColferSegmentedOutput, ColferBlob, ColferFileInput
+from .colf_marshall import ColferMarshallerMixin
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+# A record stream is a sequence of frames: the message length as a varint followed by the message.
+COLFER_FRAME_HEADER_MAX = 5
+
+
+def marshallToBytes(colferObject, sizeHint=256, byteOutput=None):
+    """
+    Marshalls into ``byteOutput`` (or a new buffer of ``sizeHint`` bytes), growing it until the message fits.
+    Returns the buffer and the message length.
+    """
+    if byteOutput is None:
+        byteOutput = bytearray(sizeHint)
+    while True:
+        try:
+            return byteOutput, colferObject.marshall(byteOutput)
+        except IndexError:
+            if len(byteOutput) > 4 * ColferConstants.COLFER_MAX_SIZE:
+                raise
+            byteOutput = bytearray(max(len(byteOutput), 16) * 4)
+
+
+def marshallToSegments(colferObject, threshold=64 * 1024, sizeHint=256, byteOutput=None):
+    """
+    Marshalls with binary and string payloads of at least ``threshold`` bytes referenced rather than copied.
+    Returns the ColferSegmentedOutput and the list of memoryviews making up the message, e.g. for
+    ``socket.sendmsg(segments)``. The segments are valid until the buffer is reused and as long as the
+    referenced payloads are not modified. ColferBlob values are always referenced and are returned
+    as segments themselves, see ``ColferBlob.writeTo``.
+    """
+    if byteOutput is None:
+        byteOutput = ColferSegmentedOutput(sizeHint, threshold)
+    while True:
+        byteOutput.reset()
+        try:
+            return byteOutput, byteOutput.getSegments(colferObject.marshall(byteOutput))
+        except IndexError:
+            if len(byteOutput) > 4 * ColferConstants.COLFER_MAX_SIZE:
+                raise
+            byteOutput = ColferSegmentedOutput(max(len(byteOutput), 16) * 4, byteOutput.threshold)
+
+
+class ColferRecordWriter(ColferMarshallerMixin):
+    """
+    Writes a record stream to a file object. With ``segmentThreshold`` set, payloads of at least that many
+    bytes are written from the message values directly instead of being copied into the scratch buffer first.
+    ColferBlob values are always streamed from their file in chunks.
+    """
+
+    def __init__(self, output, sizeHint=1024, segmentThreshold=None):
+        self.output = output
+        self.segmentThreshold = segmentThreshold
+        if segmentThreshold is None:
+            segmentThreshold = ColferConstants.COLFER_MAX_SIZE + 1
+        self.scratch = ColferSegmentedOutput(sizeHint, segmentThreshold)
+        self.header = bytearray(COLFER_FRAME_HEADER_MAX)
+
+    def marshallFrameHeader(self, length):
+        return self.marshallVarInt(length, self.header, 0)
+
+    def write(self, colferObject):
+        """
+        Appends one framed message, returning the number of bytes written.
+        """
+        self.scratch, segments = marshallToSegments(colferObject, byteOutput=self.scratch)
+        return self.writeSegments(segments)
+
+    def writeMessage(self, message):
+        """
+        Appends one already encoded message.
+        """
+        length = len(message)
+        assert (length <= ColferConstants.COLFER_MAX_SIZE)
+        headerLength = self.marshallFrameHeader(length)
+        self.output.write(memoryview(self.header)[:headerLength])
+        self.output.write(message)
+        return headerLength + length
+
+
+    def writeSegments(self, segments):
+        """
+        Appends one already encoded message given as a list of buffers.
+        """
+        length = sum(len(segment) for segment in segments)
+        assert (length <= ColferConstants.COLFER_MAX_SIZE)
+        headerLength = self.marshallFrameHeader(length)
+        self.output.write(memoryview(self.header)[:headerLength])
+        for segment in segments:
+            if isinstance(segment, ColferBlob):
+                segment.writeTo(self.output)
+            else:
+                self.output.write(segment)
+        return headerLength + length
+
+
+class ColferRecordReader(ColferUnmarshallerMixin):
+    """
+    Reads a record stream from a buffer (``bytes``, ``bytearray``, ``memoryview``, ``mmap``) or from a file object.
+
+    ``iterFrames()`` yields ``(byteInput, start, end)`` per message so that buffers are decoded
+    in place: ``colferType().unmarshall(byteInput, start)``. For file objects every frame is
+    read into its own buffer; with ``blobThreshold`` set the file has to be seekable and frames are
+    decoded from the file instead, with binary fields of at least that many bytes returned as
+    ColferBlob readers over it. Those stay readable as long as the file is open.
+    """
+
+    def __init__(self, source, offset=0, blobThreshold=None):
+        self.source = source
+        self.offset = offset
+        self.blobThreshold = blobThreshold
+
+    def iterFrames(self):
+        if hasattr(self.source, 'read') and not self.isBuffer(self.source):
+            return self.iterStreamFrames()
+        return self.iterBufferFrames()
+
+    def iterBufferFrames(self):
+        byteInput = self.source
+        offset = self.offset
+        inputLength = len(byteInput)
+        while offset < inputLength:
+            length, offset = self.unmarshallVarInt(byteInput, offset)
+            assert (length <= ColferConstants.COLFER_MAX_SIZE)
+            if offset + length > inputLength:
+                raise EOFError('Truncated record at offset {}'.format(offset))
+            yield byteInput, offset, offset + length
+            offset += length
+        self.offset = offset
+
+    def readFrameHeader(self, stream):
+        length = 0
+        bitShift = 0
+        while True:
+            valueAsBytes = stream.read(1)
+            if not valueAsBytes:
+                if bitShift:
+                    raise EOFError('Truncated record header')
+                return None
+            valueAsByte = bytearray(valueAsBytes)[0]
+            length |= (valueAsByte & 0x7f) << bitShift
+            if valueAsByte <= 0x7f:
+                return length
+            bitShift += 7
+
+    def iterStreamFrames(self):
+        stream = self.source
+        while True:
+            length = self.readFrameHeader(stream)
+            if length is None:
+                return
+            assert (length <= ColferConstants.COLFER_MAX_SIZE)
+            if self.blobThreshold is not None:
+                start = stream.tell()
+                yield ColferFileInput(stream, start, length, self.blobThreshold), 0, length
+                stream.seek(start + length)
+                continue
+            message = stream.read(length)
+            if len(message) != length:
+                raise EOFError('Truncated record')
+            yield message, 0, length
+
+    def iterRecords(self, colferType, stringTable=None):
+        """
+        Yields the decoded records; with a ColferStringTable repeated strings are decoded once and shared.
+        """
+        for byteInput, start, end in self.iterFrames():
+            colferObject = colferType()
+            if stringTable is not None:
+                _, offset = colferObject.withCodecOptions({'stringTable': stringTable}, colferObject.unmarshall,
+                                                          byteInput, start)
+            else:
+                _, offset = colferObject.unmarshall(byteInput, start)
+            assert (offset == end)
+            yield colferObject
+
+    def iterResults(self, decoder):
+        """
+        Yields the records decoded by a ColferResultDecoder (see colf_result) as tuples or dicts.
+        """
+        for byteInput, start, end in self.iterFrames():
+            result, offset = decoder.unmarshall(byteInput, start)
+            assert (offset == end)
+            yield result
+
+
+def iterConcatenated(colferType, byteInput, offset=0):
+    """
+    Yields ``(start, end)`` of unframed messages written back to back; messages are self delimiting
+    given their schema, so each one has to be decoded to find the next.
+    """
+    inputLength = len(byteInput)
+    while offset < inputLength:
+        _, newOffset = colferType().unmarshall(byteInput, offset)
+        yield offset, newOffset
+        offset = newOffset
+
+
+def convertWireFormat(colferObject, byteInput, fromFormat, toFormat, offset=0):
+    """
+    Re-encodes the message at ``offset`` from one wire format to the other (see ColferConstants),
+    decoding it into ``colferObject``. Returns the converted message and the offset after the source message.
+    """
+    _, newOffset = colferObject.withCodecOptions({'wireFormat': fromFormat}, colferObject.unmarshall, byteInput, offset)
+    byteOutput, length = colferObject.withCodecOptions({'wireFormat': toFormat}, marshallToBytes,
+                                                       colferObject, newOffset - offset + 1)
+    return byteOutput[:length], newOffset
+
+
+def convertRecords(colferType, source, output, fromFormat, toFormat):
+    """
+    Converts every message of a record stream between wire formats, returning the number of records.
+    """
+    writer = ColferRecordWriter(output)
+    records = 0
+    for byteInput, start, end in ColferRecordReader(source).iterFrames():
+        message, offset = convertWireFormat(colferType(), byteInput, fromFormat, toFormat, start)
+        assert (offset == end)
+        writer.writeMessage(message)
+        records += 1
+    return records
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+from .colf_base import TypeDeriveValueMixin
+from .colf_schema import ColferSchema
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+COLFER_RESULT_TYPES = ('tuple', 'namedtuple', 'dict')
+
+
+class ColferResultDecoder(ColferUnmarshallerMixin, TypeDeriveValueMixin):
+    """
+    Decodes messages of ``colferType`` into a plain ``tuple``, a ``namedtuple`` generated for the type, or a
+    ``dict``, with the values in declaration order. The regular field decoders are used, but no Colfer object
+    is created and values are not validated; nested objects decode into the same result type.
+    """
+
+    def __init__(self, colferType, resultType='tuple', wireFormat=None, stringTable=None):
+        if resultType not in COLFER_RESULT_TYPES:
+            raise ValueError('Result type must be one of {}, not {}'.format(', '.join(COLFER_RESULT_TYPES), resultType))
+        schema = ColferSchema(colferType)
+        self.colferType = colferType
+        self.resultType = resultType
+        self.fields = [(variableType, variableSubType) for _, variableType, variableSubType in schema.fields]
+        self.names = schema.declaredNames
+        self.order = [schema.names.index(name) for name in self.names]
+        self.resultClass = namedtuple(colferType.__name__, self.names, rename=True) \
+            if resultType == 'namedtuple' else None
+        options = {
+            'wireFormat': wireFormat or colferType.COLFER_WIRE_FORMAT,
+            'timestampMode': colferType.COLFER_TIMESTAMP_MODE,
+        }
+        if stringTable is not None:
+            options['stringTable'] = stringTable
+        self.__dict__['__codecOptions'] = options
+
+    def unmarshallNested(self, byteInput, offset):
+        return self.unmarshall(byteInput, offset)
+
+    def getResult(self, values):
+        values = [values[position] for position in self.order]
+        if self.resultType == 'namedtuple':
+            return self.resultClass._make(values)
+        if self.resultType == 'dict':
+            return dict(zip(self.names, values))
+        return tuple(values)
+
+    def unmarshall(self, byteInput, offset=0):
+        """
+        Returns the result and the offset after the message.
+        """
+        byteInput = self.getInputBuffer(byteInput)
+        assert (offset >= 0)
+        values = []
+        index = 0
+        for variableType, variableSubType in self.fields:
+            value, offset = self.unmarshallType(variableType, variableSubType, index, byteInput, offset)
+            values.append(self.getValue(variableType) if value is None else value)
+            index += 1
+        return self.getResult(values), self.unmarshallFooter(byteInput, offset)
@@ -0,0 +1,247 @@
+from .colf_base import ColferConstants, COLFER_FIXED_LAYOUTS
+from .colf_record import ColferRecordReader
+from .colf_stream import FIXED_SIZES, FLAGGED_SIZES, VARINT_LIMITS, FLAT_SIZES, SIZED_TYPES, PACKED_SIZES
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+
+class ColferFieldPredicate(object):
+    """
+    One top level field of the scanned type, bound to its index and types by ColferScanner, which
+    locates it in encoded messages; indexes and sort keys use it as is to decode the field. Used as
+    a condition, a subclass implements ``test(byteInput, start, end)``, returning whether the encoded
+    field, from its header up to (and in the legacy layout including) its terminator, matches.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def bind(self, template, index, variableType, variableSubType, wireFormat):
+        self.template = template
+        self.index = index
+        self.variableType = variableType
+        self.variableSubType = variableSubType
+        self.wireFormat = wireFormat
+
+    def decode(self, byteInput, start):
+        value, _ = self.template.withCodecOptions({'wireFormat': self.wireFormat}, self.template.unmarshallType,
+                                                  self.variableType, self.variableSubType, self.index, byteInput, start)
+        if value is None:
+            return self.template.getValue(self.variableType)
+        return value
+
+
+class ColferIn(ColferFieldPredicate):
+    """
+    Field value is one of ``values``. Every value is encoded once up front and compared
+    to the encoded field, so nothing is decoded; a zero value matches an absent field.
+    For types with a fixed layout (see colf_schema) the flat encodings are compared as well.
+    """
+
+    def __init__(self, name, values):
+        super(ColferIn, self).__init__(name)
+        self.values = list(values)
+
+    def bind(self, template, index, variableType, variableSubType, wireFormat):
+        super(ColferIn, self).bind(template, index, variableType, variableSubType, wireFormat)
+        self.encodings = set()
+        byteOutput = bytearray(64)
+        for value in self.values:
+            while True:
+                try:
+                    length = template.withCodecOptions({'wireFormat': wireFormat}, template.marshallType,
+                                                       variableType, variableSubType, value, index, byteOutput, 0)
+                    break
+                except IndexError:
+                    byteOutput = bytearray(len(byteOutput) * 4)
+            self.encodings.add(bytes(byteOutput[:length]))
+        layout = COLFER_FIXED_LAYOUTS.get(type(template))
+        if layout is not None and layout.matches(template):
+            for value in self.values:
+                encoded = layout.encodeField(index, value, wireFormat)
+                if encoded is not None:
+                    self.encodings.add(encoded)
+
+    def test(self, byteInput, start, end):
+        return bytes(byteInput[start:end]) in self.encodings
+
+
+class ColferBetween(ColferFieldPredicate):
+    """
+    ``low <= value <= high`` for numbers and timestamps; either bound may be None.
+    Only this field is decoded.
+    """
+
+    def __init__(self, name, low=None, high=None):
+        super(ColferBetween, self).__init__(name)
+        self.low = low
+        self.high = high
+
+    def test(self, byteInput, start, end):
+        value = self.decode(byteInput, start)
+        return (self.low is None or self.low <= value) and (self.high is None or value <= self.high)
+
+
+class ColferStartsWith(ColferFieldPredicate):
+    """
+    String or binary field starts with ``prefix``, compared on the encoded bytes.
+    """
+
+    def __init__(self, name, prefix):
+        super(ColferStartsWith, self).__init__(name)
+        self.prefix = prefix.encode('utf-8') if not isinstance(prefix, (bytes, bytearray)) else bytes(prefix)
+
+    def test(self, byteInput, start, end):
+        if (byteInput[start] & 0x7f) != self.index:
+            return not self.prefix
+        valueLength, offset = self.template.unmarshallVarInt(byteInput, start + 1)
+        prefixLength = len(self.prefix)
+        return valueLength >= prefixLength and byteInput[offset:offset + prefixLength] == self.prefix
+
+
+class ColferMatches(ColferFieldPredicate):
+    """
+    ``function(value)`` is true for the decoded field value.
+    """
+
+    def __init__(self, name, function):
+        super(ColferMatches, self).__init__(name)
+        self.function = function
+
+    def test(self, byteInput, start, end):
+        return self.function(self.decode(byteInput, start))
+
+
+class ColferScanner(ColferUnmarshallerMixin):
+    """
+    Filters encoded messages of ``colferType`` by predicates on top level fields without decoding them:
+    fields are skipped by their encoded length up to the last field with a predicate, the predicates
+    are evaluated on the encoded bytes, and only matching messages are unmarshalled.
+    """
+
+    def __init__(self, colferType, predicates, wireFormat=None):
+        self.colferType = colferType
+        template = colferType()
+        self.wireFormat = wireFormat or template.getWireFormat()
+        self.standard = self.wireFormat == ColferConstants.COLFER_WIRE_STANDARD
+        self.fields = []
+        indexes = {}
+        for name in dir(template):
+            variableType, _, variableSubType = template.getAttributeWithType(name)
+            indexes[name] = len(self.fields)
+            self.fields.append((variableType, variableSubType))
+
+        self.predicates = [[] for _ in self.fields]
+        self.lastIndex = -1
+        for predicate in predicates:
+            if predicate.name not in indexes:
+                raise AttributeError('Attribute {} does not exist.'.format(predicate.name))
+            index = indexes[predicate.name]
+            predicate.bind(template, index, self.fields[index][0], self.fields[index][1], self.wireFormat)
+            self.predicates[index].append(predicate)
+            self.lastIndex = max(self.lastIndex, index)
+
+    def skipVarInt(self, byteInput, offset, limit=-1):
+        while byteInput[offset] > 0x7f and limit:
+            offset += 1
+            limit -= 1
+        return offset + 1
+
+    def skipElement(self, variableType, byteInput, offset):
+        if variableType in FIXED_SIZES:
+            return offset + FIXED_SIZES[variableType]
+        if variableType in VARINT_LIMITS:
+            return self.skipVarInt(byteInput, offset, VARINT_LIMITS[variableType])
+        if variableType in SIZED_TYPES:
+            valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+            return offset + valueLength
+        assert (variableType == 'object')
+        return self.skipMessage(byteInput, offset)
+
+    def skipField(self, index, byteInput, offset):
+        header = byteInput[offset]
+        if (header & 0x7f) != index:
+            return offset if self.standard else offset + 1
+
+        variableType, variableSubType = self.fields[index]
+        offset += 1
+        if variableSubType in PACKED_SIZES:
+            valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+            offset += valueLength * PACKED_SIZES[variableSubType]
+        elif variableSubType:
+            valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+            for _ in range(valueLength):
+                offset = self.skipElement(variableSubType, byteInput, offset)
+        elif variableType in FLAGGED_SIZES:
+            flatSize, compressedSize = FLAGGED_SIZES[variableType]
+            # Unlike the other types, uint16 marks the compressed encoding with 0x80.
+            isFlat = bool(header & 0x80) != (variableType == 'uint16')
+            offset += flatSize if isFlat else compressedSize
+        elif variableType in FLAT_SIZES and header & 0x80:
+            offset += FLAT_SIZES[variableType]
+        elif variableType != 'bool':
+            offset = self.skipElement(variableType, byteInput, offset)
+        return offset if self.standard else offset + 1
+
+    def skipMessage(self, byteInput, offset):
+        for index in range(len(self.fields)):
+            offset = self.skipField(index, byteInput, offset)
+        return offset + 1 if self.standard else offset
+
+    def locateField(self, index, byteInput, offset=0):
+        """
+        Offset of field ``index`` of the message at ``offset``.
+        """
+        for skippedIndex in range(index):
+            offset = self.skipField(skippedIndex, byteInput, offset)
+        return offset
+
+    def matches(self, byteInput, offset=0):
+        """
+        Whether the message at ``offset`` satisfies all predicates.
+        """
+        for index in range(self.lastIndex + 1):
+            end = self.skipField(index, byteInput, offset)
+            for predicate in self.predicates[index]:
+                if not predicate.test(byteInput, offset, end):
+                    return False
+            offset = end
+        return True
+
+    def decode(self, byteInput, offset):
+        colferObject = self.colferType()
+        return colferObject.withCodecOptions({'wireFormat': self.wireFormat}, colferObject.unmarshall, byteInput, offset)
+
+    def iterRecords(self, source):
+        """
+        Yields the matching records of a record stream (buffer, mmap or file object, see colf_record).
+        """
+        for byteInput, start, end in ColferRecordReader(source).iterFrames():
+            if self.matches(byteInput, start):
+                colferObject, offset = self.decode(byteInput, start)
+                assert (offset == end)
+                yield colferObject
+
+    def iterConcatenated(self, byteInput, offset=0):
+        """
+        Yields the matching messages written back to back in ``byteInput``; the others are skipped field by field.
+        """
+        inputLength = len(byteInput)
+        while offset < inputLength:
+            if self.matches(byteInput, offset):
+                colferObject, offset = self.decode(byteInput, offset)
+                yield colferObject
+            else:
+                offset = self.skipMessage(byteInput, offset)
+
+
+def scanRecords(colferType, source, predicates, framed=True, wireFormat=None):
+    """
+    Yields the records of ``source`` matching all ``predicates``, e.g.
+    ``scanRecords(EventType, mapping, [ColferIn('id', ids), ColferBetween('time', start, end)])``.
+    """
+    scanner = ColferScanner(colferType, predicates, wireFormat)
+    if framed:
+        return scanner.iterRecords(source)
+    if hasattr(source, 'read') and not scanner.isBuffer(source):
+        source = source.read()
+    return scanner.iterConcatenated(source)
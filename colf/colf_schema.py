@@ -0,0 +1,193 @@
+import datetime
+import struct
+from operator import itemgetter
+
+from .colf_base import ColferConstants, ColferFileInput, COLFER_EPOCH, COLFER_NANOSECONDS, COLFER_FIXED_LAYOUTS, \
+    getTimestampParts
+
+# Types with a fixed width encoding: the header flag of that encoding and the struct format of the value.
+FIXED_LAYOUT_FORMATS = {
+    'uint8': (0x00, 'B'),
+    'uint16': (0x00, 'H'),
+    'uint32': (0x80, 'I'),
+    'uint64': (0x80, 'Q'),
+    'float32': (0x00, 'f'),
+    'float64': (0x00, 'd'),
+    'datetime': (0x80, 'QI'),
+    'timestamp': (0x80, 'QI'),
+}
+
+
+class ColferSchema(object):
+    """
+    Field names, types and indexes of ``colferType``, read once from a template object.
+    """
+
+    def __init__(self, colferType):
+        template = colferType()
+        self.colferType = colferType
+        self.declaredNames = list(template.__dict__['__variables'])
+        self.names = list(dir(template))
+        self.fields = []
+        for name in self.names:
+            variableType, _, variableSubType = template.getAttributeWithType(name)
+            self.fields.append((name, variableType, variableSubType))
+        self.fixedLayout = ColferFixedLayout(self) if self.isFixedWidth() else None
+
+    def isFixedWidth(self):
+        return bool(self.fields) and all(variableType in FIXED_LAYOUT_FORMATS and not variableSubType
+                                         for _, variableType, variableSubType in self.fields)
+
+    def matches(self, colferObject):
+        return list(colferObject.__dict__['__variables']) == self.declaredNames
+
+
+class ColferFixedLayout(object):
+    """
+    Encodes every field of a schema of fixed width types flat, zero values included, so each message has
+    the same size and is written with a single ``struct.pack_into`` and read with a single
+    ``struct.unpack_from``. Messages in another layout, e.g. written without it, are left to the
+    field by field decoding.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self.structs = {}
+
+    def getStruct(self, wireFormat):
+        """
+        Returns the compiled ``(struct, arguments, slots, headerGetter, headers)`` for ``wireFormat``:
+        ``arguments`` holds the header bytes with placeholders at the ``slots`` of the values.
+        """
+        compiled = self.structs.get(wireFormat)
+        if compiled is None:
+            legacy = wireFormat != ColferConstants.COLFER_WIRE_STANDARD
+            layout = '>'
+            arguments = []
+            slots = []
+            headerSlots = []
+            for index, (name, variableType, _) in enumerate(self.schema.fields):
+                flag, valueFormat = FIXED_LAYOUT_FORMATS[variableType]
+                headerSlots.append(len(arguments))
+                arguments.append(index | flag)
+                slots.append((len(arguments), name, variableType, len(valueFormat) > 1))
+                arguments.extend([0] * len(valueFormat))
+                layout += 'B' + valueFormat
+                if legacy:
+                    headerSlots.append(len(arguments))
+                    arguments.append(0x7f)
+                    layout += 'B'
+            if not legacy:
+                headerSlots.append(len(arguments))
+                arguments.append(0x7f)
+                layout += 'B'
+            headerGetter = itemgetter(*headerSlots)
+            compiled = (struct.Struct(layout), arguments, slots, headerGetter, headerGetter(arguments))
+            self.structs[wireFormat] = compiled
+        return compiled
+
+    def getSize(self, wireFormat=None):
+        return self.getStruct(wireFormat or self.schema.colferType.COLFER_WIRE_FORMAT)[0].size
+
+    def matches(self, colferObject):
+        return self.schema.matches(colferObject)
+
+    def encodeField(self, index, value, wireFormat):
+        """
+        Field ``index`` holding ``value`` as this layout writes it, or None when the value does not fit.
+        """
+        variableType = self.schema.fields[index][1]
+        flag, valueFormat = FIXED_LAYOUT_FORMATS[variableType]
+        values = getTimestampParts(value) if len(valueFormat) > 1 else (value,)
+        try:
+            encoded = struct.pack('>B' + valueFormat, index | flag, *values)
+        except (struct.error, OverflowError):
+            return None
+        if wireFormat != ColferConstants.COLFER_WIRE_STANDARD:
+            encoded += b'\x7f'
+        return encoded
+
+    def getTemplate(self, wireFormat):
+        """
+        A message of this layout with all values zero.
+        """
+        compiled, arguments = self.getStruct(wireFormat)[:2]
+        return compiled.pack(*arguments)
+
+    def getOffsets(self, wireFormat):
+        """
+        Returns the offsets in a message of the values, as ``(name, variableType, offset)``, and of the header bytes.
+        """
+        legacy = wireFormat != ColferConstants.COLFER_WIRE_STANDARD
+        values = []
+        headers = []
+        position = 0
+        for name, variableType, _ in self.schema.fields:
+            headers.append(position)
+            values.append((name, variableType, position + 1))
+            position += 1 + struct.calcsize('>' + FIXED_LAYOUT_FORMATS[variableType][1])
+            if legacy:
+                headers.append(position)
+                position += 1
+        if not legacy:
+            headers.append(position)
+        return values, headers
+
+    def marshall(self, colferObject, byteOutput, offset):
+        """
+        Returns the offset after the message, or None when a value does not fit its fixed width encoding.
+        """
+        compiled, arguments, slots, _, _ = self.getStruct(colferObject.getWireFormat())
+        if offset + compiled.size > len(byteOutput):
+            raise IndexError('Output buffer too small for {} bytes'.format(compiled.size))
+        variables = colferObject.__dict__['__variables']
+        arguments = list(arguments)
+        for slot, name, _, isTimestamp in slots:
+            value = variables[name][1]
+            if isTimestamp:
+                arguments[slot], arguments[slot + 1] = getTimestampParts(value)
+            else:
+                arguments[slot] = value
+        try:
+            compiled.pack_into(byteOutput, offset, *arguments)
+        except (struct.error, OverflowError):
+            return None
+        return offset + compiled.size
+
+    def unmarshall(self, colferObject, byteInput, offset):
+        """
+        Returns the offset after the message, or None when it is not in this layout.
+        """
+        compiled, _, slots, headerGetter, headers = self.getStruct(colferObject.getWireFormat())
+        if type(byteInput) is ColferFileInput or colferObject.__dict__.get('__frozen') or \
+                len(byteInput) - offset < compiled.size:
+            return None
+        values = compiled.unpack_from(byteInput, offset)
+        if headerGetter(values) != headers:
+            return None
+        nanoSecondMode = colferObject.getTimestampMode() == ColferConstants.COLFER_TIMESTAMP_NANOSECONDS
+        variables = colferObject.__dict__['__variables']
+        for slot, name, variableType, isTimestamp in slots:
+            value = values[slot]
+            if isTimestamp:
+                if nanoSecondMode:
+                    value = value * COLFER_NANOSECONDS + values[slot + 1]
+                else:
+                    value = COLFER_EPOCH + datetime.timedelta(seconds=value, microseconds=values[slot + 1] // 1000)
+            variables[name] = [variableType, value, None]
+        colferObject.markDirty()
+        return offset + compiled.size
+
+
+def compileSchema(colferType, fixedLayout=True):
+    """
+    Reads the schema of ``colferType``. When all its fields have fixed width types (uint8, uint16, uint32,
+    uint64, float32, float64 and timestamps) and ``fixedLayout`` is set, ``marshall`` and ``unmarshall``
+    of the type go through its ColferFixedLayout from then on; ``fixedLayout=False`` turns that off again.
+    """
+    schema = ColferSchema(colferType)
+    if fixedLayout and schema.fixedLayout is not None:
+        COLFER_FIXED_LAYOUTS[colferType] = schema.fixedLayout
+    else:
+        COLFER_FIXED_LAYOUTS.pop(colferType, None)
+    return schema
@@ -0,0 +1,159 @@
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+from .colf_base import getTimestampParts
+from .colf_record import ColferRecordWriter, ColferRecordReader
+from .colf_scan import ColferScanner, ColferFieldPredicate
+
+# Fixed width big endian encodings; signed values are biased so that byte order matches value order.
+INTEGER_KEY_FORMATS = {
+    'bool': ('>B', 0),
+    'uint8': ('>B', 0),
+    'uint16': ('>H', 0),
+    'uint32': ('>I', 0),
+    'uint64': ('>Q', 0),
+    'int32': ('>I', 2 ** 31),
+    'int64': ('>Q', 2 ** 63),
+}
+FLOAT_KEY_FORMATS = {
+    'float32': ('>f', '>I', 2 ** 32 - 1, 2 ** 31),
+    'float64': ('>d', '>Q', 2 ** 64 - 1, 2 ** 63),
+}
+
+SORT_KEY_TYPES = tuple(INTEGER_KEY_FORMATS) + tuple(FLOAT_KEY_FORMATS) + \
+    ('datetime', 'timestamp', 'str', 'unicode', 'bytes', 'bytearray')
+
+
+def escapeKeyBytes(value):
+    # 0x00 is escaped as 0x00 0xff and the value ends with 0x00 0x00, so no key is a prefix of another.
+    return value.replace(b'\x00', b'\x00\xff') + b'\x00\x00'
+
+
+def encodeFieldKey(variableType, value, descending=False):
+    """
+    Encodes one value so that comparing the bytes orders like the values; keys of several fields
+    can be concatenated. ``descending`` inverts the order.
+    """
+    if variableType in INTEGER_KEY_FORMATS:
+        keyFormat, bias = INTEGER_KEY_FORMATS[variableType]
+        key = struct.pack(keyFormat, value + bias)
+    elif variableType in FLOAT_KEY_FORMATS:
+        floatFormat, bitsFormat, mask, signBit = FLOAT_KEY_FORMATS[variableType]
+        bits, = struct.unpack(bitsFormat, struct.pack(floatFormat, value))
+        key = struct.pack(bitsFormat, bits ^ mask if bits & signBit else bits | signBit)
+    elif variableType in ('datetime', 'timestamp'):
+        seconds, nanoSeconds = getTimestampParts(value)
+        key = struct.pack('>QI', seconds + 2 ** 63, nanoSeconds)
+    elif variableType in ('str', 'unicode'):
+        key = escapeKeyBytes(value.encode('utf-8'))
+    elif variableType in ('bytes', 'bytearray'):
+        key = escapeKeyBytes(bytes(value))
+    else:
+        raise ValueError('Cannot derive a sort key from fields of type {}'.format(variableType))
+    if descending:
+        key = bytes(bytearray(byte ^ 0xff for byte in bytearray(key)))
+    return key
+
+
+class ColferSortKey(object):
+    """
+    Derives order preserving sort keys from ``fields`` of ``colferType``, a list of field names or of
+    ``(name, descending)``; earlier fields take precedence. ``fromObject`` works on decoded objects,
+    ``fromMessage`` on encoded ones, decoding only the key fields.
+    """
+
+    def __init__(self, colferType, fields, wireFormat=None):
+        self.fields = [(field, False) if not isinstance(field, tuple) else field for field in fields]
+        self.predicates = [ColferFieldPredicate(name) for name, _ in self.fields]
+        self.scanner = ColferScanner(colferType, self.predicates, wireFormat)
+        for predicate in self.predicates:
+            if predicate.variableSubType or predicate.variableType not in SORT_KEY_TYPES:
+                raise ValueError('Cannot derive a sort key from fields of type {}'.format(predicate.variableType))
+        # Key fields in encoded order, for a single pass over the message.
+        self.messageOrder = sorted(range(len(self.predicates)), key=lambda position: self.predicates[position].index)
+
+    def fromObject(self, colferObject):
+        return b''.join(encodeFieldKey(predicate.variableType, getattr(colferObject, predicate.name), descending)
+                        for predicate, (_, descending) in zip(self.predicates, self.fields))
+
+    def fromMessage(self, byteInput, offset=0):
+        keys = [None] * len(self.predicates)
+        index = 0
+        for position in self.messageOrder:
+            predicate = self.predicates[position]
+            while index < predicate.index:
+                offset = self.scanner.skipField(index, byteInput, offset)
+                index += 1
+            keys[position] = encodeFieldKey(predicate.variableType, predicate.decode(byteInput, offset),
+                                            self.fields[position][1])
+        return b''.join(keys)
+
+
+def writeRun(runs, run, temporaryDirectory):
+    run.sort()
+    runFile = tempfile.TemporaryFile(dir=temporaryDirectory)
+    writer = ColferRecordWriter(runFile)
+    for key, _, message in run:
+        writer.writeMessage(key)
+        writer.writeMessage(message)
+    runFile.seek(0)
+    runs.append(runFile)
+
+
+def iterRun(runFile, sequence):
+    frames = ColferRecordReader(runFile).iterFrames()
+    for keyInput, keyStart, keyEnd in frames:
+        byteInput, start, end = next(frames)
+        yield keyInput[keyStart:keyEnd], sequence, byteInput[start:end]
+        sequence += 1
+
+
+def sortRecordFile(inputPath, outputPath, colferType, fields, memoryLimit=64 * 1024 * 1024,
+                   temporaryDirectory=None, wireFormat=None):
+    """
+    Sorts a record file (see colf_record) by ``fields`` (see ColferSortKey) into ``outputPath``.
+    Keys are derived from the encoded records and records are moved as raw bytes; runs of about
+    ``memoryLimit`` bytes are sorted in memory, spilled to temporary files and merged. The sort is stable.
+    Returns the number of records.
+    """
+    sortKey = ColferSortKey(colferType, fields, wireFormat)
+    runs = []
+    run = []
+    runBytes = 0
+    records = 0
+    if os.path.getsize(inputPath):
+        with open(inputPath, 'rb') as inputFile:
+            mapping = mmap.mmap(inputFile.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                for byteInput, start, end in ColferRecordReader(mapping).iterFrames():
+                    key = sortKey.fromMessage(byteInput, start)
+                    run.append((key, records, byteInput[start:end]))
+                    records += 1
+                    runBytes += len(key) + end - start + 64
+                    if runBytes >= memoryLimit:
+                        writeRun(runs, run, temporaryDirectory)
+                        run = []
+                        runBytes = 0
+            finally:
+                mapping.close()
+
+    try:
+        if runs:
+            if run:
+                writeRun(runs, run, temporaryDirectory)
+            # Ties are broken by run, then by position within the run, which keeps the input order.
+            merged = heapq.merge(*[iterRun(runFile, position * records) for position, runFile in enumerate(runs)])
+        else:
+            run.sort()
+            merged = run
+        with open(outputPath, 'wb') as output:
+            writer = ColferRecordWriter(output)
+            for _, _, message in merged:
+                writer.writeMessage(message)
+    finally:
+        for runFile in runs:
+            runFile.close()
+    return records
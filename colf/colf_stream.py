@@ -0,0 +1,257 @@
+import struct
+from collections import deque
+
+from .colf_base import ColferConstants, COLFER_PACKED_FORMATS
+from .colf_unmarshall import ColferUnmarshallerMixin
+
+# Value sizes in bytes after the field header.
+FIXED_SIZES = {
+    'uint8': 1,
+    'float32': 4,
+    'float64': 8,
+}
+# (flat, compressed) value sizes, picked by the header 0x80 bit.
+FLAGGED_SIZES = {
+    'uint16': (2, 1),
+    'datetime': (12, 8),
+    'timestamp': (12, 8),
+}
+# Varint encoded values, with the continuation byte limit marshallVarInt is called with.
+# uint32/uint64 use FLAT_SIZES instead when the header has 0x80.
+VARINT_LIMITS = {
+    'int32': -1,
+    'int64': 8,
+    'uint32': -1,
+    'uint64': -1,
+}
+FLAT_SIZES = {
+    'uint32': 4,
+    'uint64': 8,
+}
+SIZED_TYPES = ('str', 'unicode', 'bytes', 'bytearray')
+# Element sizes of packed lists, see COLFER_PACKED_FORMATS.
+PACKED_SIZES = dict((variableType, struct.calcsize('>' + elementFormat))
+                    for variableType, elementFormat in COLFER_PACKED_FORMATS.items())
+
+
+class ColferDecoder(ColferUnmarshallerMixin):
+    """
+    Push decoder for messages of ``colferType`` arriving in arbitrary chunks, written back to back.
+
+    ``feed(chunk)`` returns the messages completed by that chunk. Parse state, including a
+    partially received varint, string or nested object, is kept between calls, so earlier bytes
+    are never parsed twice. Chunks are referenced, not copied, until they are consumed; do not
+    modify a chunk after feeding it. Each field is gathered into a small buffer and decoded with
+    the regular ``unmarshall*`` methods; nested objects are parsed field by field.
+    """
+
+    def __init__(self, colferType, wireFormat=None, stringTable=None):
+        self.colferType = colferType
+        self.wireFormat = wireFormat
+        self.codecOptions = {}
+        if wireFormat:
+            self.codecOptions['wireFormat'] = wireFormat
+        if stringTable is not None:
+            self.codecOptions['stringTable'] = stringTable
+        self.standard = (wireFormat or colferType().getWireFormat()) == ColferConstants.COLFER_WIRE_STANDARD
+        self.chunks = deque()
+        self.chunkOffset = 0
+        self.available = 0
+        self.inMessage = False
+        self.completed = []
+        self.fieldBytes = None
+        self.result = None
+        self.parser = self.parseMessages()
+
+    def feed(self, chunk):
+        if len(chunk):
+            self.chunks.append(memoryview(chunk))
+            self.available += len(chunk)
+            next(self.parser)
+        completed, self.completed = self.completed, []
+        return completed
+
+    def isPending(self):
+        return self.inMessage or self.available > 0
+
+    def close(self):
+        if self.isPending():
+            raise EOFError('Stream ended inside a message')
+
+    def need(self, count):
+        while self.available < count:
+            yield
+
+    def peekByte(self):
+        return self.chunks[0][self.chunkOffset]
+
+    def advance(self, count):
+        self.chunkOffset += count
+        self.available -= count
+        if self.chunkOffset == len(self.chunks[0]):
+            self.chunks.popleft()
+            self.chunkOffset = 0
+
+    def takeByte(self):
+        valueAsByte = self.chunks[0][self.chunkOffset]
+        self.advance(1)
+        return valueAsByte
+
+    def takeInto(self, count, target):
+        while count:
+            chunk = self.chunks[0]
+            length = min(len(chunk) - self.chunkOffset, count)
+            target += chunk[self.chunkOffset:self.chunkOffset + length]
+            self.advance(length)
+            count -= length
+
+    def gatherBytes(self, count):
+        for _ in self.need(count):
+            yield
+        self.takeInto(count, self.fieldBytes)
+
+    def gatherVarInt(self, limit=-1):
+        value = 0
+        bitShift = 0
+        while True:
+            for _ in self.need(1):
+                yield
+            valueAsByte = self.takeByte()
+            self.fieldBytes.append(valueAsByte)
+            if valueAsByte <= 0x7f or limit == 0:
+                break
+            value |= (valueAsByte & 0x7f) << bitShift
+            bitShift += 7
+            limit -= 1
+        self.result = value | ((valueAsByte & 0xff) << bitShift)
+
+    def gatherElement(self, variableType):
+        if variableType in FIXED_SIZES:
+            for _ in self.gatherBytes(FIXED_SIZES[variableType]):
+                yield
+        elif variableType in VARINT_LIMITS:
+            for _ in self.gatherVarInt(VARINT_LIMITS[variableType]):
+                yield
+        elif variableType in SIZED_TYPES:
+            for _ in self.gatherVarInt():
+                yield
+            for _ in self.gatherBytes(self.result):
+                yield
+
+    def gatherValue(self, header, variableType, variableSubType):
+        if variableSubType:
+            for _ in self.gatherVarInt():
+                yield
+            valueLength = self.result
+            assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+            if variableSubType in PACKED_SIZES:
+                for _ in self.gatherBytes(valueLength * PACKED_SIZES[variableSubType]):
+                    yield
+            else:
+                for _ in range(valueLength):
+                    for _ in self.gatherElement(variableSubType):
+                        yield
+        elif variableType in FLAGGED_SIZES:
+            flatSize, compressedSize = FLAGGED_SIZES[variableType]
+            # Unlike the other types, uint16 marks the compressed encoding with 0x80.
+            isFlat = bool(header & 0x80) != (variableType == 'uint16')
+            for _ in self.gatherBytes(flatSize if isFlat else compressedSize):
+                yield
+        elif variableType in FLAT_SIZES and header & 0x80:
+            for _ in self.gatherBytes(FLAT_SIZES[variableType]):
+                yield
+        else:
+            for _ in self.gatherElement(variableType):
+                yield
+
+    def takeTerminator(self):
+        for _ in self.need(1):
+            yield
+        assert (self.takeByte() == 0x7f)
+
+    def decodeField(self, colferObject, variableType, variableSubType, index):
+        if self.codecOptions:
+            return colferObject.withCodecOptions(self.codecOptions, colferObject.unmarshallType,
+                                                 variableType, variableSubType, index, self.fieldBytes, 0)
+        return colferObject.unmarshallType(variableType, variableSubType, index, self.fieldBytes, 0)
+
+    def parseField(self, colferObject, variableType, variableSubType, index):
+        for _ in self.need(1):
+            yield
+        header = self.peekByte()
+
+        if (header & 0x7f) != index:
+            # Absent: in the legacy layout this is the field's terminator, otherwise the next header.
+            if not self.standard:
+                assert (self.takeByte() == 0x7f)
+            self.result = None
+            return
+
+        if variableType == 'object' or variableSubType == 'object':
+            self.advance(1)
+            if variableSubType:
+                self.fieldBytes = bytearray()
+                for _ in self.gatherVarInt():
+                    yield
+                valueLength = self.result
+                assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+                value = []
+                for _ in range(valueLength):
+                    for _ in self.parseObject(type(colferObject)()):
+                        yield
+                    value.append(self.result)
+            else:
+                for _ in self.parseObject(type(colferObject)()):
+                    yield
+                value = self.result
+            if not self.standard:
+                for _ in self.takeTerminator():
+                    yield
+            self.result = value
+            return
+
+        self.fieldBytes = bytearray()
+        self.fieldBytes.append(self.takeByte())
+        for _ in self.gatherValue(header, variableType, variableSubType):
+            yield
+        if not self.standard:
+            for _ in self.gatherBytes(1):
+                yield
+        value, offset = self.decodeField(colferObject, variableType, variableSubType, index)
+        assert (offset == len(self.fieldBytes))
+        self.fieldBytes = None
+        self.result = value
+
+    def parseObject(self, colferObject):
+        index = 0
+        for name in dir(colferObject):
+            variableType, _, variableSubType = colferObject.getAttributeWithType(name)
+            for _ in self.parseField(colferObject, variableType, variableSubType, index):
+                yield
+            colferObject.setKnownAttribute(name, variableType, self.result, variableSubType)
+            index += 1
+        if self.standard:
+            for _ in self.takeTerminator():
+                yield
+        self.result = colferObject
+
+    def parseMessages(self):
+        while True:
+            for _ in self.need(1):
+                yield
+            self.inMessage = True
+            for _ in self.parseObject(self.colferType()):
+                yield
+            self.inMessage = False
+            self.completed.append(self.result)
+
+
+def decodeStream(colferType, chunks, wireFormat=None, stringTable=None):
+    """
+    Yields the messages of an iterable of chunks, e.g. ``iter(lambda: sock.recv(65536), b'')``.
+    """
+    decoder = ColferDecoder(colferType, wireFormat, stringTable)
+    for chunk in chunks:
+        for colferObject in decoder.feed(chunk):
+            yield colferObject
+    decoder.close()
@@ -1,15 +1,37 @@
+import array
 import datetime
+import struct
+import sys
 
-from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants
+from .colf_base import TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants, \
+    CodecOptionsMixin, ColferFileInput, ColferLazyString, COLFER_EPOCH, COLFER_NANOSECONDS, COLFER_PACKED_FORMATS, \
+    COLFER_ARRAY_TYPECODES, COLFER_FIXED_LAYOUTS
 
 
-class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, ColferConstants):
+class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncodeUtils, UTFUtils, CodecOptionsMixin):
 
     def unmarshallHeader(self, value, byteInput, offset):
+        if self.getWireFormat() == ColferConstants.COLFER_WIRE_STANDARD:
+            return value, offset
         assert(byteInput[offset] == 0x7f)
         offset += 1
         return value, offset
 
+    def unmarshallFooter(self, byteInput, offset):
+        if self.getWireFormat() == ColferConstants.COLFER_WIRE_STANDARD:
+            assert(byteInput[offset] == 0x7f)
+            offset += 1
+        return offset
+
+    def unmarshallNested(self, byteInput, offset):
+        value = type(self)()
+        if self.__dict__.get('__encodings') is not None:
+            value.cacheEncodings()
+        options = self.getCodecOptions()
+        if options:
+            return value.withCodecOptions(options, value.unmarshall, byteInput, offset)
+        return value.unmarshall(byteInput, offset)
+
     def unmarshallInt(self, byteInput, offset, length):
         value = 0
         for index in range(length):
@@ -36,9 +58,39 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
         return value, offset
 
+    def getInputBuffer(self, byteInput):
+        assert (byteInput is not None)
+        if self.isBinary(byteInput) or type(byteInput) is ColferFileInput:
+            return byteInput
+        assert (self.isBuffer(byteInput))
+        if isinstance(byteInput, memoryview):
+            return byteInput
+        return memoryview(byteInput)
+
+    def unmarshallBytes(self, byteInput, offset, length):
+        valueAsBytes = byteInput[offset:offset+length]
+        # Do not keep views into the input alive, e.g. into a mapping that is about to be closed.
+        if type(valueAsBytes) is memoryview:
+            valueAsBytes = valueAsBytes.tobytes()
+        return valueAsBytes, offset+length
+
+    def unmarshallLazyString(self, byteInput, offset, length):
+        # A view into immutable bytes instead of a copy; a view into anything else, e.g. a bytearray or an mmap,
+        # would keep it from being resized or closed.
+        if type(byteInput) is memoryview and type(getattr(byteInput, 'obj', None)) is bytes:
+            return ColferLazyString(byteInput[offset:offset+length]), offset+length
+        if type(byteInput) is bytes:
+            return ColferLazyString(memoryview(byteInput)[offset:offset+length]), offset+length
+        return ColferLazyString(bytes(byteInput[offset:offset+length])), offset+length
+
+    def unmarshallBlob(self, byteInput, offset, length):
+        if type(byteInput) is ColferFileInput and length >= byteInput.threshold:
+            return byteInput.getBlob(offset, length), offset+length
+        return self.unmarshallBytes(byteInput, offset, length)
+
     def unmarshallBool(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
         value = True
@@ -47,7 +99,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallUint8(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
         value = byteInput[offset]; offset += 1
@@ -56,7 +108,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallUint16(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsCompressed = True if byteInput[offset] & 0x80 else False
 
@@ -73,7 +125,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallInt32(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsSigned = True if byteInput[offset] & 0x80 else False
 
@@ -87,7 +139,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallListInt32(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -109,7 +161,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallUint32(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsFlat = True if byteInput[offset] & 0x80 else False
 
@@ -126,7 +178,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallInt64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsSigned = True if byteInput[offset] & 0x80 else False
 
@@ -140,7 +192,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallListInt64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -161,7 +213,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallUint64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsFlat = True if byteInput[offset] & 0x80 else False
 
@@ -178,7 +230,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallFloat32(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -191,7 +243,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallListFloat32(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -213,7 +265,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallFloat64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -226,7 +278,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallListFloat64(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -247,7 +299,7 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
 
     def unmarshallTimestamp(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         indexIsFlat = True if byteInput[offset] & 0x80 else False
 
@@ -260,15 +312,16 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             seconds, offset = self.unmarshallInt(byteInput, offset, 4)
             nanoSeconds, offset = self.unmarshallInt(byteInput, offset, 4)
 
-        timeDelta = datetime.timedelta(seconds=seconds, microseconds=nanoSeconds//1000)
-
-        value = datetime.datetime.utcfromtimestamp(0) + timeDelta
+        if self.getTimestampMode() == ColferConstants.COLFER_TIMESTAMP_NANOSECONDS:
+            value = seconds * COLFER_NANOSECONDS + nanoSeconds
+        else:
+            value = COLFER_EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoSeconds//1000)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallBinary(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -277,13 +330,13 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
 
         # Flat
-        value = byteInput[offset:offset+valueLength]; offset += valueLength
+        value, offset = self.unmarshallBlob(byteInput, offset, valueLength)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallListBinary(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -298,14 +351,14 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             valueLength, offset = self.unmarshallVarInt(byteInput, offset)
             assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
             # Flat
-            valueAsBytes = byteInput[offset:offset + valueLength]; offset += valueLength
+            valueAsBytes, offset = self.unmarshallBlob(byteInput, offset, valueLength)
             value.append(valueAsBytes)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallString(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -314,14 +367,21 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
 
         # Flat
-        valueAsBytes = byteInput[offset:offset+valueLength]; offset += valueLength
-        value = self.decodeUTFBytes(valueAsBytes)
+        if self.getCodecOption('lazyStrings'):
+            value, offset = self.unmarshallLazyString(byteInput, offset, valueLength)
+            return self.unmarshallHeader(value, byteInput, offset)
+        valueAsBytes, offset = self.unmarshallBytes(byteInput, offset, valueLength)
+        stringTable = self.getCodecOption('stringTable')
+        if stringTable is not None:
+            value = stringTable.decode(valueAsBytes, self.decodeUTFBytes)
+        else:
+            value = self.decodeUTFBytes(valueAsBytes)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallListString(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -330,31 +390,40 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
 
         value = []
+        lazyStrings = self.getCodecOption('lazyStrings')
+        stringTable = self.getCodecOption('stringTable')
         # Flat
         for _ in range(valueLength):
             # Compressed Path
             valueLength, offset = self.unmarshallVarInt(byteInput, offset)
             assert (valueLength <= ColferConstants.COLFER_MAX_SIZE)
             # Flat
-            valueAsBytes = byteInput[offset:offset + valueLength]; offset += valueLength
-            value.append(self.decodeUTFBytes(valueAsBytes))
+            if lazyStrings:
+                valueAsString, offset = self.unmarshallLazyString(byteInput, offset, valueLength)
+                value.append(valueAsString)
+                continue
+            valueAsBytes, offset = self.unmarshallBytes(byteInput, offset, valueLength)
+            if stringTable is not None:
+                value.append(stringTable.decode(valueAsBytes, self.decodeUTFBytes))
+            else:
+                value.append(self.decodeUTFBytes(valueAsBytes))
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallObject(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
         # Flat
-        value, offset = type(self)().unmarshall(byteInput, offset)
+        value, offset = self.unmarshallNested(byteInput, offset)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
     def unmarshallListObject(self, index, byteInput, offset):
         if (byteInput[offset] & 0x7f) != index:
-            return None, offset
+            return self.unmarshallHeader(None, byteInput, offset)
 
         offset += 1
 
@@ -366,11 +435,94 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         # Flat
         for _ in range(valueLength):
             # Flat
-            valueAsObject, offset = type(self)().unmarshall(byteInput, offset)
+            valueAsObject, offset = self.unmarshallNested(byteInput, offset)
             value.append(valueAsObject)
 
         return self.unmarshallHeader(value, byteInput, offset)
 
+    def unmarshallPacked(self, byteInput, offset, elementFormat):
+        # Compressed Path
+        valueLength, offset = self.unmarshallVarInt(byteInput, offset)
+        assert (valueLength <= ColferConstants.COLFER_LIST_MAX)
+
+        # Flat
+        valueAsBytes, offset = self.unmarshallBytes(byteInput, offset, valueLength * struct.calcsize('>' + elementFormat))
+        return valueAsBytes, valueLength, offset
+
+    def unpackElements(self, valueAsBytes, elementFormat):
+        elementSize = struct.calcsize('>' + elementFormat)
+        typecode = COLFER_ARRAY_TYPECODES.get(elementSize)
+        if typecode is None:  # pragma: no cover
+            return list(struct.unpack('>{}{}'.format(len(valueAsBytes) // elementSize, elementFormat), valueAsBytes))
+        value = array.array(typecode)
+        if hasattr(value, 'frombytes'):
+            value.frombytes(valueAsBytes)
+        else:  # pragma: no cover
+            value.fromstring(bytes(valueAsBytes))
+        if elementSize > 1 and sys.byteorder == 'little':
+            value.byteswap()
+        return value
+
+    def unmarshallListBool(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, _, offset = self.unmarshallPacked(byteInput, offset + 1, COLFER_PACKED_FORMATS['bool'])
+        value = list(map(bool, bytearray(valueAsBytes)))
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListUint8(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, _, offset = self.unmarshallPacked(byteInput, offset + 1, COLFER_PACKED_FORMATS['uint8'])
+        value = self.unpackElements(valueAsBytes, COLFER_PACKED_FORMATS['uint8'])
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListUint16(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, _, offset = self.unmarshallPacked(byteInput, offset + 1, COLFER_PACKED_FORMATS['uint16'])
+        value = self.unpackElements(valueAsBytes, COLFER_PACKED_FORMATS['uint16'])
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListUint32(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, _, offset = self.unmarshallPacked(byteInput, offset + 1, COLFER_PACKED_FORMATS['uint32'])
+        value = self.unpackElements(valueAsBytes, COLFER_PACKED_FORMATS['uint32'])
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListUint64(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, _, offset = self.unmarshallPacked(byteInput, offset + 1, COLFER_PACKED_FORMATS['uint64'])
+        value = self.unpackElements(valueAsBytes, COLFER_PACKED_FORMATS['uint64'])
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
+    def unmarshallListTimestamp(self, index, byteInput, offset):
+        if (byteInput[offset] & 0x7f) != index:
+            return self.unmarshallHeader(None, byteInput, offset)
+
+        valueAsBytes, valueLength, offset = self.unmarshallPacked(byteInput, offset + 1,
+                                                                  COLFER_PACKED_FORMATS['datetime'])
+        parts = struct.unpack('>' + COLFER_PACKED_FORMATS['datetime'] * valueLength, valueAsBytes)
+        if self.getTimestampMode() == ColferConstants.COLFER_TIMESTAMP_NANOSECONDS:
+            value = [seconds * COLFER_NANOSECONDS + nanoSeconds for seconds, nanoSeconds in zip(parts[::2], parts[1::2])]
+        else:
+            value = [COLFER_EPOCH + datetime.timedelta(seconds=seconds, microseconds=nanoSeconds//1000)
+                     for seconds, nanoSeconds in zip(parts[::2], parts[1::2])]
+
+        return self.unmarshallHeader(value, byteInput, offset)
+
     def unmarshallList(self, index, byteInput, offset, variableSubType=None):
         STRING_TYPES_MAP = {
             'int32': ColferUnmarshallerMixin.unmarshallListInt32,
@@ -382,6 +534,13 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
             'str': ColferUnmarshallerMixin.unmarshallListString,
             'unicode': ColferUnmarshallerMixin.unmarshallListString,
             'object': ColferUnmarshallerMixin.unmarshallListObject,
+            'bool': ColferUnmarshallerMixin.unmarshallListBool,
+            'uint8': ColferUnmarshallerMixin.unmarshallListUint8,
+            'uint16': ColferUnmarshallerMixin.unmarshallListUint16,
+            'uint32': ColferUnmarshallerMixin.unmarshallListUint32,
+            'uint64': ColferUnmarshallerMixin.unmarshallListUint64,
+            'datetime': ColferUnmarshallerMixin.unmarshallListTimestamp,
+            'timestamp': ColferUnmarshallerMixin.unmarshallListTimestamp,
         }
 
         if variableSubType in STRING_TYPES_MAP:
@@ -419,17 +578,29 @@ class ColferUnmarshallerMixin(TypeCheckMixin, RawFloatConvertUtils, IntegerEncod
         else:  # pragma: no cover
             return None, offset
 
-    def unmarshall(self, byteInput, offset=0):
-        assert (byteInput is not None)
-        assert (self.isBinary(byteInput))
+    def unmarshall(self, byteInput, offset=0, wireFormat=None):
+        if wireFormat is not None:
+            return self.withCodecOptions({'wireFormat': wireFormat}, self.unmarshall, byteInput, offset)
+        byteInput = self.getInputBuffer(byteInput)
         assert (offset >= 0)
+        layout = COLFER_FIXED_LAYOUTS.get(type(self))
+        if layout is not None and layout.matches(self):
+            newOffset = layout.unmarshall(self, byteInput, offset)
+            if newOffset is not None:
+                return self, newOffset
+        encodings = self.getEncodingCache(byteInput)
         index = 0
         for name in dir(self):
             variableType, _, variableSubType = self.getAttributeWithType(name)
-            newValue, offset = self.unmarshallType(variableType, variableSubType, index, byteInput, offset)
+            newValue, newOffset = self.unmarshallType(variableType, variableSubType, index, byteInput, offset)
             self.setKnownAttribute(name, variableType, newValue, variableSubType)
+            if encodings is not None:
+                value = self.getAttributeWithType(name)[1]
+                if self.isEncodingCacheable(variableType, variableSubType, value):
+                    encodings[name] = (self.getEncodingSnapshot(value), bytes(byteInput[offset:newOffset]))
+            offset = newOffset
             index += 1
-        return self, offset
+        return self, self.unmarshallFooter(byteInput, offset)
 
     def getAttributeWithType(self, name):  # pragma: no cover
         value = self.__getattr__(name)
@@ -0,0 +1,282 @@
+"""
+colf.log: Durable, append-only log of Colfer records in size-rolled segment files.
+
+Every segment starts with ``COLFER_LOG_MAGIC`` followed by frames of a 4 byte message length, the
+CRC32 of the message (both big endian) and the message. Appends are fsynced in groups, a torn tail
+left by a crash is truncated when the log is opened, and ``compactLog`` keeps the latest record per key.
+"""
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+import zlib
+
+from .colf_base import ColferConstants
+from .colf_record import marshallToBytes
+
+COLFER_LOG_MAGIC = b'COLFLOG\x01'
+COLFER_LOG_SUFFIX = '.colflog'
+COLFER_LOG_FRAME = struct.Struct('>II')
+
+
+def getSegmentName(segmentId):
+    return '{:020d}{}'.format(segmentId, COLFER_LOG_SUFFIX)
+
+
+def listSegments(directory):
+    return sorted(int(name[:-len(COLFER_LOG_SUFFIX)]) for name in os.listdir(directory)
+                  if name.endswith(COLFER_LOG_SUFFIX) and name[:-len(COLFER_LOG_SUFFIX)].isdigit())
+
+
+def getChecksum(message):
+    return zlib.crc32(message) & 0xffffffff
+
+
+def syncDirectory(directory):
+    try:
+        descriptor = os.open(directory, os.O_RDONLY)
+    except OSError:  # pragma: no cover
+        return
+    try:
+        os.fsync(descriptor)
+    except OSError:  # pragma: no cover
+        pass
+    finally:
+        os.close(descriptor)
+
+
+def iterFrames(byteInput, offset=len(COLFER_LOG_MAGIC)):
+    """
+    Yields ``(offset, start, end)`` for every intact frame of a segment, stopping at the first torn or corrupt one.
+    Colfer messages are never empty, so a zero length (e.g. a zero filled tail) also ends the valid frames.
+    """
+    inputLength = len(byteInput)
+    while offset + COLFER_LOG_FRAME.size <= inputLength:
+        length, checksum = COLFER_LOG_FRAME.unpack_from(byteInput, offset)
+        start = offset + COLFER_LOG_FRAME.size
+        end = start + length
+        if not length or length > ColferConstants.COLFER_MAX_SIZE or end > inputLength \
+                or getChecksum(byteInput[start:end]) != checksum:
+            return
+        yield offset, start, end
+        offset = end
+
+
+def getValidLength(path):
+    size = os.path.getsize(path)
+    if size < len(COLFER_LOG_MAGIC):
+        return 0
+    with open(path, 'rb') as segmentFile:
+        segmentMap = mmap.mmap(segmentFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if segmentMap[:len(COLFER_LOG_MAGIC)] != COLFER_LOG_MAGIC:
+                raise ValueError('{} is not a Colfer log segment'.format(path))
+            validLength = len(COLFER_LOG_MAGIC)
+            for _, _, end in iterFrames(segmentMap):
+                validLength = end
+            return validLength
+        finally:
+            segmentMap.close()
+
+
+def recoverCompaction(directory):
+    # compactLog swaps directory.compact in via directory.old; finish or roll back an interrupted swap.
+    compactDirectory = directory + '.compact'
+    oldDirectory = directory + '.old'
+    if os.path.isdir(oldDirectory):
+        if not os.path.isdir(directory):
+            os.rename(compactDirectory, directory)
+        shutil.rmtree(oldDirectory)
+    elif os.path.isdir(compactDirectory):
+        shutil.rmtree(compactDirectory)
+
+
+class ColferLog(object):
+    """
+    Appends records of ``colferType`` to segments of up to ``segmentSize`` bytes in ``directory``.
+
+    ``append`` returns the position ``(segmentId, offset)`` of the record. Appends are fsynced together
+    once ``syncRecords`` records or ``syncInterval`` seconds have accumulated, or on ``commit()``/``close()``;
+    pass ``syncRecords=1`` to sync every record. Reads map the segments with mmap.
+    """
+
+    def __init__(self, directory, colferType, segmentSize=64 * 1024 * 1024, syncRecords=1000, syncInterval=1.0):
+        self.directory = directory
+        self.colferType = colferType
+        self.segmentSize = segmentSize
+        self.syncRecords = syncRecords
+        self.syncInterval = syncInterval
+        self.lock = threading.RLock()
+        self.scratch = bytearray(1024)
+        self.pendingRecords = 0
+        self.lastSync = time.time()
+        self.segmentFile = None
+
+        recoverCompaction(directory)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        segments = listSegments(directory)
+        if segments:
+            self.recoverSegment(segments[-1])
+            self.openSegment(segments[-1])
+        else:
+            self.openSegment(0)
+
+    def getPath(self, segmentId):
+        return os.path.join(self.directory, getSegmentName(segmentId))
+
+    def getSegments(self):
+        return listSegments(self.directory)
+
+    def recoverSegment(self, segmentId):
+        path = self.getPath(segmentId)
+        validLength = getValidLength(path)
+        if validLength != os.path.getsize(path):
+            with open(path, 'r+b') as segmentFile:
+                segmentFile.truncate(validLength)
+                segmentFile.flush()
+                os.fsync(segmentFile.fileno())
+
+    def openSegment(self, segmentId):
+        path = self.getPath(segmentId)
+        self.segmentId = segmentId
+        self.segmentFile = open(path, 'ab')
+        self.segmentLength = self.segmentFile.tell()
+        if not self.segmentLength:
+            self.segmentFile.write(COLFER_LOG_MAGIC)
+            self.segmentLength = len(COLFER_LOG_MAGIC)
+            self.syncSegment()
+            syncDirectory(self.directory)
+
+    def syncSegment(self):
+        self.segmentFile.flush()
+        os.fsync(self.segmentFile.fileno())
+        self.pendingRecords = 0
+        self.lastSync = time.time()
+
+    def rollSegment(self):
+        self.syncSegment()
+        self.segmentFile.close()
+        self.openSegment(self.segmentId + 1)
+
+    def append(self, colferObject):
+        with self.lock:
+            self.scratch, length = marshallToBytes(colferObject, byteOutput=self.scratch)
+            message = memoryview(self.scratch)[:length]
+            frameLength = COLFER_LOG_FRAME.size + length
+            if self.segmentLength > len(COLFER_LOG_MAGIC) and self.segmentLength + frameLength > self.segmentSize:
+                self.rollSegment()
+            position = (self.segmentId, self.segmentLength)
+            self.segmentFile.write(COLFER_LOG_FRAME.pack(length, getChecksum(message)))
+            self.segmentFile.write(message)
+            self.segmentLength += frameLength
+            self.pendingRecords += 1
+            if (self.syncRecords and self.pendingRecords >= self.syncRecords) \
+                    or time.time() - self.lastSync >= self.syncInterval:
+                self.syncSegment()
+            return position
+
+    def commit(self):
+        with self.lock:
+            if self.pendingRecords:
+                self.syncSegment()
+
+    def close(self):
+        with self.lock:
+            if self.segmentFile is not None:
+                self.syncSegment()
+                self.segmentFile.close()
+                self.segmentFile = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def iterEntries(self, start=None):
+        """
+        Yields ``(position, record)`` from ``start`` (a position returned by ``append``) or the beginning.
+        """
+        with self.lock:
+            if self.segmentFile is not None:
+                self.segmentFile.flush()
+        for segmentId in self.getSegments():
+            if start is not None and segmentId < start[0]:
+                continue
+            offset = start[1] if start is not None and segmentId == start[0] else len(COLFER_LOG_MAGIC)
+            for entry in iterSegment(self.getPath(segmentId), segmentId, self.colferType, offset):
+                yield entry
+
+    def iterRecords(self, start=None):
+        for _, colferObject in self.iterEntries(start):
+            yield colferObject
+
+    def read(self, position):
+        for _, colferObject in self.iterEntries(position):
+            return colferObject
+        raise KeyError('No record at {}'.format(position))
+
+
+def iterSegment(path, segmentId, colferType, offset=len(COLFER_LOG_MAGIC)):
+    # Every message is copied out of the map, so records decoded from it (e.g. with lazy strings or memoryviews)
+    # do not keep the map exported and it can be closed.
+    if os.path.getsize(path) <= offset:
+        return
+    with open(path, 'rb') as segmentFile:
+        segmentMap = mmap.mmap(segmentFile.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for frameOffset, start, end in iterFrames(segmentMap, offset):
+                message = segmentMap[start:end]
+                try:
+                    colferObject, newOffset = colferType().unmarshall(message)
+                except (AssertionError, IndexError):  # The decoders assert their terminators.
+                    newOffset = None
+                if newOffset != len(message):
+                    raise ValueError('Corrupt record at offset {} of {}'.format(frameOffset, path))
+                yield (segmentId, frameOffset), colferObject
+        finally:
+            segmentMap.close()
+
+
+def getKey(value):
+    if isinstance(value, (bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, list):
+        return tuple(getKey(element) for element in value)
+    return value
+
+
+def compactLog(directory, colferType, keyField, segmentSize=64 * 1024 * 1024):
+    """
+    Rewrites a closed log keeping only the latest record per value of ``keyField``, in their original order.
+    The compacted log is built next to ``directory`` and swapped in; opening the log completes or rolls back
+    an interrupted compaction. Returns the number of records kept.
+    """
+    recoverCompaction(directory)
+    source = ColferLog(directory, colferType, segmentSize)
+    try:
+        latest = {}
+        for position, colferObject in source.iterEntries():
+            latest[getKey(getattr(colferObject, keyField))] = position
+        kept = set(latest.values())
+
+        compactDirectory = directory + '.compact'
+        if os.path.isdir(compactDirectory):
+            shutil.rmtree(compactDirectory)
+        with ColferLog(compactDirectory, colferType, segmentSize, syncRecords=None, syncInterval=float('inf')) \
+                as compacted:
+            for position, colferObject in source.iterEntries():
+                if position in kept:
+                    compacted.append(colferObject)
+    finally:
+        source.close()
+
+    syncDirectory(compactDirectory)
+    os.rename(directory, directory + '.old')
+    os.rename(compactDirectory, directory)
+    syncDirectory(os.path.dirname(os.path.abspath(directory)))
+    shutil.rmtree(directory + '.old')
+    return len(kept)
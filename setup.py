@@ -38,4 +38,5 @@ setup(name='colf',
       include_package_data=True,
       zip_safe=True,
       install_requires=list(get_requirements()),
+      extras_require={'numpy': ['numpy']},
      )
@@ -0,0 +1,237 @@
+import array
+import datetime
+
+from colf import Colfer
+from colf.colf_base import ColferLazyString
+from colf.colf_frozen import FrozenColfer, ColferEncodeCache
+
+
+class StandardType(Colfer):
+    COLFER_WIRE_FORMAT = Colfer.COLFER_WIRE_STANDARD
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('a', 'uint32')
+        self.declareAttribute('b', 'bool')
+        self.declareAttribute('c', 'str')
+        self.declareAttribute('d', 'object')
+        self.declareAttribute('e', 'int64')
+
+
+class StandardExampleMixin(object):
+
+    def getExampleObject(self, colferType=None):
+        exampleObject = (colferType or StandardType)()
+        exampleObject.a = 1
+        exampleObject.b = True
+        exampleObject.c = 'hi'
+        exampleObject.d = (colferType or StandardType)()
+        exampleObject.d.e = -2
+        return exampleObject
+
+
+class EventType(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('child', 'object')
+        self.declareAttribute('count', 'uint32')
+        self.declareAttribute('delta', 'int64')
+        self.declareAttribute('host', 'str')
+        self.declareAttribute('id', 'uint64')
+        self.declareAttribute('message', 'str')
+        self.declareAttribute('parts', 'list', variableSubType='bytes')
+        self.declareAttribute('payload', 'bytes')
+        self.declareAttribute('ratio', 'float64')
+        self.declareAttribute('tags', 'list', variableSubType='str')
+        self.declareAttribute('time', 'datetime')
+
+
+class LazyEventType(EventType):
+
+    def __init__(self):
+        super(LazyEventType, self).__init__()
+        self.__dict__['__codecOptions'] = {'lazyStrings': True}
+
+
+class NanosecondEventType(EventType):
+    COLFER_TIMESTAMP_MODE = Colfer.COLFER_TIMESTAMP_NANOSECONDS
+
+
+class StandardEventType(NanosecondEventType):
+    COLFER_WIRE_FORMAT = Colfer.COLFER_WIRE_STANDARD
+
+
+class TickType(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('ask', 'float64')
+        self.declareAttribute('bid', 'float32')
+        self.declareAttribute('flags', 'uint8')
+        self.declareAttribute('seen', 'datetime')
+        self.declareAttribute('sequence', 'uint64')
+        self.declareAttribute('size', 'uint32')
+        self.declareAttribute('venue', 'uint16')
+
+
+class PlainTickType(TickType):
+    pass
+
+
+class SignedTickType(TickType):
+
+    def __init__(self):
+        super(SignedTickType, self).__init__()
+        self.declareAttribute('change', 'int32')
+        self.declareAttribute('halted', 'bool')
+
+
+class LabelledTickType(SignedTickType):
+
+    def __init__(self):
+        super(LabelledTickType, self).__init__()
+        self.declareAttribute('label', 'str')
+
+
+class QuoteType(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('price', 'float64')
+        self.declareAttribute('symbol', 'str')
+
+
+class HistogramType(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('buckets', 'list', variableSubType='uint16')
+        self.declareAttribute('counts', 'list', variableSubType='uint32')
+        self.declareAttribute('flags', 'list', variableSubType='bool')
+        self.declareAttribute('name', 'str')
+        self.declareAttribute('levels', 'list', variableSubType='uint8')
+        self.declareAttribute('times', 'list', variableSubType='datetime')
+        self.declareAttribute('totals', 'list', variableSubType='uint64')
+
+
+class ScannedType(Colfer):
+
+    def __init__(self):
+        super(Colfer, self).__init__()
+        self.declareAttribute('active', 'bool')
+        self.declareAttribute('children', 'list', variableSubType='object')
+        self.declareAttribute('count', 'uint16')
+        self.declareAttribute('id', 'uint64')
+        self.declareAttribute('parent', 'object')
+        self.declareAttribute('path', 'str')
+        self.declareAttribute('samples', 'list', variableSubType='float64')
+        self.declareAttribute('score', 'float32')
+        self.declareAttribute('time', 'datetime')
+        self.declareAttribute('zone', 'int32')
+
+
+class SettingsType(FrozenColfer):
+
+    def __init__(self):
+        super(FrozenColfer, self).__init__()
+        self.declareAttribute('name', 'str')
+        self.declareAttribute('limits', 'list', variableSubType='int64')
+        self.declareAttribute('parent', 'object')
+        self.declareAttribute('salt', 'bytearray')
+        self.declareAttribute('updated', 'datetime')
+
+
+class CachedSettingsType(SettingsType):
+    COLFER_ENCODE_CACHE = ColferEncodeCache(4096)
+
+
+def createObject(colferType, **values):
+    colferObject = colferType()
+    for name, value in values.items():
+        colferObject[name] = value
+    return colferObject
+
+
+def getEvent(position=0, colferType=EventType, **values):
+    event = colferType()
+    event.id = position + 1
+    event.time = datetime.datetime(2022, 1, 1) + datetime.timedelta(seconds=position)
+    event.host = u'host-{}'.format(position % 4)
+    event.message = u'request served in {} ms'.format(position % 17)
+    for name, value in values.items():
+        event[name] = value
+    return event
+
+
+def getEvents(count=500):
+    return [getEvent(position) for position in range(count)]
+
+
+def getTick(position=0, colferType=TickType, **values):
+    tick = colferType()
+    tick.ask = 101.25 + position * 1.5
+    tick.bid = 100.5 + position * 0.5
+    tick.flags = 3
+    tick.seen = datetime.datetime(2021, 1, 2, 3, 4, 5, 6000) + datetime.timedelta(seconds=position)
+    tick.sequence = 7 + position * 2 ** 40
+    tick.size = position * 10
+    tick.venue = 12
+    for name, value in values.items():
+        tick[name] = value
+    return tick
+
+
+def getHistogram(name=u'latency'):
+    histogram = HistogramType()
+    histogram.buckets = [0, 1, 255, 256, 65535]
+    histogram.counts = array.array('I', [0, 7, 2 ** 32 - 1])
+    histogram.flags = [True, False, True]
+    histogram.name = name
+    histogram.levels = array.array('B', b'\x00\x01\xff')
+    histogram.times = [datetime.datetime(1969, 12, 31, 23, 59, 59, 1), datetime.datetime(2030, 1, 1, 0, 0, 0, 999)]
+    histogram.totals = [2 ** 64 - 1, 0, 12345678901234]
+    return histogram
+
+
+def getScanned(position):
+    record = ScannedType()
+    record.active = position % 3 == 0
+    record.count = position * 331 % 65536
+    record.id = position * 2 ** 44 if position % 5 == 0 else position
+    record.path = u'/var/{}/{}'.format('log' if position % 4 else 'lib', position)
+    record.samples = [position * 0.5] * (position % 3)
+    record.score = position * 0.25
+    record.time = datetime.datetime(2023, 1, 1) + datetime.timedelta(hours=position, microseconds=position % 2)
+    record.zone = position % 7 - 3
+    if position % 2:
+        record.parent = ScannedType()
+        record.parent.path = u'parent'
+        record.children = [ScannedType(), record.parent]
+    return record
+
+
+def getSettings(colferType=SettingsType, name=u'defaults'):
+    settings = colferType()
+    settings.name = name
+    settings.limits = [1, -2, 3]
+    settings.salt = bytearray(b'salt')
+    settings.updated = datetime.datetime(2020, 2, 2)
+    settings.parent = colferType()
+    settings.parent.name = u'root'
+    return settings
+
+
+def toPlain(value):
+    """
+    Plain dicts and lists of ``value`` for comparisons: Colfer objects compare equal to each other whatever they hold.
+    """
+    if isinstance(value, Colfer):
+        return dict((name, toPlain(fieldValue)) for name, fieldValue in value.items())
+    if isinstance(value, (list, tuple, array.array)):
+        return [toPlain(element) for element in value]
+    if isinstance(value, bytearray):
+        return bytes(value)
+    if isinstance(value, ColferLazyString):
+        return value.getValue()
+    return value
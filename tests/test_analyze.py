@@ -0,0 +1,66 @@
+import io
+import unittest
+
+from colf import Colfer
+from colf.analyze import ColferAnalyzer, analyzeRecords, getBucket, getVarIntLength
+from colf.colf_record import ColferRecordWriter, marshallToBytes
+from tests.helpers import EventType, createObject
+
+
+class TestAnalyze(unittest.TestCase):
+
+    def getRecords(self):
+        first = createObject(EventType, count=5, delta=-300, host=u'alpha', tags=['a', 'bb', 'ccc'],
+                             child=createObject(EventType, count=4000000000))
+        return [first, createObject(EventType, host=u'a much longer name')]
+
+    def testHelpers(self):
+        self.assertEqual(getVarIntLength(0), 1)
+        self.assertEqual(getVarIntLength(0x7f), 1)
+        self.assertEqual(getVarIntLength(0x80), 2)
+        self.assertEqual(getVarIntLength(2 ** 64 - 1, 8), 9)
+        self.assertEqual([getBucket(length) for length in (0, 1, 2, 3, 5, 16, 17)], [0, 1, 2, 4, 8, 16, 32])
+
+    def testReport(self):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output)
+        lengths = []
+        for record in self.getRecords():
+            _, length = marshallToBytes(record)
+            lengths.append(length)
+            writer.write(record)
+
+        report = analyzeRecords(EventType, output.getvalue())
+        self.assertEqual(report['records'], 2)
+        self.assertEqual(report['bytes'], sum(lengths))
+        fields = report['fields']
+        self.assertEqual(sum(field['bytes'] for path, field in fields.items() if '.' not in path), sum(lengths))
+        self.assertEqual((fields['count']['present'], fields['count']['absent']), (1, 1))
+        self.assertEqual((fields['count']['compressed'], fields['count']['flat']), (1, 0))
+        self.assertEqual(fields['count']['varIntLengths'], {1: 1})
+        self.assertEqual(fields['delta']['varIntLengths'], {2: 1})
+        self.assertEqual(fields['host']['lengthHistogram'], {8: 1, 32: 1})
+        self.assertEqual(fields['tags']['lengthHistogram'], {1: 1, 2: 1, 4: 1})
+        self.assertEqual(fields['tags']['countHistogram'], {4: 1})
+        self.assertEqual(fields['child.count']['flat'], 1)
+        self.assertEqual(fields['child.child']['absent'], 1)
+
+    def testUnframed(self):
+        byteInput = bytearray()
+        for record in self.getRecords():
+            byteOutput, length = marshallToBytes(record)
+            byteInput += byteOutput[:length]
+        report = analyzeRecords(EventType, io.BytesIO(bytes(byteInput)), framed=False)
+        self.assertEqual(report['records'], 2)
+        self.assertEqual(report['bytes'], len(byteInput))
+
+    def testTemplateInstance(self):
+        template = Colfer()
+        template.declareAttribute('v', 'uint64')
+        analyzer = ColferAnalyzer(template)
+        record = Colfer()
+        record.declareAttribute('v', 'uint64')
+        record.v = 2 ** 60
+        byteOutput, length = marshallToBytes(record)
+        self.assertEqual(analyzer.addMessage(byteOutput), length)
+        self.assertEqual(analyzer.report()['fields']['v']['flat'], 1)
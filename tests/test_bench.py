@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from colf import bench
+
+
+class TestBench(unittest.TestCase):
+
+    def testScenariosRoundTrip(self):
+        for scenario in bench.getScenarios():
+            colferObject = scenario.createObject()
+            byteOutput = bytearray(bench.ColferConstants.COLFER_MAX_SIZE)
+            length = colferObject.marshall(byteOutput)
+            unmarshalledObject, offset = scenario.colferType().unmarshall(byteOutput[:length])
+            self.assertEqual(offset, length, msg=scenario.name)
+            self.assertEqual(bench.toPlain(colferObject), bench.toPlain(unmarshalledObject), msg=scenario.name)
+
+    def testReport(self):
+        report = bench.runBenchmarks(iterations=2, maxTime=0.1, scenarioPattern='^(bool|uint32-flat|shape-small)$')
+        json.dumps(report)
+        self.assertEqual([scenario['scenario'] for scenario in report['scenarios']],
+                         ['bool', 'uint32-flat', 'shape-small'])
+        codecs = [result['codec'] for result in report['scenarios'][0]['results']]
+        self.assertEqual(codecs, ['colf', 'pickle', 'json', 'struct'])
+        for result in report['scenarios'][0]['results']:
+            self.assertTrue(result['encode']['iterations'] >= 1)
+            self.assertTrue(result['decode']['opsPerSecond'] > 0)
+
+    def testNoBaselines(self):
+        report = bench.runBenchmarks(iterations=1, maxTime=0.1, scenarioPattern='^str$', baselines=False)
+        self.assertEqual([result['codec'] for result in report['scenarios'][0]['results']], ['colf'])
+
+    def testMedian(self):
+        self.assertEqual(bench.getMedian([3, 1, 2]), 2)
+        self.assertEqual(bench.getMedian([4, 1, 2, 3]), 2.5)
+        self.assertEqual(bench.getMedianAbsoluteDeviation([1, 1, 2, 2, 4, 6, 9]), 1)
+
+    def getReport(self, encodeOps, decodeOps, mad=0.0):
+        return {'scenarios': [{'scenario': 'bool', 'results': [
+            {'codec': 'colf',
+             'encode': {'opsPerSecond': encodeOps, 'madOpsPerSecond': mad},
+             'decode': {'opsPerSecond': decodeOps, 'madOpsPerSecond': mad}},
+            {'codec': 'pickle',
+             'encode': {'opsPerSecond': 1.0, 'madOpsPerSecond': 0.0},
+             'decode': {'opsPerSecond': 1.0, 'madOpsPerSecond': 0.0}},
+        ]}]}
+
+    def testCompareReports(self):
+        baseline = self.getReport(1000.0, 1000.0)
+        comparisons = bench.compareReports(baseline, self.getReport(950.0, 800.0), threshold=0.1)
+        self.assertEqual([(comparison['operation'], comparison['regressed']) for comparison in comparisons],
+                         [('encode', False), ('decode', True)])
+        self.assertAlmostEqual(comparisons[1]['change'], -0.2)
+
+        noisy = bench.compareReports(baseline, self.getReport(800.0, 800.0, mad=100.0), threshold=0.1)
+        self.assertFalse(any(comparison['regressed'] for comparison in noisy))
+
+    def testRegressionGate(self):
+        directory = tempfile.mkdtemp()
+        try:
+            baselinePath = os.path.join(directory, 'baseline.json')
+            outputPath = os.path.join(directory, 'output.json')
+            arguments = ['--scenario', '^bool$', '--iterations', '2', '--max-time', '0.05',
+                         '--warmup', '1', '--repeat', '2', '--no-baselines', '--output', outputPath]
+            self.assertEqual(bench.main(arguments + ['--save-baseline', baselinePath]), 0)
+
+            baseline = bench.readJson(baselinePath)
+            for result in baseline['scenarios'][0]['results']:
+                result['encode']['opsPerSecond'] *= 1000
+            bench.writeJson(baseline, baselinePath)
+
+            self.assertEqual(bench.main(arguments + ['--compare', baselinePath]), 1)
+            report = bench.readJson(outputPath)
+            self.assertTrue(report['comparison'][0]['regressed'])
+        finally:
+            shutil.rmtree(directory)
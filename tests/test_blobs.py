@@ -0,0 +1,117 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from colf.colf_base import ColferBlob
+from colf.colf_record import ColferRecordWriter, ColferRecordReader, marshallToBytes
+from tests.helpers import EventType, createObject
+
+
+class ShortReader(io.BytesIO):
+    # Returns at most 3 bytes per readinto, like a pipe or socket.
+
+    def readinto(self, buffer):
+        return super(ShortReader, self).readinto(memoryview(buffer)[:3])
+
+
+class TestBlobs(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.content = bytes(bytearray(range(256))) * (12 * 1024)
+        self.path = os.path.join(self.directory, 'artifact.bin')
+        with open(self.path, 'wb') as artifactFile:
+            artifactFile.write(self.content)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def getArtifact(self, content):
+        return createObject(EventType, host=u'artifact', payload=content, count=len(content),
+                            parts=[b'small', ColferBlob(io.BytesIO(b'from a file object'))])
+
+    def getExpected(self):
+        byteOutput, length = marshallToBytes(self.getArtifact(self.content))
+        return bytes(byteOutput[:length])
+
+    def testBlobValue(self):
+        blob = ColferBlob(self.path)
+        self.assertEqual(len(blob), len(self.content))
+        self.assertEqual(blob.read(10), self.content[:10])
+        blob.seek(-5, os.SEEK_END)
+        self.assertEqual(blob.read(), self.content[-5:])
+        blob.close()
+        with open(self.path, 'rb') as artifactFile:
+            blob = ColferBlob(artifactFile, 100, 50)
+            self.assertEqual(blob.read(), self.content[50:150])
+        with self.assertRaises(AttributeError):
+            EventType().count = ColferBlob(self.path)
+
+    def testMarshallIntoBuffer(self):
+        byteOutput, length = marshallToBytes(self.getArtifact(ColferBlob(self.path)), sizeHint=16)
+        self.assertEqual(bytes(byteOutput[:length]), self.getExpected())
+
+    def testWriterStreams(self):
+        for outputPath in (None, os.path.join(self.directory, 'records.bin')):
+            output = io.BytesIO() if outputPath is None else open(outputPath, 'wb')
+            writer = ColferRecordWriter(output)
+            writer.write(self.getArtifact(ColferBlob(self.path)))
+            writer.write(EventType())
+            self.assertEqual(len(writer.scratch), 1024)
+            if outputPath is None:
+                written = output.getvalue()
+            else:
+                output.close()
+                with open(outputPath, 'rb') as recordFile:
+                    written = recordFile.read()
+            frames = list(ColferRecordReader(written).iterFrames())
+            self.assertEqual(len(frames), 2)
+            _, start, end = frames[0]
+            self.assertEqual(written[start:end], self.getExpected())
+
+    def testReaderBlobs(self):
+        recordsPath = os.path.join(self.directory, 'records.bin')
+        with open(recordsPath, 'wb') as output:
+            writer = ColferRecordWriter(output)
+            for position in range(3):
+                writer.write(self.getArtifact(ColferBlob(self.path) if position != 1 else b'inline'))
+
+        with open(recordsPath, 'rb') as source:
+            records = list(ColferRecordReader(source, blobThreshold=1024).iterRecords(EventType))
+            self.assertEqual(len(records), 3)
+            for record in records:
+                self.assertEqual(record.host, u'artifact')
+                self.assertEqual(record.parts, [bytearray(b'small'), bytearray(b'from a file object')])
+            self.assertTrue(isinstance(records[0].payload, ColferBlob))
+            self.assertEqual(records[1].payload, b'inline')
+            self.assertEqual(records[2].count, len(self.content))
+            # Blobs read independently of each other and of the reader position.
+            self.assertEqual(records[2].payload.read(7), self.content[:7])
+            self.assertEqual(records[0].payload.read(), self.content)
+            self.assertEqual(records[2].payload.read(), self.content[7:])
+
+            # A decoded blob can be written again without loading it.
+            output = io.BytesIO()
+            ColferRecordWriter(output).write(records[0])
+            _, start, end = next(ColferRecordReader(output.getvalue()).iterFrames())
+            self.assertEqual(output.getvalue()[start:end], self.getExpected())
+
+    def testShortReads(self):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output)
+        for position in range(3):
+            writer.write(self.getArtifact(b'inline content' * (position + 1)))
+        records = list(ColferRecordReader(ShortReader(output.getvalue()), blobThreshold=1024).iterRecords(EventType))
+        self.assertEqual([b'inline content' * (position + 1) for position in range(3)],
+                         [bytes(record.payload) for record in records])
+        self.assertEqual([14, 28, 42], [record.count for record in records])
+        self.assertEqual([u'artifact'] * 3, [record.host for record in records])
+
+    def testTruncatedBlobSource(self):
+        blob = ColferBlob(io.BytesIO(b'short'), 10)
+        with self.assertRaises(EOFError):
+            marshallToBytes(self.getArtifact(blob))
+        with self.assertRaises(EOFError):
+            ColferRecordWriter(io.BytesIO()).write(self.getArtifact(ColferBlob(io.BytesIO(b'short'), 10)))
@@ -0,0 +1,100 @@
+import array
+import datetime
+import mmap
+import unittest
+
+from colf.colf_record import ColferRecordReader
+from tests.helpers import EventType, createObject
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover
+    shared_memory = None
+
+
+class TestBuffers(unittest.TestCase):
+
+    def getExample(self):
+        return createObject(EventType, id=2 ** 40, ratio=0.25, time=datetime.datetime(2021, 3, 4, 5, 6, 7, 8),
+                            host=u'buffer', payload=b'\x00\x01\xff' * 100, tags=[u'a', u'bc'],
+                            child=createObject(EventType, host=u'child'))
+
+    def getEncoded(self, example):
+        byteOutput = bytearray(1024)
+        return bytes(byteOutput[:example.marshall(byteOutput)])
+
+    def assertDecoded(self, byteInput, offset, example):
+        decoded, _ = EventType().unmarshall(byteInput, offset)
+        self.assertEqual(decoded.id, example.id)
+        self.assertEqual(decoded.time, example.time)
+        self.assertEqual(decoded.payload, example.payload)
+        self.assertTrue(type(decoded.payload) is bytes)
+        self.assertEqual(decoded.tags, example.tags)
+        self.assertEqual(decoded.child.host, example.child.host)
+
+    def testMmap(self):
+        example = self.getExample()
+        encoded = self.getEncoded(example)
+        mapping = mmap.mmap(-1, 4096)
+        try:
+            offset = 1000
+            length = example.marshall(mapping, offset) - offset
+            self.assertEqual(length, len(encoded))
+            self.assertEqual(mapping[offset:offset + length], encoded)
+            self.assertEqual(mapping[:offset], b'\x00' * offset)
+            self.assertDecoded(mapping, offset, example)
+        finally:
+            mapping.close()
+
+    def testMemoryviewSlice(self):
+        example = self.getExample()
+        encoded = self.getEncoded(example)
+        arena = bytearray(4096)
+        window = memoryview(arena)[2048:]
+        length = example.marshall(window, 10) - 10
+        self.assertEqual(bytes(arena[2058:2058 + length]), encoded)
+        self.assertDecoded(window, 10, example)
+        self.assertDecoded(memoryview(encoded), 0, example)
+
+    def testArray(self):
+        example = self.getExample()
+        target = array.array('B', bytes(2048))
+        length = example.marshall(target, 5) - 5
+        self.assertEqual(target[5:5 + length].tobytes(), self.getEncoded(example))
+        self.assertDecoded(target, 5, example)
+
+    @unittest.skipIf(shared_memory is None, 'multiprocessing.shared_memory is not available')
+    def testSharedMemory(self):
+        example = self.getExample()
+        block = shared_memory.SharedMemory(create=True, size=4096)
+        try:
+            length = example.marshall(block.buf, 100) - 100
+            self.assertEqual(bytes(block.buf[100:100 + length]), self.getEncoded(example))
+            self.assertDecoded(block.buf, 100, example)
+        finally:
+            block.close()
+            block.unlink()
+
+    def testRecordsFromMmap(self):
+        example = self.getExample()
+        encoded = self.getEncoded(example)
+        mapping = mmap.mmap(-1, 2 * (len(encoded) + 2))
+        try:
+            for position in range(2):
+                mapping.write(bytes(bytearray([len(encoded) & 0x7f | 0x80, len(encoded) >> 7])))
+                mapping.write(encoded)
+            records = list(ColferRecordReader(mapping).iterRecords(EventType))
+            self.assertEqual([record.payload for record in records], [example.payload] * 2)
+        finally:
+            mapping.close()
+
+    def testRejectedOutputs(self):
+        example = self.getExample()
+        with self.assertRaises(AssertionError):
+            example.marshall(memoryview(bytes(1024)))
+        with self.assertRaises(AssertionError):
+            example.marshall(array.array('i', [0] * 256))
+        with self.assertRaises(IndexError):
+            example.marshall(memoryview(bytearray(100)))
+        with self.assertRaises(IndexError):
+            example.marshall(bytearray(100))
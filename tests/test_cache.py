@@ -0,0 +1,97 @@
+import datetime
+import unittest
+
+from colf import Colfer
+from colf.colf_marshall import ColferMarshallerMixin
+from colf.colf_record import marshallToBytes, marshallToSegments
+from tests.helpers import SettingsType, getSettings
+
+
+class TestEncodingCache(unittest.TestCase):
+
+    def getLargeSettings(self):
+        settings = getSettings(name=u'st\xe4te' * 50)
+        settings.salt = bytearray(b'p' * 300)
+        return settings
+
+    def assertFresh(self, settings):
+        # The cached encoding must equal the encoding of an uncached copy.
+        cachedOutput, cachedLength = marshallToBytes(settings)
+        settings.cacheEncodings(False)
+        settings.parent.cacheEncodings(False)
+        freshOutput, freshLength = marshallToBytes(settings)
+        settings.cacheEncodings()
+        settings.parent.cacheEncodings()
+        self.assertEqual(bytes(cachedOutput[:cachedLength]), bytes(freshOutput[:freshLength]))
+        return bytes(cachedOutput[:cachedLength])
+
+    def countEncodedFields(self, colferObject):
+        encoded = []
+        savedMarshallType = ColferMarshallerMixin.marshallType
+
+        def marshallType(self, variableType, variableSubType, value, index, byteOutput, offset):
+            encoded.append((type(self).__name__, index))
+            return savedMarshallType(self, variableType, variableSubType, value, index, byteOutput, offset)
+
+        ColferMarshallerMixin.marshallType = marshallType
+        try:
+            colferObject.marshall(bytearray(4096))
+        finally:
+            ColferMarshallerMixin.marshallType = savedMarshallType
+        return len(encoded)
+
+    def testOnlyChangedFieldsAreEncoded(self):
+        settings = self.getLargeSettings()
+        settings.cacheEncodings()
+        self.assertEqual(self.countEncodedFields(settings), 10)
+        # Only the object fields are marshalled again, on both levels.
+        self.assertEqual(self.countEncodedFields(settings), 2)
+        settings.updated = datetime.datetime(2021, 5, 4)
+        settings['name'] = u'renamed'
+        self.assertEqual(self.countEncodedFields(settings), 4)
+        settings.parent.name = u'base'
+        self.assertEqual(self.countEncodedFields(settings), 3)
+        settings.markDirty()
+        self.assertEqual(self.countEncodedFields(settings), 6)
+
+    def testChangesAreNoticed(self):
+        settings = self.getLargeSettings()
+        settings.cacheEncodings()
+        original = self.assertFresh(settings)
+        self.assertEqual(self.assertFresh(settings), original)
+
+        settings.limits.append(4)
+        self.assertNotEqual(self.assertFresh(settings), original)
+        settings.salt[0:1] = b'q'
+        settings.updated = datetime.datetime(2022, 1, 1)
+        settings.parent.limits = [9]
+        changed = self.assertFresh(settings)
+        decoded, _ = SettingsType().unmarshall(changed)
+        self.assertEqual(decoded.limits, [1, -2, 3, 4])
+        self.assertEqual(decoded.salt[:2], bytearray(b'qp'))
+        self.assertEqual(decoded.parent.limits, [9])
+
+        standardOutput = bytearray(4096)
+        standardLength = settings.marshall(standardOutput, wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        decoded, _ = SettingsType().unmarshall(standardOutput[:standardLength], wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(decoded.limits, settings.limits)
+        self.assertEqual(self.assertFresh(settings), changed)
+
+    def testDecodedEncodingsAreReused(self):
+        message = bytes(self.assertFresh(self.getLargeSettings()))
+        decoded = SettingsType()
+        decoded.cacheEncodings()
+        decoded.unmarshall(message)
+        self.assertEqual(self.countEncodedFields(decoded), 2)
+        decoded.name = u'decoded'
+        decoded.parent.limits = [5]
+        self.assertEqual(self.countEncodedFields(decoded), 4)
+        self.assertFresh(decoded)
+
+    def testSegmentedOutputBypassesCache(self):
+        settings = self.getLargeSettings()
+        settings.cacheEncodings()
+        flat = self.assertFresh(settings)
+        byteOutput, segments = marshallToSegments(settings, threshold=100)
+        self.assertGreater(len(segments), 1)
+        self.assertEqual(b''.join(bytes(segment) for segment in segments), flat)
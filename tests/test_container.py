@@ -0,0 +1,89 @@
+import io
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from colf.colf_container import ColferContainerWriter, ColferContainerReader, COLFER_CONTAINER_CODECS, \
+    registerCodec
+from tests.helpers import EventType, getEvents, toPlain
+
+
+class TestContainer(unittest.TestCase):
+
+    def writeContainer(self, events, codec='zlib', blockSize=4096):
+        output = io.BytesIO()
+        with ColferContainerWriter(output, codec, blockSize) as writer:
+            for event in events:
+                writer.write(event)
+        return output.getvalue()
+
+    def testRoundTrip(self):
+        events = getEvents()
+        for codec in COLFER_CONTAINER_CODECS:
+            container = self.writeContainer(events, codec)
+            reader = ColferContainerReader(container)
+            self.assertTrue(reader.getBlockCount() > 1)
+            self.assertEqual(reader.getRecordCount(), len(events))
+            self.assertEqual([event.id for event in reader.iterRecords(EventType)], [event.id for event in events])
+            decoded = list(ColferContainerReader(io.BytesIO(container)).iterRecords(EventType))
+            self.assertEqual([event.message for event in decoded], [event.message for event in events])
+
+    def testCompresses(self):
+        events = getEvents()
+        self.assertTrue(len(self.writeContainer(events, 'zlib')) * 3 < len(self.writeContainer(events, 'none')))
+
+    def testRandomAccess(self):
+        events = getEvents()
+        reader = ColferContainerReader(self.writeContainer(events))
+        decompressed = []
+        decompress = reader.decompress
+        reader.decompress = lambda block: decompressed.append(block) or decompress(block)
+        for recordNumber in (0, 1, 137, len(events) - 1):
+            self.assertEqual(reader.getRecord(EventType, recordNumber).id, events[recordNumber].id)
+        self.assertEqual(len(decompressed), 4)
+        with self.assertRaises(IndexError):
+            reader.getRecord(EventType, len(events))
+        lastBlock = reader.getBlockCount() - 1
+        self.assertEqual([event.id for event in reader.iterRecords(EventType, [lastBlock])][-1], len(events))
+
+    def testParallel(self):
+        events = getEvents()
+        reader = ColferContainerReader(self.writeContainer(events))
+        with ThreadPoolExecutor(4) as executor:
+            decoded = list(reader.iterRecords(EventType, executor=executor))
+        self.assertEqual([event.id for event in decoded], [event.id for event in events])
+        with ProcessPoolExecutor(2) as executor:
+            decoded = list(reader.iterRecords(EventType, executor=executor))
+        self.assertEqual([toPlain(event) for event in decoded], [toPlain(event) for event in events])
+
+    def testBoundedReadAhead(self):
+        events = getEvents()
+        reader = ColferContainerReader(self.writeContainer(events))
+        self.assertGreater(reader.getBlockCount(), 4)
+        readBlocks = []
+        readBlock = reader.readBlock
+        reader.readBlock = lambda blockNumber: readBlocks.append(blockNumber) or readBlock(blockNumber)
+        with ThreadPoolExecutor(1) as executor:
+            records = reader.iterRecords(EventType, executor=executor, readAhead=2)
+            self.assertEqual(next(records).id, events[0].id)
+            self.assertEqual([0, 1], readBlocks)
+            self.assertEqual([event.id for event in records], [event.id for event in events[1:]])
+            self.assertEqual(list(range(reader.getBlockCount())), readBlocks)
+
+    def testEmptyAndCustomCodec(self):
+        reader = ColferContainerReader(self.writeContainer([]))
+        self.assertEqual((reader.getBlockCount(), reader.getRecordCount()), (0, 0))
+        self.assertEqual(list(reader.iterRecords(EventType)), [])
+
+        registerCodec('reversed', lambda block: block[::-1], lambda block: block[::-1])
+        try:
+            events = getEvents(10)
+            decoded = list(ColferContainerReader(self.writeContainer(events, 'reversed')).iterRecords(EventType))
+            self.assertEqual([event.id for event in decoded], list(range(1, 11)))
+        finally:
+            del COLFER_CONTAINER_CODECS['reversed']
+
+    def testInvalid(self):
+        with self.assertRaises(ValueError):
+            ColferContainerReader(b'not a container at all')
+        with self.assertRaises(ValueError):
+            ColferContainerWriter(io.BytesIO(), 'unknown')
@@ -0,0 +1,113 @@
+import threading
+import unittest
+
+from colf.colf_base import ColferSegmentedOutput
+from colf.colf_frozen import FrozenColfer, ColferEncodeCache
+from colf.colf_record import marshallToBytes
+from tests.helpers import CachedSettingsType, EventType, SettingsType, getSettings
+
+
+class TestFrozen(unittest.TestCase):
+
+    def testMutableNestedObject(self):
+        for settingsType in (SettingsType, CachedSettingsType):
+            settings = getSettings(settingsType)
+            settings.parent = EventType()
+            with self.assertRaises(TypeError):
+                settings.freeze()
+            self.assertFalse(settings.isFrozen())
+            self.assertEqual(settings.limits, [1, -2, 3])
+
+    def testFreeze(self):
+        settings = getSettings()
+        with self.assertRaises(TypeError):
+            hash(settings)
+        frozen = settings.freeze()
+        self.assertIs(frozen, settings)
+        self.assertEqual(settings.limits, (1, -2, 3))
+        self.assertEqual(settings.salt, b'salt')
+        self.assertTrue(settings.parent.isFrozen())
+        for assign in (lambda: setattr(settings, 'name', u'x'), lambda: settings.__setitem__('name', u'x'),
+                       lambda: setattr(settings.parent, 'name', u'x'),
+                       lambda: settings.declareAttribute('extra', 'str'), lambda: settings.unmarshall(b'\x7f' * 5)):
+            with self.assertRaises(AttributeError):
+                assign()
+
+        other = getSettings().freeze()
+        self.assertEqual(hash(other), hash(settings))
+        self.assertEqual(other, settings)
+        self.assertNotEqual(getSettings(name=u'other').freeze(), settings)
+        self.assertEqual(len(set([settings, other])), 1)
+
+        byteOutput, length = marshallToBytes(settings)
+        decoded, _ = SettingsType().unmarshall(byteOutput[:length])
+        self.assertEqual(decoded.freeze(), settings)
+
+    def testEncodeCache(self):
+        cache = ColferEncodeCache(maxBytes=120)
+        first = getSettings(name=u'a' * 10).freeze()
+        second = getSettings(name=u'b' * 10).freeze()
+        encoded = cache.encode(first)
+        self.assertEqual(encoded, first.encode())
+        self.assertIs(cache.encode(getSettings(name=u'a' * 10).freeze()), encoded)
+        self.assertEqual(cache.getStats(), {'entries': 1, 'bytes': len(encoded), 'hits': 1, 'misses': 1,
+                                            'evictions': 0})
+        cache.encode(second)
+        cache.encode(first)
+        self.assertEqual(cache.getStats()['evictions'], 0)
+        cache.encode(first, FrozenColfer.COLFER_WIRE_STANDARD)
+        stats = cache.getStats()
+        self.assertEqual((stats['entries'], stats['evictions'], stats['misses']), (2, 1, 3))
+        self.assertLessEqual(stats['bytes'], 120)
+        # The least recently used entry, second, was evicted.
+        cache.encode(second)
+        self.assertEqual(cache.getStats()['misses'], 4)
+
+        large = getSettings(name=u'l' * 200).freeze()
+        self.assertEqual(cache.encode(large), large.encode())
+        self.assertNotIn(large.encode(), cache.entries.values())
+
+    def testMarshallUsesCache(self):
+        cache = CachedSettingsType.COLFER_ENCODE_CACHE
+        cache.clear()
+        settings = getSettings(CachedSettingsType)
+        unfrozenOutput, unfrozenLength = marshallToBytes(settings)
+        self.assertEqual(cache.getStats()['misses'], 0)
+        settings.freeze()
+        for _ in range(3):
+            byteOutput, length = marshallToBytes(settings)
+            self.assertEqual(bytes(byteOutput[:length]), bytes(unfrozenOutput[:unfrozenLength]))
+        stats = cache.getStats()
+        # The parent object is cached separately while encoding the first time.
+        self.assertEqual((stats['entries'], stats['misses'], stats['hits']), (2, 2, 2))
+
+        standardOutput = bytearray(256)
+        length = settings.marshall(standardOutput, 0, FrozenColfer.COLFER_WIRE_STANDARD)
+        decoded, _ = CachedSettingsType().unmarshall(standardOutput[:length], 0, FrozenColfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(decoded.freeze(), settings)
+
+        segmentedOutput = ColferSegmentedOutput(16, threshold=1)
+        length = settings.marshall(segmentedOutput)
+        self.assertEqual(b''.join(bytes(segment) for segment in segmentedOutput.getSegments(length)),
+                         bytes(unfrozenOutput[:unfrozenLength]))
+
+    def testConcurrentEncoding(self):
+        cache = ColferEncodeCache(1024)
+        settings = [getSettings(name=u'{}'.format(position)).freeze() for position in range(20)]
+        errors = []
+
+        def work():
+            try:
+                for _ in range(50):
+                    for item in settings:
+                        assert cache.encode(item) == item.encode()
+            except Exception as exception:  # pragma: no cover
+                errors.append(exception)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertLessEqual(cache.getStats()['bytes'], 1024)
@@ -0,0 +1,75 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from colf.colf_index import ColferIndex, updateIndex, getIndexPath, readIndexFile
+from colf.colf_record import ColferRecordWriter
+from tests.helpers import EventType, getEvent
+
+
+class TestIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.recordPath = os.path.join(self.directory, 'users.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def getUser(self, position):
+        return getEvent(position, host=u'user{:04d}@example.org'.format(position * 7919 % 1000),
+                        id=position * 7919 % 1000 + (2 ** 40 if position % 10 == 0 else 0),
+                        time=datetime.datetime(2020, 1, 1) + datetime.timedelta(days=position % 50),
+                        delta=position % 21 - 10)
+
+    def appendUsers(self, positions):
+        with open(self.recordPath, 'ab') as output:
+            writer = ColferRecordWriter(output)
+            for position in positions:
+                writer.write(self.getUser(position))
+
+    def testPointAndRangeLookups(self):
+        self.appendUsers(range(300))
+        users = [self.getUser(position) for position in range(300)]
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'id'), 300)
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'delta'), 300)
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'host'), 300)
+
+        with ColferIndex(self.recordPath, EventType, 'id') as index:
+            for user in users[::37]:
+                self.assertEqual([hit.host for hit in index.lookup(user.id)], [user.host])
+            self.assertEqual(index.lookup(12345), [])
+            hits = list(index.range(100, 200))
+            self.assertEqual([hit.id for hit in hits], sorted(user.id for user in users if 100 <= user.id <= 200))
+            self.assertEqual(len(list(index.range(2 ** 40))), 30)
+
+        with ColferIndex(self.recordPath, EventType, 'delta') as index:
+            self.assertEqual(len(index.lookup(-10)), len([user for user in users if user.delta == -10]))
+            self.assertEqual(len(index.getOffsets(None, -1)), len([user for user in users if user.delta <= -1]))
+
+        with ColferIndex(self.recordPath, EventType, 'host') as index:
+            self.assertEqual([hit.host for hit in index.range(u'user0100', u'user0130')],
+                             sorted(user.host for user in users if u'user0100' <= user.host <= u'user0130'))
+
+    def testIncrementalUpdate(self):
+        self.appendUsers(range(100))
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'time', checkpointRecords=30), 100)
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'time'), 0)
+
+        self.appendUsers(range(100, 150))
+        complete = os.path.getsize(self.recordPath)
+        with open(self.recordPath, 'ab') as output:
+            output.write(b'\x40\x01\x02')
+        self.assertEqual(updateIndex(self.recordPath, EventType, 'time'), 50)
+        _, coveredLength, entries = readIndexFile(getIndexPath(self.recordPath, 'time'))
+        self.assertEqual((coveredLength, len(entries)), (complete, 150))
+
+        with ColferIndex(self.recordPath, EventType, 'time') as index:
+            day = datetime.datetime(2020, 1, 5)
+            self.assertEqual(len(index.lookup(day)), 3)
+            self.assertEqual(len(index.getOffsets(day, day + datetime.timedelta(days=1))), 6)
+
+        with self.assertRaises(ValueError):
+            updateIndex(self.recordPath, EventType, 'id', getIndexPath(self.recordPath, 'time'))
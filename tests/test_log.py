@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from colf.log import ColferLog, compactLog, getChecksum, getSegmentName, COLFER_LOG_FRAME, COLFER_LOG_MAGIC
+from tests.helpers import EventType, LazyEventType, createObject
+
+
+class TestLog(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.directory = os.path.join(self.root, 'log')
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def getAccount(self, account, balance):
+        return createObject(EventType, host=account, delta=balance, payload=b'n' * 50)
+
+    def fillLog(self, count, segmentSize=1024):
+        with ColferLog(self.directory, EventType, segmentSize, syncRecords=10) as log:
+            positions = [log.append(self.getAccount(u'account-{}'.format(position % 7), position))
+                         for position in range(count)]
+        return positions
+
+    def testAppendAndRead(self):
+        positions = self.fillLog(100)
+        with ColferLog(self.directory, EventType, 1024) as log:
+            self.assertTrue(len(log.getSegments()) > 5)
+            self.assertEqual([record.delta for record in log.iterRecords()], list(range(100)))
+            self.assertEqual(log.read(positions[42]).delta, 42)
+            self.assertEqual([record.delta for record in log.iterRecords(positions[95])], list(range(95, 100)))
+            position = log.append(self.getAccount(u'late', 100))
+            self.assertEqual(log.read(position).host, u'late')
+        for segmentId in range(len(os.listdir(self.directory))):
+            path = os.path.join(self.directory, getSegmentName(segmentId))
+            self.assertTrue(os.path.getsize(path) <= 1024)
+
+    def testTornTailIsTruncated(self):
+        self.fillLog(20, segmentSize=1024 * 1024)
+        path = os.path.join(self.directory, getSegmentName(0))
+        intactSize = os.path.getsize(path)
+        with open(path, 'ab') as segmentFile:
+            segmentFile.write(b'\x00\x00\x00\x40\x12\x34')
+        with ColferLog(self.directory, EventType) as log:
+            self.assertEqual(os.path.getsize(path), intactSize)
+            log.append(self.getAccount(u'after', 20))
+            self.assertEqual([record.delta for record in log.iterRecords()], list(range(21)))
+
+    def testZeroFilledTailIsTruncated(self):
+        self.fillLog(20, segmentSize=1024 * 1024)
+        path = os.path.join(self.directory, getSegmentName(0))
+        intactSize = os.path.getsize(path)
+        with open(path, 'ab') as segmentFile:
+            segmentFile.write(b'\x00' * 64)
+        with ColferLog(self.directory, EventType) as log:
+            self.assertEqual(os.path.getsize(path), intactSize)
+            self.assertEqual([record.delta for record in log.iterRecords()], list(range(20)))
+
+    def testCorruptRecordIsTruncated(self):
+        self.fillLog(20, segmentSize=1024 * 1024)
+        path = os.path.join(self.directory, getSegmentName(0))
+        with open(path, 'r+b') as segmentFile:
+            segmentFile.seek(-3, os.SEEK_END)
+            segmentFile.write(b'\xff')
+        with ColferLog(self.directory, EventType) as log:
+            self.assertEqual([record.delta for record in log.iterRecords()], list(range(19)))
+
+    def testLazyStringsOutliveTheMap(self):
+        self.fillLog(10)
+        with ColferLog(self.directory, LazyEventType) as log:
+            records = list(log.iterRecords())
+        self.assertEqual([u'account-{}'.format(position % 7) for position in range(10)],
+                         [record.host for record in records])
+
+    def testUndecodableRecord(self):
+        self.fillLog(3, segmentSize=1024 * 1024)
+        path = os.path.join(self.directory, getSegmentName(0))
+        for message in (b'\x7f\x7f', b'\x01'):
+            with open(path, 'ab') as segmentFile:
+                segmentFile.write(COLFER_LOG_FRAME.pack(len(message), getChecksum(message)) + message)
+            with ColferLog(self.directory, EventType) as log:
+                with self.assertRaises(ValueError):
+                    list(log.iterRecords())
+            with open(path, 'r+b') as segmentFile:
+                segmentFile.truncate(os.path.getsize(path) - COLFER_LOG_FRAME.size - len(message))
+
+    def testEmptySegmentHeader(self):
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory, getSegmentName(0)), 'wb') as segmentFile:
+            segmentFile.write(COLFER_LOG_MAGIC[:3])
+        with ColferLog(self.directory, EventType) as log:
+            log.append(self.getAccount(u'first', 1))
+            self.assertEqual([record.host for record in log.iterRecords()], [u'first'])
+
+    def testCompaction(self):
+        self.fillLog(100)
+        self.assertEqual(compactLog(self.directory, EventType, 'host', 4096), 7)
+        with ColferLog(self.directory, EventType) as log:
+            records = list(log.iterRecords())
+        self.assertEqual([record.delta for record in records], list(range(93, 100)))
+        self.assertEqual(sorted(os.listdir(self.root)), ['log'])
+
+    def testInterruptedCompaction(self):
+        self.fillLog(10)
+        shutil.copytree(self.directory, self.directory + '.compact')
+        with ColferLog(self.directory, EventType) as log:
+            self.assertEqual(len(list(log.iterRecords())), 10)
+        self.assertEqual(sorted(os.listdir(self.root)), ['log'])
+
+        os.rename(self.directory, self.directory + '.old')
+        shutil.copytree(self.directory + '.old', self.directory + '.compact')
+        with ColferLog(self.directory, EventType) as log:
+            self.assertEqual(len(list(log.iterRecords())), 10)
+        self.assertEqual(sorted(os.listdir(self.root)), ['log'])
@@ -3,6 +3,7 @@ import datetime
 import unittest
 
 from colf import Colfer
+from tests.helpers import StandardExampleMixin, StandardType, toPlain
 from tests.test_basic import ExampleMixin
 
 
@@ -292,3 +293,82 @@ class TestDerivedMarshall(TestMarshall):
         exampleObject.inner = self.createExampleObject()
         exampleObject.inner.radius = 3.0
         return exampleObject
+
+
+class TestMarshallAbsentFields(unittest.TestCase):
+
+    def createObject(self):
+        testObject = Colfer()
+        testObject.declareAttribute('a', 'int32')
+        testObject.declareAttribute('b', 'int32')
+        testObject.declareAttribute('c', 'str')
+        return testObject
+
+    def testAbsentThenPresent(self):
+        marshallableObject = self.createObject()
+        marshallableObject.b = 5
+        byteOutput = bytearray(20)
+        length = marshallableObject.marshall(byteOutput)
+        unmarshalledObject, offset = self.createObject().unmarshall(byteOutput[:length])
+        self.assertEqual(offset, length)
+        self.assertEqual(unmarshalledObject.a, 0)
+        self.assertEqual(unmarshalledObject.b, 5)
+        self.assertEqual(unmarshalledObject.c, '')
+
+
+class TestStandardWireFormat(unittest.TestCase, StandardExampleMixin):
+
+    def testPerClass(self):
+        byteOutput = bytearray(40)
+        length = self.getExampleObject().marshall(byteOutput)
+        # One terminator per struct: the nested one after e, the outer one at the end.
+        self.assertEqual(bytes(byteOutput[:length]),
+                         b'\x00\x01' + b'\x01' + b'\x02\x02hi' + b'\x03' + b'\x84\x02\x7f' + b'\x7f')
+        unmarshalledObject, offset = StandardType().unmarshall(byteOutput[:length])
+        self.assertEqual(offset, length)
+        self.assertEqual(toPlain(unmarshalledObject), toPlain(self.getExampleObject()))
+
+    def testUpstreamBytes(self):
+        unmarshalledObject, offset = StandardType().unmarshall(b'\x02\x03abc\x7f')
+        self.assertEqual(offset, 6)
+        self.assertEqual(unmarshalledObject.c, 'abc')
+        self.assertEqual(unmarshalledObject.a, 0)
+        self.assertEqual(unmarshalledObject.d, None)
+
+        emptyObject, offset = StandardType().unmarshall(b'\x7f')
+        self.assertEqual(offset, 1)
+
+    def testPerCall(self):
+        class LegacyType(StandardType):
+            COLFER_WIRE_FORMAT = Colfer.COLFER_WIRE_LEGACY
+
+        legacyObject = self.getExampleObject(LegacyType)
+        standardOutput = bytearray(40)
+        standardLength = self.getExampleObject().marshall(standardOutput)
+
+        byteOutput = bytearray(40)
+        length = legacyObject.marshall(byteOutput, wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(byteOutput[:length], standardOutput[:standardLength])
+        self.assertEqual(legacyObject.getWireFormat(), Colfer.COLFER_WIRE_LEGACY)
+
+        unmarshalledObject, offset = LegacyType().unmarshall(byteOutput[:length], wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(offset, length)
+        self.assertEqual(toPlain(unmarshalledObject), toPlain(legacyObject))
+        self.assertEqual(unmarshalledObject.d.getWireFormat(), Colfer.COLFER_WIRE_LEGACY)
+
+        legacyLength = legacyObject.marshall(byteOutput)
+        self.assertEqual(legacyLength - length, 5 + 5 - 2)
+
+    def testConvert(self):
+        from colf.colf_record import convertWireFormat
+        standardObject = self.getExampleObject()
+        byteOutput = bytearray(40)
+        length = standardObject.marshall(byteOutput, wireFormat=Colfer.COLFER_WIRE_LEGACY)
+        converted, offset = convertWireFormat(StandardType(), byteOutput[:length],
+                                              Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(offset, length)
+        self.assertEqual(converted, byteOutput[:standardObject.marshall(byteOutput)])
+
+        legacy, _ = convertWireFormat(StandardType(), converted,
+                                      Colfer.COLFER_WIRE_STANDARD, Colfer.COLFER_WIRE_LEGACY)
+        self.assertEqual(len(legacy), length)
@@ -0,0 +1,141 @@
+import datetime
+import threading
+import unittest
+
+from colf import Colfer
+from colf.colf_marshall import ColferMarshallerMixin
+from colf.colf_metrics import ColferMetrics, ColferHistogram
+from colf.colf_profile import ColferProfiler
+from colf.colf_record import marshallToSegments
+from colf.colf_schema import compileSchema
+from tests.helpers import CachedSettingsType, EventType, TickType, createObject
+
+
+class TestMetrics(unittest.TestCase):
+
+    def getExampleObject(self):
+        return createObject(EventType, count=5, id=18000000000000000000, time=datetime.datetime(2020, 1, 1),
+                            child=createObject(EventType, count=4000000000))
+
+    def testHistogram(self):
+        histogram = ColferHistogram((1, 10))
+        for value in (0, 1, 5, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.toDict(),
+                         {'buckets': [[1, 2], [10, 3], [float('inf'), 4]], 'sum': 106, 'count': 4})
+
+    def testCollect(self):
+        original = ColferMarshallerMixin.marshallUint32
+        byteOutput = bytearray(100)
+        with ColferMetrics() as metrics:
+            length = self.getExampleObject().marshall(byteOutput)
+            EventType().unmarshall(byteOutput[:length])
+        self.assertTrue(ColferMarshallerMixin.marshallUint32 is original)
+
+        collected = metrics.collect()
+        classMetrics = collected['classes']['EventType']
+        self.assertEqual(classMetrics['messagesEncoded'], 1)
+        self.assertEqual(classMetrics['messagesDecoded'], 1)
+        self.assertEqual(classMetrics['bytesEncoded'], length)
+        self.assertEqual(classMetrics['bytesDecoded'], length)
+        self.assertEqual(classMetrics['encodedSizes']['count'], 1)
+        self.assertEqual(classMetrics['decodeSeconds']['count'], 1)
+        self.assertEqual(collected['encodings'], {
+            'uint32': {'flat': 1, 'compressed': 1},
+            'uint64': {'flat': 1, 'compressed': 0},
+            'timestamp': {'flat': 0, 'compressed': 1},
+        })
+
+    def testFixedLayout(self):
+        compileSchema(TickType)
+        try:
+            with ColferMetrics() as metrics:
+                TickType().marshall(bytearray(64))
+        finally:
+            compileSchema(TickType, fixedLayout=False)
+        self.assertEqual(metrics.collect()['encodings'], {
+            'uint32': {'flat': 1, 'compressed': 0},
+            'uint64': {'flat': 1, 'compressed': 0},
+            'timestamp': {'flat': 1, 'compressed': 0},
+        })
+
+    def testPrometheus(self):
+        with ColferMetrics() as metrics:
+            self.getExampleObject().marshall(bytearray(100))
+        text = metrics.toPrometheus()
+        self.assertTrue('# TYPE colf_messages_encoded_total counter\n' in text)
+        self.assertTrue('colf_messages_encoded_total{class="EventType"} 1\n' in text)
+        self.assertTrue('colf_encoded_message_bytes_bucket{class="EventType",le="+Inf"} 1\n' in text)
+        self.assertTrue('colf_encodings_total{type="uint32",path="flat"} 1\n' in text)
+
+        metrics.reset()
+        with metrics:
+            self.getExampleObject().marshall(bytearray(100))
+        self.assertEqual(metrics.collect()['encodings']['uint32'], {'flat': 1, 'compressed': 1})
+
+    def testStackedWithProfiler(self):
+        original = ColferMarshallerMixin.marshall
+        with ColferProfiler() as profiler:
+            with ColferMetrics() as metrics:
+                self.getExampleObject().marshall(bytearray(100))
+        self.assertTrue(ColferMarshallerMixin.marshall is original)
+        self.assertEqual(metrics.collect()['classes']['EventType']['messagesEncoded'], 1)
+        self.assertEqual(profiler.snapshot()['EventType']['message']['marshallCalls'], 2)
+
+    def testKeywordArguments(self):
+        exampleObject = self.getExampleObject()
+        expected = bytearray(100)
+        expectedLength = exampleObject.marshall(expected, wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        byteOutput = bytearray(100)
+        with ColferMetrics() as metrics:
+            length = exampleObject.marshall(byteOutput, offset=0, wireFormat=Colfer.COLFER_WIRE_STANDARD)
+            decoded, offset = EventType().unmarshall(byteOutput[:length], wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(expected[:expectedLength], byteOutput[:length])
+        self.assertEqual(length, offset)
+        self.assertEqual(4000000000, decoded.child.count)
+        classMetrics = metrics.collect()['classes']['EventType']
+        self.assertEqual((1, 1), (classMetrics['messagesEncoded'], classMetrics['messagesDecoded']))
+        self.assertEqual(length, classMetrics['bytesEncoded'])
+
+    def testCachedEncodings(self):
+        exampleObject = self.getExampleObject()
+        exampleObject.cacheEncodings()
+        with ColferMetrics() as metrics:
+            for _ in range(3):
+                exampleObject.marshall(bytearray(100))
+        self.assertEqual(metrics.collect()['encodings'], {
+            'uint32': {'flat': 3, 'compressed': 3},
+            'uint64': {'flat': 3, 'compressed': 0},
+            'timestamp': {'flat': 0, 'compressed': 3},
+        })
+
+    def testFrozenAndSegmented(self):
+        mutableObject = createObject(CachedSettingsType, limits=[7], salt=bytearray(b'p' * 100))
+        frozenObject = createObject(CachedSettingsType, limits=[7], salt=bytearray(b'p' * 100)).freeze()
+        with ColferMetrics() as metrics:
+            lengths = [frozenObject.marshall(bytearray(200)) for _ in range(2)]
+            _, segments = marshallToSegments(mutableObject, threshold=16)
+            # The cached encoding of a frozen object is referenced as a whole.
+            _, frozenSegments = marshallToSegments(frozenObject, threshold=16)
+        self.assertEqual((3, 1), (len(segments), len(frozenSegments)))
+        classMetrics = metrics.collect()['classes']['CachedSettingsType']
+        self.assertEqual(4, classMetrics['messagesEncoded'])
+        self.assertEqual(4 * lengths[0], classMetrics['bytesEncoded'])
+        self.assertEqual(lengths[0], sum(len(segment) for segment in segments))
+
+    def testThreads(self):
+        metrics = ColferMetrics().enable()
+        try:
+            def encode():
+                for _ in range(200):
+                    self.getExampleObject().marshall(bytearray(100))
+            threads = [threading.Thread(target=encode) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            metrics.disable()
+        collected = metrics.collect()
+        self.assertEqual(800, collected['classes']['EventType']['messagesEncoded'])
+        self.assertEqual({'flat': 800, 'compressed': 800}, collected['encodings']['uint32'])
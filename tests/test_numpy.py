@@ -0,0 +1,97 @@
+import io
+import unittest
+
+from colf import Colfer
+from colf import colf_numpy
+from colf.colf_record import ColferRecordReader, ColferRecordWriter
+from colf.colf_schema import compileSchema
+from tests.helpers import QuoteType, SignedTickType, TickType, getTick
+
+
+@unittest.skipIf(colf_numpy.numpy is None, 'NumPy is not installed')
+class TestNumpy(unittest.TestCase):
+
+    def tearDown(self):
+        compileSchema(TickType, fixedLayout=False)
+
+    def getTicks(self, count=5):
+        return [getTick(position) for position in range(count)]
+
+    def writeRecords(self, colferObjects, wireFormat=None):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output)
+        for colferObject in colferObjects:
+            colferObject.withCodecOptions({'wireFormat': wireFormat or colferObject.COLFER_WIRE_FORMAT},
+                                          writer.write, colferObject)
+        return output.getvalue()
+
+    def assertTicks(self, ticks, array):
+        self.assertEqual(len(ticks), len(array))
+        for tick, row in zip(ticks, array):
+            self.assertEqual(tick.ask, row['ask'])
+            self.assertEqual(tick.bid, row['bid'])
+            self.assertEqual(tick.flags, row['flags'])
+            self.assertEqual(colf_numpy.toDatetime64([tick.seen])[0], row['seen'])
+            self.assertEqual(tick.sequence, row['sequence'])
+            self.assertEqual(tick.size, row['size'])
+            self.assertEqual(tick.venue, row['venue'])
+
+    def testRecordDtype(self):
+        dtype = colf_numpy.getRecordDtype(TickType)
+        self.assertEqual(('ask', 'bid', 'flags', 'seen', 'sequence', 'size', 'venue'), dtype.names)
+        self.assertEqual('M', dtype['seen'].kind)
+        self.assertEqual(colf_numpy.numpy.dtype('u4'), dtype['size'])
+        with self.assertRaises(ValueError):
+            colf_numpy.getRecordDtype(QuoteType)
+
+    def testReadRecords(self):
+        ticks = self.getTicks()
+        self.assertTicks(ticks, colf_numpy.readStructuredArray(TickType, self.writeRecords(ticks)))
+        self.assertTicks(ticks, colf_numpy.readStructuredArray(TickType, io.BytesIO(self.writeRecords(ticks))))
+        self.assertTicks([], colf_numpy.readStructuredArray(TickType, b''))
+
+    def testReadFixedLayout(self):
+        compileSchema(TickType)
+        ticks = self.getTicks()
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            encoded = self.writeRecords(ticks, wireFormat)
+            layout = compileSchema(TickType).fixedLayout
+            frame, _, _ = colf_numpy.getFixedFrameLayout(layout, wireFormat)
+            self.assertEqual(len(ticks) * len(frame), len(encoded))
+            self.assertIsNotNone(colf_numpy.readFixedRecords(layout, encoded, wireFormat,
+                                                             colf_numpy.getRecordDtype(TickType)))
+            self.assertTicks(ticks, colf_numpy.readStructuredArray(TickType, encoded, wireFormat))
+
+    def testMixedLayouts(self):
+        ticks = self.getTicks()
+        compileSchema(TickType)
+        encoded = self.writeRecords(ticks[:2])
+        compileSchema(TickType, fixedLayout=False)
+        encoded += self.writeRecords(ticks[2:])
+        layout = compileSchema(TickType).fixedLayout
+        self.assertIsNone(colf_numpy.readFixedRecords(layout, encoded, TickType.COLFER_WIRE_FORMAT,
+                                                      colf_numpy.getRecordDtype(TickType)))
+        self.assertTicks(ticks, colf_numpy.readStructuredArray(TickType, encoded))
+
+    def testWriteRecords(self):
+        ticks = self.getTicks()
+        array = colf_numpy.readStructuredArray(TickType, self.writeRecords(ticks))
+        for fixedLayout in (False, True):
+            compileSchema(TickType, fixedLayout)
+            output = io.BytesIO()
+            written = colf_numpy.writeStructuredArray(TickType, array, output)
+            self.assertEqual(self.writeRecords(ticks), output.getvalue())
+            self.assertEqual(len(output.getvalue()), written)
+            decoded = list(ColferRecordReader(output.getvalue()).iterRecords(TickType))
+            self.assertEqual([dict(tick.items()) for tick in ticks], [dict(tick.items()) for tick in decoded])
+
+    def testOtherScalarTypes(self):
+        tick = SignedTickType()
+        tick.ask = 2.5
+        tick.change = -7
+        tick.halted = True
+        array = colf_numpy.readStructuredArray(SignedTickType, self.writeRecords([tick, SignedTickType()]))
+        self.assertEqual([(2.5, -7, True), (0.0, 0, False)], array[['ask', 'change', 'halted']].tolist())
+        output = io.BytesIO()
+        colf_numpy.writeStructuredArray(SignedTickType, array, output)
+        self.assertEqual(self.writeRecords([tick, SignedTickType()]), output.getvalue())
@@ -0,0 +1,82 @@
+import array
+import unittest
+
+from colf import Colfer
+from colf.colf_record import marshallToBytes
+from colf.colf_scan import ColferScanner, ColferIn
+from colf.colf_stream import decodeStream
+from tests.helpers import HistogramType, getHistogram
+
+
+class TestPackedLists(unittest.TestCase):
+
+    def assertDecoded(self, decoded, histogram):
+        for name in ('buckets', 'counts', 'flags', 'levels', 'times', 'totals'):
+            self.assertEqual(list(getattr(decoded, name)), list(getattr(histogram, name)), name)
+        self.assertEqual(decoded.name, histogram.name)
+
+    def testRoundTrip(self):
+        histogram = getHistogram()
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            byteOutput = bytearray(256)
+            length = histogram.marshall(byteOutput, wireFormat=wireFormat)
+            decoded, offset = HistogramType().unmarshall(byteOutput[:length], wireFormat=wireFormat)
+            self.assertEqual(offset, length)
+            self.assertDecoded(decoded, histogram)
+            self.assertIsInstance(decoded.buckets, array.array)
+            self.assertEqual(decoded.buckets.itemsize, 2)
+            self.assertIsInstance(decoded.flags[0], bool)
+
+            # Decoded arrays encode again, also after changes.
+            decoded.buckets[0] = 9
+            histogram.buckets[0] = 9
+            again = bytearray(256)
+            expected = bytearray(256)
+            self.assertEqual(decoded.marshall(again, wireFormat=wireFormat), length)
+            self.assertEqual(histogram.marshall(expected, wireFormat=wireFormat), length)
+            self.assertEqual(again, expected)
+            histogram.buckets[0] = 0
+
+    def testPackedSize(self):
+        histogram = HistogramType()
+        histogram.buckets = [65535] * 100
+        byteOutput, length = marshallToBytes(histogram)
+        # Header, count varint, 2 bytes per element and a terminator per field.
+        self.assertEqual(length, 1 + 1 + 200 + 7)
+        histogram.withCodecOptions({'timestampMode': Colfer.COLFER_TIMESTAMP_NANOSECONDS}, setattr, histogram, 'times',
+                                   [1600000000000000001] * 3)
+        decoded = HistogramType()
+        decoded.withCodecOptions({'timestampMode': Colfer.COLFER_TIMESTAMP_NANOSECONDS}, decoded.unmarshall,
+                                 marshallToBytes(histogram)[0])
+        self.assertEqual(decoded.times, [1600000000000000001] * 3)
+
+    def testValidation(self):
+        histogram = HistogramType()
+        histogram.buckets = array.array('B', [1, 2])
+        with self.assertRaises(AttributeError):
+            histogram.buckets = [65536]
+        with self.assertRaises(AttributeError):
+            histogram.levels = array.array('H', [256])
+        with self.assertRaises(AttributeError):
+            histogram.flags = [1]
+        histogram.buckets = array.array('B', [1, 2])
+        self.assertEqual(list(HistogramType().unmarshall(marshallToBytes(histogram)[0])[0].buckets), [1, 2])
+
+        histogram.declareAttribute('signed', 'list', variableSubType='int8')
+        histogram.signed = []
+        histogram.signed.append(1)
+        with self.assertRaises(ValueError):
+            marshallToBytes(histogram)
+
+    def testScannerAndStream(self):
+        histograms = []
+        for position in range(5):
+            histograms.append(getHistogram(u'h{}'.format(position)))
+        data = b''.join(bytes(marshallToBytes(histogram)[0][:marshallToBytes(histogram)[1]])
+                        for histogram in histograms)
+        scanner = ColferScanner(HistogramType, [ColferIn('name', [u'h3'])])
+        self.assertEqual([histogram.name for histogram in scanner.iterConcatenated(data)], [u'h3'])
+        decoded = list(decodeStream(HistogramType, [data[position:position + 5] for position in range(0, len(data), 5)]))
+        self.assertEqual(len(decoded), 5)
+        for histogram, decodedHistogram in zip(histograms, decoded):
+            self.assertDecoded(decodedHistogram, histogram)
@@ -0,0 +1,78 @@
+import datetime
+import mmap
+import unittest
+
+from colf import Colfer
+from colf.colf_patch import ColferPatcher, patchField
+from colf.colf_record import marshallToBytes
+from tests.helpers import LabelledTickType, getTick
+
+
+class TestPatch(unittest.TestCase):
+
+    def getLabelledTick(self):
+        return getTick(colferType=LabelledTickType, ask=0.5, change=-5, flags=3, label=u'front',
+                       seen=datetime.datetime(2021, 1, 2, 3, 4, 5, 6), sequence=2 ** 60, size=2 ** 30, venue=300)
+
+    def decode(self, byteOutput, offset=0, wireFormat=None):
+        decoded, _ = LabelledTickType().unmarshall(byteOutput, offset, wireFormat)
+        return decoded
+
+    def testFixedWidthFields(self):
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            tick = self.getLabelledTick()
+            byteOutput = bytearray(256)
+            length = tick.marshall(byteOutput, wireFormat=wireFormat)
+            patcher = ColferPatcher(LabelledTickType, wireFormat)
+            changes = {
+                'sequence': 7,
+                'flags': 0,
+                'ask': 0.0,
+                'seen': datetime.datetime(2030, 6, 7, 8, 9, 10, 11),
+                'venue': 65535,
+                'size': 1,
+                'change': -4,
+                'label': u'frunt',
+            }
+            for name, value in changes.items():
+                self.assertTrue(patcher.patch(byteOutput, name, value), name)
+                tick[name] = value
+            self.assertEqual(dict(self.decode(byteOutput[:length], wireFormat=wireFormat).items()),
+                             dict(tick.items()))
+            for name, value in changes.items():
+                start, end = patcher.locate(byteOutput, name)
+                self.assertGreater(end, start)
+
+    def testUnpatchableFields(self):
+        tick = self.getLabelledTick()
+        tick.venue = 5
+        tick.size = 5
+        tick.sequence = 0
+        byteOutput, length = marshallToBytes(tick)
+        original = bytes(byteOutput[:length])
+        patcher = ColferPatcher(LabelledTickType)
+        self.assertFalse(patcher.patch(byteOutput, 'sequence', 1))
+        self.assertFalse(patcher.patch(byteOutput, 'venue', 256))
+        self.assertFalse(patcher.patch(byteOutput, 'size', 2 ** 30))
+        self.assertFalse(patcher.patch(byteOutput, 'label', u'longer label'))
+        self.assertFalse(patcher.patch(byteOutput, 'change', -300))
+        self.assertFalse(patcher.patch(byteOutput, 'seen', datetime.datetime(2200, 1, 1)))
+        self.assertEqual(bytes(byteOutput[:length]), original)
+        with self.assertRaises(AttributeError):
+            patcher.patch(byteOutput, 'missing', 1)
+        with self.assertRaises(AttributeError):
+            patcher.patch(byteOutput, 'label', 5)
+
+    def testSharedMemory(self):
+        byteOutput, length = marshallToBytes(self.getLabelledTick())
+        mapping = mmap.mmap(-1, length * 3)
+        try:
+            for position in range(3):
+                mapping[position * length:(position + 1) * length] = bytes(byteOutput[:length])
+            self.assertTrue(patchField(LabelledTickType, mapping, 'size', 42, length))
+            self.assertTrue(patchField(LabelledTickType, memoryview(mapping), 'ask', 1.5, 2 * length))
+            self.assertEqual([self.decode(mapping, position * length).size for position in range(3)],
+                             [2 ** 30, 42, 2 ** 30])
+            self.assertEqual(self.decode(mapping, 2 * length).ask, 1.5)
+        finally:
+            mapping.close()
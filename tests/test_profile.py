@@ -0,0 +1,67 @@
+import unittest
+
+from colf.colf_marshall import ColferMarshallerMixin
+from colf.colf_profile import ColferProfiler
+from colf.colf_schema import compileSchema
+from tests.helpers import EventType, TickType, createObject, getTick
+
+
+class TestProfiler(unittest.TestCase):
+
+    def getExampleObject(self):
+        return createObject(EventType, count=300, host=u'profiled', child=createObject(EventType, count=1))
+
+    def testSnapshot(self):
+        original = ColferMarshallerMixin.marshall
+        byteOutput = bytearray(64)
+        with ColferProfiler() as profiler:
+            self.assertFalse(ColferMarshallerMixin.marshall is original)
+            length = self.getExampleObject().marshall(byteOutput)
+            EventType().unmarshall(byteOutput[:length])
+        self.assertTrue(ColferMarshallerMixin.marshall is original)
+
+        snapshot = profiler.snapshot()
+        message = snapshot['EventType']['message']
+        fields = snapshot['EventType']['fields']
+        self.assertEqual(message['marshallCalls'], 2)
+        self.assertEqual(message['unmarshallCalls'], 2)
+        self.assertEqual(fields['count']['marshallCalls'], 2)
+        # Header, two varint bytes and terminator for the outer count; header, one byte and terminator for the inner.
+        self.assertEqual(fields['count']['bytesProduced'], 4 + 3)
+        self.assertEqual(fields['host']['bytesProduced'], 11 + 1)
+        self.assertEqual(fields['host']['bytesConsumed'], 11 + 1)
+        # Both messages are counted: the outer one and the inner one, its count and a terminator per other field.
+        innerLength = 3 + 10
+        self.assertEqual(message['bytesProduced'], length + innerLength)
+        self.assertEqual(fields['child']['bytesProduced'], 1 + innerLength + 1 + 1)
+        self.assertTrue(fields['child']['marshallSeconds'] >= 0)
+
+        profiler.reset()
+        self.assertEqual(profiler.snapshot(), {})
+
+    def testEnableTwice(self):
+        profiler = ColferProfiler()
+        with profiler:
+            with self.assertRaises(RuntimeError):
+                profiler.enable()
+        with self.assertRaises(RuntimeError):
+            profiler.disable()
+
+    def testCompiledSchema(self):
+        compileSchema(TickType)
+        try:
+            tick = getTick()
+            expected = bytearray(64)
+            expectedLength = tick.marshall(expected)
+            byteOutput = bytearray(64)
+            with ColferProfiler() as profiler:
+                length = tick.marshall(byteOutput)
+                decoded, _ = TickType().unmarshall(byteOutput[:length])
+            self.assertEqual(expected[:expectedLength], byteOutput[:length])
+            self.assertEqual(compileSchema(TickType).fixedLayout.getSize(), length)
+            self.assertEqual(dict(tick.items()), dict(decoded.items()))
+            message = profiler.snapshot()['TickType']['message']
+            self.assertEqual(1, message['marshallCalls'])
+            self.assertEqual(length, message['bytesConsumed'])
+        finally:
+            compileSchema(TickType, fixedLayout=False)
@@ -0,0 +1,46 @@
+import io
+import unittest
+
+from colf.colf_record import ColferRecordWriter, ColferRecordReader, iterConcatenated, marshallToBytes
+from tests.helpers import EventType, getEvent, toPlain
+
+
+class TestRecords(unittest.TestCase):
+
+    def getRecords(self):
+        return [getEvent(position, payload=b'x' * (position * 100)) for position in range(5)]
+
+    def testMarshallToBytesGrows(self):
+        byteOutput, length = marshallToBytes(self.getRecords()[-1], sizeHint=8)
+        self.assertTrue(len(byteOutput) >= length > 400)
+
+    def testRoundTrip(self):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output, sizeHint=16)
+        records = self.getRecords()
+        written = sum(writer.write(record) for record in records)
+        self.assertEqual(written, len(output.getvalue()))
+
+        fromBuffer = list(ColferRecordReader(output.getvalue()).iterRecords(EventType))
+        fromStream = list(ColferRecordReader(io.BytesIO(output.getvalue())).iterRecords(EventType))
+        expected = [toPlain(record) for record in records]
+        self.assertEqual([toPlain(record) for record in fromBuffer], expected)
+        self.assertEqual([toPlain(record) for record in fromStream], expected)
+
+    def testTruncated(self):
+        output = io.BytesIO()
+        ColferRecordWriter(output).write(self.getRecords()[2])
+        truncated = output.getvalue()[:-1]
+        with self.assertRaises(EOFError):
+            list(ColferRecordReader(truncated).iterFrames())
+        with self.assertRaises(EOFError):
+            list(ColferRecordReader(io.BytesIO(truncated)).iterFrames())
+
+    def testConcatenated(self):
+        byteInput = bytearray()
+        for record in self.getRecords():
+            byteOutput, length = marshallToBytes(record)
+            byteInput += byteOutput[:length]
+        positions = list(iterConcatenated(EventType, byteInput))
+        self.assertEqual(len(positions), 5)
+        self.assertEqual(positions[-1][1], len(byteInput))
@@ -0,0 +1,71 @@
+import datetime
+import io
+import unittest
+
+from colf.colf_base import ColferStringTable
+from colf.colf_record import ColferRecordReader, ColferRecordWriter, marshallToBytes
+from colf.colf_result import ColferResultDecoder
+from tests.helpers import EventType, StandardEventType, createObject
+
+
+class TestResult(unittest.TestCase):
+
+    def getOrder(self, colferType=EventType):
+        return createObject(colferType, host=u'ACME', count=300, ratio=12.5, tags=[u'limit', u'day'],
+                            time=datetime.datetime(2023, 5, 6, 7, 8, 9), child=createObject(colferType, host=u'ACME'))
+
+    def encode(self, order):
+        byteOutput, length = marshallToBytes(order)
+        return bytes(byteOutput[:length])
+
+    def testTuple(self):
+        encoded = self.encode(self.getOrder())
+        result, length = ColferResultDecoder(EventType).unmarshall(encoded)
+        self.assertEqual(len(encoded), length)
+        child = (None, 0, 0, u'ACME', 0, u'', [], b'', 0.0, [], datetime.datetime(1970, 1, 1))
+        self.assertEqual((child, 300, 0, u'ACME', 0, u'', [], b'', 12.5, [u'limit', u'day'],
+                          datetime.datetime(2023, 5, 6, 7, 8, 9)), result)
+
+    def testNamedTuple(self):
+        encoded = self.encode(self.getOrder())
+        result, _ = ColferResultDecoder(EventType, 'namedtuple').unmarshall(encoded)
+        self.assertEqual('EventType', type(result).__name__)
+        self.assertEqual(('child', 'count', 'delta', 'host', 'id', 'message', 'parts', 'payload', 'ratio', 'tags',
+                          'time'), result._fields)
+        self.assertEqual(300, result.count)
+        self.assertEqual(u'ACME', result.child.host)
+        self.assertIsNone(result.child.child)
+
+    def testDict(self):
+        order = self.getOrder()
+        encoded = self.encode(order)
+        result, _ = ColferResultDecoder(EventType, 'dict').unmarshall(encoded)
+        self.assertEqual(['child', 'count', 'delta', 'host', 'id', 'message', 'parts', 'payload', 'ratio', 'tags',
+                          'time'], list(result))
+        self.assertEqual(dict(order.child.items()), result['child'])
+        del result['child']
+        expected = dict(order.items())
+        del expected['child']
+        self.assertEqual(expected, result)
+
+    def testTypeOptions(self):
+        encoded = self.encode(self.getOrder(StandardEventType))
+        result, length = ColferResultDecoder(StandardEventType, 'namedtuple').unmarshall(encoded)
+        self.assertEqual(len(encoded), length)
+        self.assertEqual(1683356889 * 10 ** 9, result.time)
+        self.assertEqual(0, result.child.time)
+
+    def testRecords(self):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output)
+        for _ in range(3):
+            writer.write(self.getOrder())
+        stringTable = ColferStringTable()
+        decoder = ColferResultDecoder(EventType, 'dict', stringTable=stringTable)
+        results = list(ColferRecordReader(output.getvalue()).iterResults(decoder))
+        self.assertEqual(3, len(results))
+        self.assertIs(results[0]['host'], results[2]['child']['host'])
+
+    def testInvalidResultType(self):
+        with self.assertRaises(ValueError):
+            ColferResultDecoder(EventType, 'list')
@@ -0,0 +1,96 @@
+import datetime
+import io
+import unittest
+
+from colf import Colfer
+from colf import bench
+from colf.colf_record import ColferRecordWriter, marshallToBytes
+from colf.colf_scan import ColferScanner, ColferIn, ColferBetween, ColferStartsWith, ColferMatches, scanRecords
+from colf.colf_schema import compileSchema
+from tests.helpers import ScannedType, TickType, getScanned, getTick
+
+
+class TestScan(unittest.TestCase):
+
+    def getCases(self):
+        start = datetime.datetime(2023, 1, 3)
+        end = datetime.datetime(2023, 1, 5)
+        ids = [3, 10 * 2 ** 44, 77, 12345, 0]
+        return [
+            ([ColferIn('id', ids)], lambda record: record.id in ids),
+            ([ColferBetween('time', start, end)], lambda record: start <= record.time <= end),
+            ([ColferStartsWith('path', u'/var/lib/')], lambda record: record.path.startswith(u'/var/lib/')),
+            ([ColferIn('zone', [-3, 0]), ColferStartsWith('path', u'/var/log/1')],
+             lambda record: record.zone in (-3, 0) and record.path.startswith(u'/var/log/1')),
+            ([ColferIn('active', [True]), ColferBetween('count', 1000, None)],
+             lambda record: record.active and record.count >= 1000),
+            ([ColferMatches('score', lambda score: score > 40)], lambda record: record.score > 40),
+        ]
+
+    def runCases(self, wireFormat=None):
+        records = [getScanned(position) for position in range(200)]
+        output = io.BytesIO()
+        concatenated = bytearray()
+        writer = ColferRecordWriter(output)
+        for record in records:
+            if wireFormat:
+                record.withCodecOptions({'wireFormat': wireFormat}, writer.write, record)
+                byteOutput, length = record.withCodecOptions({'wireFormat': wireFormat}, marshallToBytes, record)
+            else:
+                writer.write(record)
+                byteOutput, length = marshallToBytes(record)
+            concatenated += byteOutput[:length]
+
+        for predicates, expected in self.getCases():
+            expectedIds = [record.id for record in records if expected(record)]
+            self.assertTrue(0 < len(expectedIds) < len(records))
+            framed = scanRecords(ScannedType, output.getvalue(), predicates, wireFormat=wireFormat)
+            self.assertEqual([record.id for record in framed], expectedIds)
+            unframed = scanRecords(ScannedType, bytes(concatenated), predicates, False, wireFormat)
+            matched = list(unframed)
+            self.assertEqual([record.id for record in matched], expectedIds)
+            self.assertEqual([record.path for record in matched],
+                             [record.path for record in records if expected(record)])
+
+    def testLegacy(self):
+        self.runCases()
+
+    def testStandard(self):
+        self.runCases(Colfer.COLFER_WIRE_STANDARD)
+
+    def testSkipMessage(self):
+        for scenario in bench.getScenarios():
+            colferObject = scenario.createObject()
+            for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+                byteOutput, length = colferObject.withCodecOptions({'wireFormat': wireFormat}, marshallToBytes,
+                                                                   colferObject)
+                scanner = ColferScanner(scenario.colferType, [], wireFormat)
+                self.assertEqual(scanner.skipMessage(byteOutput, 0), length)
+
+    def testUnknownField(self):
+        with self.assertRaises(AttributeError):
+            ColferScanner(ScannedType, [ColferIn('missing', [1])])
+
+    def testFixedLayout(self):
+        ticks = [getTick(position, sequence=position, flags=position % 2, size=position % 3, venue=position * 100,
+                         seen=datetime.datetime(2023, 1, 1 + position % 2)) for position in range(6)]
+        cases = [
+            (ColferIn('sequence', [0, 3]), [0, 3]),
+            (ColferIn('flags', [0]), [0, 2, 4]),
+            (ColferIn('size', [2]), [2, 5]),
+            (ColferIn('venue', [0, 500]), [0, 5]),
+            (ColferIn('seen', [datetime.datetime(2023, 1, 2)]), [1, 3, 5]),
+            (ColferBetween('venue', 150, 350), [2, 3]),
+        ]
+        compileSchema(TickType)
+        try:
+            for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+                output = io.BytesIO()
+                writer = ColferRecordWriter(output)
+                for tick in ticks:
+                    tick.withCodecOptions({'wireFormat': wireFormat}, writer.write, tick)
+                for predicate, expectedSequences in cases:
+                    matched = scanRecords(TickType, output.getvalue(), [predicate], wireFormat=wireFormat)
+                    self.assertEqual(expectedSequences, [tick.sequence for tick in matched])
+        finally:
+            compileSchema(TickType, fixedLayout=False)
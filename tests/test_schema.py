@@ -0,0 +1,71 @@
+import unittest
+
+from colf import Colfer
+from colf.colf_base import COLFER_FIXED_LAYOUTS
+from colf.colf_schema import compileSchema
+from tests.helpers import PlainTickType, QuoteType, TickType, getTick
+
+
+class TestSchema(unittest.TestCase):
+
+    def setUp(self):
+        self.schema = compileSchema(TickType)
+
+    def tearDown(self):
+        compileSchema(TickType, fixedLayout=False)
+
+    def encode(self, tick, wireFormat=None):
+        byteOutput = bytearray(256)
+        length = tick.marshall(byteOutput, 0, wireFormat)
+        return byteOutput[:length]
+
+    def testCompile(self):
+        self.assertEqual(['ask', 'bid', 'flags', 'seen', 'sequence', 'size', 'venue'], self.schema.names)
+        self.assertEqual(('venue', 'uint16', None), self.schema.fields[-1])
+        self.assertIs(self.schema.fixedLayout, COLFER_FIXED_LAYOUTS[TickType])
+        self.assertIsNone(compileSchema(QuoteType).fixedLayout)
+        self.assertNotIn(QuoteType, COLFER_FIXED_LAYOUTS)
+        self.assertNotIn(PlainTickType, COLFER_FIXED_LAYOUTS)
+
+    def testFixedSize(self):
+        layout = self.schema.fixedLayout
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            tick = getTick()
+            encoded = self.encode(tick, wireFormat)
+            self.assertEqual(layout.getSize(wireFormat), len(encoded))
+            tick.ask = 0.0
+            tick.sequence = 2 ** 40
+            self.assertEqual(len(encoded), len(self.encode(tick, wireFormat)))
+
+    def testDecodedByFieldDecoders(self):
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            encoded = self.encode(getTick(), wireFormat)
+            decoded, length = PlainTickType().unmarshall(encoded, 0, wireFormat)
+            self.assertEqual(len(encoded), length)
+            self.assertEqual(dict(getTick().items()), dict(decoded.items()))
+
+    def testDecodesOtherLayouts(self):
+        for wireFormat in (Colfer.COLFER_WIRE_LEGACY, Colfer.COLFER_WIRE_STANDARD):
+            encoded = self.encode(getTick(colferType=PlainTickType), wireFormat)
+            self.assertLess(len(encoded), self.schema.fixedLayout.getSize(wireFormat))
+            decoded, length = TickType().unmarshall(encoded, 0, wireFormat)
+            self.assertEqual(len(encoded), length)
+            self.assertEqual(dict(getTick().items()), dict(decoded.items()))
+
+    def testRoundTrip(self):
+        tick = getTick()
+        encoded = self.encode(tick)
+        decoded = TickType()
+        # Decoded in one go, without the field decoders.
+        decoded.__dict__['unmarshallType'] = None
+        decoded, length = decoded.unmarshall(bytes(encoded))
+        self.assertEqual(len(encoded), length)
+        self.assertEqual(dict(tick.items()), dict(decoded.items()))
+        decoded = TickType()
+        decoded.withCodecOptions({'timestampMode': Colfer.COLFER_TIMESTAMP_NANOSECONDS}, decoded.unmarshall, encoded)
+        self.assertEqual(1609556645006000000, decoded.seen)
+
+    def testBufferTooSmall(self):
+        with self.assertRaises(IndexError):
+            getTick().marshall(bytearray(8))
+        self.assertIsNone(self.schema.fixedLayout.unmarshall(TickType(), bytearray(8), 0))
@@ -0,0 +1,59 @@
+import io
+import unittest
+
+from colf import Colfer
+from colf.colf_base import ColferSegmentedOutput
+from colf.colf_record import ColferRecordWriter, ColferRecordReader, marshallToBytes, marshallToSegments
+from tests.helpers import EventType, createObject
+
+
+class TestSegments(unittest.TestCase):
+
+    def getAttachment(self):
+        return createObject(EventType, count=7, host=u'n\xe4me' * 40, payload=b'p' * (1024 * 1024),
+                            parts=[b'small', b'q' * 300, b''], tags=[u'short', u'l' * 500])
+
+    def joinSegments(self, segments):
+        return b''.join(bytes(segment) for segment in segments)
+
+    def testSegmentsMatchFlat(self):
+        attachment = self.getAttachment()
+        byteOutput, length = marshallToBytes(attachment)
+        for threshold in (1, 100, 1024, 1024 * 1024, 2 ** 30):
+            _, segments = marshallToSegments(attachment, threshold, sizeHint=8)
+            self.assertEqual(self.joinSegments(segments), bytes(byteOutput[:length]))
+
+    def testStandardWireFormat(self):
+        attachment = self.getAttachment()
+        byteOutput, length = attachment.withCodecOptions({'wireFormat': Colfer.COLFER_WIRE_STANDARD},
+                                                         marshallToBytes, attachment)
+        _, segments = attachment.withCodecOptions({'wireFormat': Colfer.COLFER_WIRE_STANDARD},
+                                                  marshallToSegments, attachment, 256)
+        self.assertEqual(self.joinSegments(segments), bytes(byteOutput[:length]))
+
+    def testPayloadIsReferenced(self):
+        attachment = self.getAttachment()
+        byteOutput, segments = marshallToSegments(attachment, 256)
+        self.assertTrue(isinstance(byteOutput, ColferSegmentedOutput))
+        referenced = [segment for segment in segments if segment.obj is not byteOutput]
+        self.assertEqual(len(referenced), 3)
+        self.assertTrue(referenced[0].obj is attachment.parts[1])
+        self.assertTrue(referenced[1].obj is attachment.payload)
+        self.assertTrue(len(byteOutput) < 4096)
+
+    def testReuse(self):
+        attachment = self.getAttachment()
+        byteOutput, first = marshallToSegments(attachment, 256)
+        firstBytes = self.joinSegments(first)
+        byteOutput, second = marshallToSegments(attachment, 256, byteOutput=byteOutput)
+        self.assertEqual(self.joinSegments(second), firstBytes)
+
+    def testRecordWriter(self):
+        attachments = [self.getAttachment(), EventType(), self.getAttachment()]
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output, sizeHint=16, segmentThreshold=1024)
+        written = sum(writer.write(attachment) for attachment in attachments)
+        self.assertEqual(written, len(output.getvalue()))
+        records = list(ColferRecordReader(output.getvalue()).iterRecords(EventType))
+        self.assertEqual([record.payload for record in records], [attachment.payload for attachment in attachments])
+        self.assertEqual(records[2].tags, attachments[2].tags)
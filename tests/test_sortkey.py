@@ -0,0 +1,85 @@
+import datetime
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from colf.colf_record import ColferRecordWriter, ColferRecordReader, marshallToBytes
+from colf.colf_sortkey import ColferSortKey, encodeFieldKey, sortRecordFile
+from tests.helpers import EventType, createObject
+
+
+class TestSortKey(unittest.TestCase):
+
+    def getRecords(self, count=400):
+        randomGenerator = random.Random(count)
+        records = []
+        for position in range(count):
+            record = createObject(EventType, count=position, tags=[u'x'] * (position % 2))
+            record.delta = randomGenerator.choice([-2 ** 40, -300, -1, 0, 1, 5, 2 ** 50])
+            record.host = randomGenerator.choice([u'', u'a', u'a\x00', u'ab', u'b', u'\xe9t\xe9'])
+            record.ratio = randomGenerator.choice([-1e300, -2.5, -0.0001, 0.0, 1e-300, 3.25, 1e300])
+            record.time = datetime.datetime(2020, 1, 1) + datetime.timedelta(seconds=randomGenerator.randint(0, 10),
+                                                                             microseconds=randomGenerator.randint(0, 3))
+            records.append(record)
+        return records
+
+    def testFieldKeyOrder(self):
+        cases = (
+            ('int32', [-2 ** 31, -5, 0, 3, 2 ** 31 - 1]),
+            ('int64', [-2 ** 63, -2 ** 40, -1, 0, 2 ** 63 - 1]),
+            ('uint64', [0, 1, 255, 2 ** 64 - 1]),
+            ('uint16', [0, 1, 256, 65535]),
+            ('float32', [-3.0e38, -1.5, -1e-30, 0.0, 1e-30, 2.0, 3.0e38]),
+            ('float64', [float('-inf'), -1e300, -2.5, 0.0, 5e-324, 1.0, float('inf')]),
+            ('datetime', [datetime.datetime(1970, 1, 1), datetime.datetime(1970, 1, 1, 0, 0, 0, 1),
+                          datetime.datetime(2038, 1, 20)]),
+            ('str', [u'', u'\x00', u'\x00\x00', u'\x00a', u'a', u'a\x00', u'ab', u'b', u'\xe9']),
+            ('bytes', [b'', b'\x00', b'\x00\xff', b'\x01', b'\xff']),
+        )
+        for variableType, values in cases:
+            keys = [encodeFieldKey(variableType, value) for value in values]
+            self.assertEqual(sorted(keys), keys)
+            self.assertEqual(len(set(keys)), len(keys))
+            descendingKeys = [encodeFieldKey(variableType, value, True) for value in values]
+            self.assertEqual(sorted(descendingKeys, reverse=True), descendingKeys)
+        with self.assertRaises(ValueError):
+            encodeFieldKey('object', None)
+        with self.assertRaises(ValueError):
+            ColferSortKey(EventType, ['tags'])
+
+    def testCompositeKeys(self):
+        records = self.getRecords()
+        fields = ['host', ('delta', True), 'ratio', 'time']
+        sortKey = ColferSortKey(EventType, fields)
+        expected = sorted(records, key=lambda record: (record.host, -record.delta, record.ratio, record.time))
+        self.assertEqual([record.count for record in sorted(records, key=sortKey.fromObject)],
+                         [record.count for record in expected])
+        for record in records[:50]:
+            byteOutput, _ = marshallToBytes(record)
+            self.assertEqual(sortKey.fromMessage(byteOutput), sortKey.fromObject(record))
+
+    def testSortRecordFile(self):
+        directory = tempfile.mkdtemp()
+        try:
+            inputPath = os.path.join(directory, 'input.bin')
+            records = self.getRecords()
+            with open(inputPath, 'wb') as output:
+                writer = ColferRecordWriter(output)
+                for record in records:
+                    writer.write(record)
+
+            expected = [record.count for record in sorted(records, key=lambda record: (record.time, -record.delta))]
+            for memoryLimit in (2000, 64 * 1024 * 1024):
+                outputPath = os.path.join(directory, 'sorted-{}.bin'.format(memoryLimit))
+                count = sortRecordFile(inputPath, outputPath, EventType, ['time', ('delta', True)], memoryLimit,
+                                       directory)
+                self.assertEqual(count, len(records))
+                with open(outputPath, 'rb') as source:
+                    sortedRecords = list(ColferRecordReader(source.read()).iterRecords(EventType))
+                # Stable: ties keep the input order.
+                self.assertEqual([record.count for record in sortedRecords], expected)
+            self.assertEqual(sorted(os.listdir(directory)), ['input.bin', 'sorted-2000.bin', 'sorted-67108864.bin'])
+        finally:
+            shutil.rmtree(directory)
@@ -0,0 +1,71 @@
+import random
+import unittest
+
+from colf import Colfer
+from colf import bench
+from colf.colf_record import marshallToBytes
+from colf.colf_stream import ColferDecoder, decodeStream
+from tests.helpers import StandardExampleMixin, StandardType, toPlain
+
+
+class TestColferDecoder(unittest.TestCase, StandardExampleMixin):
+
+    def getMessages(self):
+        messages = []
+        for scenario in bench.getScenarios():
+            if scenario.name != 'shape-blob':
+                messages.append((scenario.colferType, scenario.createObject()))
+        return messages
+
+    def splitChunks(self, byteInput, randomGenerator):
+        chunks = []
+        offset = 0
+        while offset < len(byteInput):
+            length = randomGenerator.randint(1, 7)
+            chunks.append(bytes(byteInput[offset:offset + length]))
+            offset += length
+        return chunks
+
+    def runStream(self, colferType, colferObjects, wireFormat=None):
+        byteInput = bytearray()
+        for colferObject in colferObjects:
+            byteOutput, length = marshallToBytes(colferObject)
+            if wireFormat:
+                byteOutput, length = colferObject.withCodecOptions({'wireFormat': wireFormat}, marshallToBytes,
+                                                                   colferObject)
+            byteInput += byteOutput[:length]
+
+        randomGenerator = random.Random(len(byteInput))
+        for chunks in ([byteInput], [byteInput[offset:offset + 1] for offset in range(len(byteInput))],
+                       self.splitChunks(byteInput, randomGenerator)):
+            decoded = list(decodeStream(colferType, chunks, wireFormat))
+            self.assertEqual([toPlain(value) for value in decoded],
+                             [toPlain(value) for value in colferObjects])
+
+    def testScenarios(self):
+        for colferType, colferObject in self.getMessages():
+            self.runStream(colferType, [colferObject, colferObject])
+
+    def testStandardWireFormat(self):
+        for colferType, colferObject in self.getMessages():
+            self.runStream(colferType, [colferObject, colferType()], Colfer.COLFER_WIRE_STANDARD)
+        exampleObject = self.getExampleObject()
+        self.runStream(StandardType, [exampleObject, exampleObject])
+
+    def testPending(self):
+        colferType, colferObject = self.getMessages()[-1]
+        byteOutput, length = marshallToBytes(colferObject)
+        decoder = ColferDecoder(colferType)
+        self.assertEqual(decoder.feed(byteOutput[:length - 1]), [])
+        self.assertTrue(decoder.isPending())
+        with self.assertRaises(EOFError):
+            decoder.close()
+        self.assertEqual(len(decoder.feed(byteOutput[length - 1:length])), 1)
+        self.assertFalse(decoder.isPending())
+        decoder.close()
+
+    def testCorrupt(self):
+        colferType, colferObject = self.getMessages()[0]
+        decoder = ColferDecoder(colferType)
+        with self.assertRaises(AssertionError):
+            decoder.feed(b'\x00\x00')
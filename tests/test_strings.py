@@ -0,0 +1,143 @@
+import copy
+import io
+import json
+import mmap
+import pickle
+import unittest
+
+from colf import Colfer, bench
+from colf.colf_base import ColferStringTable, ColferLazyString
+from colf.colf_record import ColferRecordWriter, ColferRecordReader, marshallToBytes
+from colf.colf_stream import ColferDecoder, decodeStream
+from tests.helpers import EventType, createObject
+
+
+class TestStringTable(unittest.TestCase):
+
+    def getRecords(self, count=60):
+        return [createObject(EventType, host=u'host-{}.example'.format(position % 3),
+                             message=[u'DE', u'FR', u'\xc5land'][position % 3],
+                             tags=[u'web', u'tag-{}'.format(position)],
+                             child=createObject(EventType, host=u'host-0.example')) for position in range(count)]
+
+    def getStream(self, records):
+        output = io.BytesIO()
+        writer = ColferRecordWriter(output)
+        for record in records:
+            writer.write(record)
+        return output.getvalue()
+
+    def testRepeatedStringsAreShared(self):
+        records = self.getRecords()
+        stringTable = ColferStringTable(maxEntries=20)
+        decoded = list(ColferRecordReader(bytearray(self.getStream(records))).iterRecords(EventType, stringTable))
+        self.assertEqual([(record.host, record.message, record.tags) for record in decoded],
+                         [(record.host, record.message, record.tags) for record in records])
+        self.assertIs(decoded[0].host, decoded[3].host)
+        self.assertIs(decoded[0].host, decoded[5].child.host)
+        self.assertIs(decoded[2].message, decoded[59].message)
+        self.assertIs(decoded[1].tags[0], decoded[40].tags[0])
+        self.assertEqual(len(stringTable), 20)
+        # Unique tags fill the table, values beyond it are decoded but not kept.
+        self.assertNotIn(b'tag-58', stringTable.strings)
+        self.assertEqual(stringTable.hits + stringTable.misses, 60 * 5)
+
+    def testLongStringsAreNotKept(self):
+        stringTable = ColferStringTable(maxLength=4)
+        self.assertEqual(stringTable.decode(bytearray(b'long value'), lambda value: value.decode('utf-8')),
+                         u'long value')
+        self.assertEqual(stringTable.decode(memoryview(b'DE'), lambda value: value.decode('utf-8')), u'DE')
+        self.assertEqual(list(stringTable.strings), [b'DE'])
+
+    def testStreamDecoder(self):
+        records = self.getRecords(9)
+        data = b''.join(bytes(marshallToBytes(record)[0][:marshallToBytes(record)[1]]) for record in records)
+        stringTable = ColferStringTable()
+        decoded = list(decodeStream(EventType, [data[position:position + 7] for position in range(0, len(data), 7)],
+                                    stringTable=stringTable))
+        self.assertEqual([record.tags for record in decoded], [record.tags for record in records])
+        self.assertIs(decoded[0].host, decoded[6].host)
+        self.assertIs(decoded[1].child.host, decoded[0].host)
+        self.assertGreater(stringTable.hits, 0)
+        self.assertEqual(ColferDecoder(EventType).codecOptions, {})
+
+
+class TestLazyString(unittest.TestCase):
+
+    def decodeLazy(self, message):
+        record = EventType()
+        _, offset = record.withCodecOptions({'lazyStrings': True}, record.unmarshall, message)
+        self.assertEqual(offset, len(message))
+        return record
+
+    def getRecord(self):
+        return createObject(EventType, host=u'h\xf6st-1.example', tags=[u'web', u'\u20ac'],
+                            child=createObject(EventType, host=u'origin'))
+
+    def testLazyDecoding(self):
+        byteOutput, length = marshallToBytes(self.getRecord())
+        message = bytes(byteOutput[:length])
+        record = self.decodeLazy(message)
+        self.assertIsInstance(record.host, ColferLazyString)
+        self.assertIsNone(record.host.value)
+        self.assertIsInstance(record.host.getBytes(), memoryview)
+        self.assertTrue(record.host.startswith(u'h\xf6'))
+        self.assertFalse(record.host.startswith(u'ho'))
+        self.assertTrue(record.host.endswith(u'.example'))
+        self.assertEqual(record.host, u'h\xf6st-1.example')
+        self.assertNotEqual(record.host, u'h\xf6st-2.example')
+        self.assertTrue(u'a' < record.host < u'\xff')
+        self.assertEqual(sorted([record.tags[1], u'z', record.tags[0]]), [u'web', u'z', u'\u20ac'])
+        self.assertIsNone(record.host.value)
+
+        self.assertEqual(record.child.host, u'origin')
+        self.assertFalse(record.message)
+        self.assertEqual(len(record.host), 14)
+        self.assertEqual(record.host.upper(), u'H\xd6ST-1.EXAMPLE')
+        self.assertEqual(record.host + u'!', u'h\xf6st-1.example!')
+        self.assertEqual(str(record.tags[0]), 'web')
+        self.assertIn(u'st', record.host)
+        self.assertEqual(set([record.host, u'h\xf6st-1.example']), set([u'h\xf6st-1.example']))
+        self.assertEqual({u'web': 1}[record.tags[0]], 1)
+
+        # Re-encoding writes the held bytes back.
+        record.child.host = u'proxy'
+        reencoded, reencodedLength = marshallToBytes(record)
+        expected = self.getRecord()
+        expected.child.host = u'proxy'
+        expectedOutput, expectedLength = marshallToBytes(expected)
+        self.assertEqual(bytes(reencoded[:reencodedLength]), bytes(expectedOutput[:expectedLength]))
+
+    def testReencodeWithoutDecoding(self):
+        byteOutput, length = marshallToBytes(self.getRecord())
+        record = self.decodeLazy(bytearray(byteOutput[:length]))
+        standardOutput = bytearray(256)
+        standardLength = record.marshall(standardOutput, wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertIsNone(record.host.value)
+        self.assertIsNone(record.tags[1].value)
+        decoded, _ = EventType().unmarshall(standardOutput[:standardLength], wireFormat=Colfer.COLFER_WIRE_STANDARD)
+        self.assertEqual(decoded.tags, [u'web', u'\u20ac'])
+        self.assertEqual(decoded.host, u'h\xf6st-1.example')
+
+    def testPlainConversions(self):
+        byteOutput, length = marshallToBytes(self.getRecord())
+        record = self.decodeLazy(bytes(byteOutput[:length]))
+        self.assertEqual(u'h\xf6st-1.example', json.loads(record.toJson())['host'])
+        self.assertIs(type(bench.toPlain(record)['host']), type(u''))
+        for value in (copy.copy(record.host), copy.deepcopy(record.host), pickle.loads(pickle.dumps(record.host))):
+            self.assertIs(type(value), type(u''))
+            self.assertEqual(u'h\xf6st-1.example', value)
+        self.assertEqual([u'web', u'\u20ac'], copy.deepcopy(record.tags))
+
+    def testResizableInput(self):
+        byteOutput, length = marshallToBytes(self.getRecord())
+        message = bytearray(byteOutput[:length])
+        record = self.decodeLazy(message)
+        message.extend(b'\x00' * 16)
+        del message[:]
+        self.assertEqual(u'h\xf6st-1.example', record.host)
+        mapped = mmap.mmap(-1, length)
+        mapped[:] = bytes(byteOutput[:length])
+        record = self.decodeLazy(mapped)
+        mapped.close()
+        self.assertEqual(u'origin', record.child.host)
@@ -0,0 +1,53 @@
+import datetime
+import unittest
+
+from colf import Colfer
+from colf import colf_numpy
+from colf.colf_record import marshallToBytes
+from colf.colf_sortkey import encodeFieldKey
+from tests.helpers import EventType, NanosecondEventType, createObject
+
+
+class TestTimestamps(unittest.TestCase):
+
+    def testNanosecondRoundTrip(self):
+        event = NanosecondEventType()
+        self.assertEqual(event.time, 0)
+        values = (1, 999999999, 10 ** 9, 1600000000123456789, 2 ** 32 * 10 ** 9 + 7)
+        for value in values:
+            event.time = value
+            event.child = createObject(NanosecondEventType, time=datetime.datetime(2020, 1, 1, 0, 0, 0, 5))
+            byteOutput, length = marshallToBytes(event)
+            decoded, _ = NanosecondEventType().unmarshall(byteOutput[:length])
+            self.assertEqual(decoded.time, value)
+            self.assertEqual(decoded.child.time, 1577836800000005000)
+
+            asDatetime, _ = EventType().unmarshall(byteOutput[:length])
+            self.assertEqual(asDatetime.time, datetime.datetime.utcfromtimestamp(0) +
+                             datetime.timedelta(microseconds=value // 1000))
+            self.assertEqual(asDatetime.child.time, datetime.datetime(2020, 1, 1, 0, 0, 0, 5))
+
+    def testEncodingMatchesDatetime(self):
+        moment = datetime.datetime(2021, 3, 4, 5, 6, 7, 891011)
+        asDatetime = createObject(EventType, time=moment, child=EventType())
+        asNanoseconds = createObject(NanosecondEventType, time=1614834367891011000, child=NanosecondEventType())
+        self.assertEqual(bytes(marshallToBytes(asDatetime)[0]), bytes(marshallToBytes(asNanoseconds)[0]))
+        self.assertEqual(encodeFieldKey('datetime', moment), encodeFieldKey('datetime', 1614834367891011000))
+
+        decoded = EventType()
+        decoded.withCodecOptions({'timestampMode': Colfer.COLFER_TIMESTAMP_NANOSECONDS}, decoded.unmarshall,
+                                 marshallToBytes(asDatetime)[0])
+        self.assertEqual(decoded.time, 1614834367891011000)
+        self.assertEqual(decoded.child.time, 0)
+        with self.assertRaises(AttributeError):
+            asNanoseconds.time = 1.5
+        with self.assertRaises(AttributeError):
+            asDatetime.time = 5
+        with self.assertRaises(AttributeError):
+            asDatetime.time = True
+
+    @unittest.skipIf(colf_numpy.numpy is None, 'NumPy is not installed')
+    def testDatetime64(self):  # pragma: no cover
+        array = colf_numpy.toDatetime64([1, datetime.datetime(2020, 1, 1)])
+        self.assertEqual(str(array.dtype), 'datetime64[ns]')
+        self.assertEqual(colf_numpy.fromDatetime64(array), [1, 1577836800000000000])